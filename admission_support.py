@@ -0,0 +1,157 @@
+# admission_support.py
+# Admission control in front of the engine pool: bounded per-class queues, request deadlines and
+# fail-fast rejection, so overload turns into quick degraded answers instead of unbounded latency.
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+# highest priority first; speculative work never queues here (the pool only hands it idle engines)
+CLASSES: Tuple[str, ...] = ("interactive", "batch")
+
+
+# deadline of the admitted request running in this context (engine checkouts wait no longer than this)
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("sensei_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """Expose `deadline` (a time.monotonic() value) to time_left() inside the block."""
+    token = _DEADLINE.set(deadline)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the current request's deadline (never negative), or None outside deadline_scope()."""
+    deadline = _DEADLINE.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class Overloaded(Exception):
+    """Not admitted: reason is "queue_full" or "deadline"; retry_after_s is a hint for the client."""
+
+    def __init__(self, reason: str, retry_after_s: float):
+        super().__init__(f"server overloaded ({reason})")
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class Admission:
+    """
+    At most `capacity` engines are held by admitted requests (a request says how many it searches on);
+    the rest wait in FIFO queues, one per priority class.
+    - a free seat goes to the head of the highest-priority non-empty queue
+    - a full queue rejects at once (queue_full)
+    - a request that cannot start before deadline - cost_s is rejected: at once when the estimated
+      wait already says so, otherwise when that moment passes in the queue (deadline)
+    The wait estimate is queue position x mean service time (EWMA) / capacity.
+    """
+
+    def __init__(self, capacity: int, max_queue: Dict[str, int]):
+        self.capacity = max(1, capacity)
+        self.max_queue = {c: max(0, max_queue.get(c, 0)) for c in CLASSES}
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[object]] = {c: deque() for c in CLASSES}
+        self._running = 0
+        self._service_s = 0.0  # EWMA of time spent admitted
+        self._admitted = {c: 0 for c in CLASSES}
+        self._rejected: Dict[str, Dict[str, int]] = {c: {"queue_full": 0, "deadline": 0} for c in CLASSES}
+        self._max_depth = {c: 0 for c in CLASSES}
+        self._waited_s = {c: 0.0 for c in CLASSES}
+
+    def _ahead(self, priority: str) -> int:
+        """Waiters served before a newcomer of this class (caller holds _cond)."""
+        rank = CLASSES.index(priority)
+        return sum(len(self._queues[c]) for c in CLASSES[:rank + 1])
+
+    def _estimate_wait(self, position: int) -> float:
+        free = self.capacity - self._running
+        if free > position:  # approximate: counts waiters as one engine each
+            return 0.0
+        return (position - free + 1) * self._service_s / self.capacity
+
+    def _head(self, priority: str, token: object) -> bool:
+        for c in CLASSES:
+            if self._queues[c]:
+                return c == priority and self._queues[c][0] is token
+        return False
+
+    def _reject(self, priority: str, reason: str, position: int) -> Overloaded:
+        self._rejected[priority][reason] += 1
+        return Overloaded(reason, max(0.1, self._estimate_wait(position)))
+
+    @contextmanager
+    def admit(self,
+              priority: str = "interactive",
+              deadline: Optional[float] = None,
+              cost_s: float = 0.0,
+              engines: int = 1) -> Iterator[None]:
+        """
+        Hold `engines` seats for the block. deadline is a time.monotonic() value by which the answer is
+        due; cost_s is the expected search time, so a request is only started if it can still finish.
+        Raises Overloaded instead of queueing when it cannot make it.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"unknown priority class: {priority}")
+        engines = min(max(1, engines), self.capacity)
+        started = time.monotonic()
+        start_by = None if deadline is None else deadline - cost_s
+        with self._cond:
+            position = self._ahead(priority)
+            if not (position == 0 and self._running + engines <= self.capacity):
+                if len(self._queues[priority]) >= self.max_queue[priority]:
+                    raise self._reject(priority, "queue_full", position)
+                if start_by is not None and started + self._estimate_wait(position) > start_by:
+                    raise self._reject(priority, "deadline", position)
+                token = object()
+                queue = self._queues[priority]
+                queue.append(token)
+                self._max_depth[priority] = max(self._max_depth[priority], len(queue))
+                try:
+                    while not (self._running + engines <= self.capacity and self._head(priority, token)):
+                        remaining = None if start_by is None else start_by - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            raise self._reject(priority, "deadline", self._ahead(priority))
+                        self._cond.wait(remaining)
+                finally:
+                    queue.remove(token)
+                    self._cond.notify_all()  # the next head may be able to go now
+            self._running += engines
+            self._admitted[priority] += 1
+            self._waited_s[priority] += time.monotonic() - started
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            took = time.monotonic() - t0
+            with self._cond:
+                self._running -= engines
+                self._service_s = took if self._service_s == 0.0 else 0.8 * self._service_s + 0.2 * took
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "running": self._running,
+                "service_ms": round(self._service_s * 1000, 1),
+                "classes": {
+                    c: {
+                        "queued": len(self._queues[c]),
+                        "max_queue": self.max_queue[c],
+                        "max_queued_seen": self._max_depth[c],
+                        "admitted": self._admitted[c],
+                        "rejected": dict(self._rejected[c]),
+                        "mean_wait_ms": round(self._waited_s[c] / self._admitted[c] * 1000, 1)
+                        if self._admitted[c] else 0.0,
+                    }
+                    for c in CLASSES
+                },
+            }
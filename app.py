@@ -5,306 +5,167 @@
 import os
 os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
 
+import time
+_IMPORT_T0 = time.perf_counter()
+
 import atexit
+import json
+import math
 import threading
-import subprocess
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Tuple, Dict, Any
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 import chess
 import chess.engine  # python-chess engine bridge
-from chess.engine import EngineTerminatedError, EngineError
 
+import admission_support
+import batch_support
+import book_support
+import cache_support
+import comment_support
+import engine_support
+import feature_support
 import rag_support
 import gemini_support
+import metrics_support
+import queue_support
+import session_support
+import speculation_support
+import store_support
+import stream_support
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
+# ----------------------------- Startup report -----------------------------
+# stage -> ms; heavy deps (torch, llama-index, google.generativeai) load lazily, so with the
+# dense index and LLM disabled the process is ready in a fraction of a second.
+STARTUP_MS: Dict[str, float] = {"imports": round((time.perf_counter() - _IMPORT_T0) * 1000, 1)}
+
+
+@contextmanager
+def startup_stage(name: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_MS[name] = round((time.perf_counter() - t) * 1000, 1)
+
+
+def startup_report() -> Dict[str, Any]:
+    return {**STARTUP_MS, "rag": dict(rag_support.STARTUP_MS)}
+
 # ----------------------------- Engine management -----------------------------
-ENGINE = None
-ENGINE_LOCK = threading.Lock()
+POOL: Optional[engine_support.EnginePool] = None
 ENGINE_READY = False
+# With $SENSEI_BROKER_URL searches are jobs on a queue, run by engine_worker.py processes on any
+# host ("local": an in-process broker fed by this process's own pool, for testing the path).
+BROKER_URL = os.getenv("SENSEI_BROKER_URL", "")
+REMOTE: Optional[queue_support.RemoteEngine] = None
+LOCAL_WORKER: Optional[queue_support.EngineWorker] = None
 
 
 def find_engine_path() -> str:
     """Find Stockfish binary path from $STOCKFISH_PATH or assume 'stockfish' in PATH."""
-    return os.getenv("STOCKFISH_PATH") or "stockfish"
+    return engine_support.find_engine_path()
 
 
 def init_engine():
-    """Start Stockfish once and configure light options."""
-    global ENGINE, ENGINE_READY
-    if ENGINE_READY and ENGINE is not None:
+    """Start the Stockfish pool once ($SENSEI_ENGINES processes + a warm standby, Threads/Hash sized from the box)."""
+    global POOL, ENGINE_READY
+    if BROKER_URL:
+        init_remote()
         return
-    path = find_engine_path()
-    try:
-        # IMPORTANT: send stderr to DEVNULL so we don't fill an unread PIPE.
-        ENGINE = chess.engine.SimpleEngine.popen_uci(
-            path,
-            setpgrp=True,
-            stderr=subprocess.DEVNULL,
-        )
-        ENGINE.configure({
-            "Threads": 2,   # keep it light and responsive
-            "Hash": 64,     # MB
-            # You can add tablebase or NNUE options here later if needed.
-        })
-        ENGINE_READY = True
-        print(f"[engine] Stockfish started at: {path}")
-    except Exception as e:
-        print(f"[engine] Could not start Stockfish at '{path}': {e}")
-        ENGINE = None
-        ENGINE_READY = False
-
-
-def restart_engine():
-    """Kill & reinit the engine after a crash."""
-    global ENGINE, ENGINE_READY
-    try:
-        if ENGINE is not None:
-            ENGINE.quit()
-    except Exception:
-        pass
-    ENGINE = None
-    ENGINE_READY = False
-    init_engine()
+    if ENGINE_READY and POOL is not None:
+        return
+    if POOL is None:
+        POOL = engine_support.pool_from_env()
+    with startup_stage("engine_pool"):
+        ENGINE_READY = POOL.start() > 0
+
+
+def init_remote():
+    """Connect to the job broker; engines live in engine_worker.py processes (or LOCAL_WORKER)."""
+    global POOL, REMOTE, LOCAL_WORKER, ENGINE_READY
+    with startup_stage("broker"):
+        if REMOTE is None:
+            broker = queue_support.open_broker(BROKER_URL)
+            if BROKER_URL == "local":
+                POOL = engine_support.pool_from_env()
+                POOL.start()
+                LOCAL_WORKER = queue_support.EngineWorker(broker, POOL).start()
+            REMOTE = queue_support.RemoteEngine(
+                broker,
+                max_attempts=int(os.getenv("SENSEI_JOB_ATTEMPTS", "2")),
+                lease_grace_s=float(os.getenv("SENSEI_JOB_LEASE_GRACE_S", "5")),
+            ).start()
+        ENGINE_READY = REMOTE.ready()
+
+
+# Adaptive search time: movetime is a ceiling; a search ends early on a forced move, a found mate,
+# or a best move that stays put for SENSEI_STABLE_DEPTHS depths.
+ADAPTIVE = os.getenv("SENSEI_ADAPTIVE", "1") != "0"
+STABLE_DEPTHS = int(os.getenv("SENSEI_STABLE_DEPTHS", "4"))
+STABLE_MARGIN_CP = int(os.getenv("SENSEI_STABLE_MARGIN_CP", "20"))
+ADAPTIVE_MIN_DEPTH = int(os.getenv("SENSEI_ADAPTIVE_MIN_DEPTH", "10"))
+
+
+def early_stop_rule(board: chess.Board, lines: int = 1) -> Optional[engine_support.EarlyStop]:
+    """Fresh stop rule for one search of `board`, or None with $SENSEI_ADAPTIVE=0."""
+    if not ADAPTIVE:
+        return None
+    return engine_support.EarlyStop.for_board(board, lines=lines, stable_depths=STABLE_DEPTHS,
+                                              margin_cp=STABLE_MARGIN_CP, min_depth=ADAPTIVE_MIN_DEPTH)
 
 
 def engine_analyse_safe(board: chess.Board,
                         limit: chess.engine.Limit,
-                        multipv: Optional[int] = None):
+                        multipv: Optional[int] = None,
+                        ticket: Optional[session_support.Ticket] = None,
+                        game: Optional[str] = None):
     """
-    Wrapper around ENGINE.analyse that auto-restarts Stockfish once if it died.
+    Run one search on a pooled engine; a crashed engine is replaced in its slot and retried once.
+    A session ticket lets a newer position for the same session stop this search (raises Superseded).
+    A game id routes the search to the engine bound to that game (hash reuse across moves).
+    Inside an admitted request the wait for an engine is also capped by the request's deadline.
+    The limit is an upper bound: the search may stop early once the best move is settled.
     Returns dict or list[dict] like python-chess. Raises only after two failures.
     """
-    global ENGINE_READY
-    last_exc = None
-    for attempt in (1, 2):
-        try:
-            if not ENGINE_READY or ENGINE is None:
-                init_engine()
-                if not ENGINE_READY:
-                    raise RuntimeError("Stockfish not available")
-            with ENGINE_LOCK:
-                if multipv is not None:
-                    return ENGINE.analyse(board, limit, multipv=multipv)
-                return ENGINE.analyse(board, limit)
-        except (EngineTerminatedError, EngineError, BrokenPipeError) as e:
-            print(f"[engine] analyse failed ({type(e).__name__}); restarting (attempt {attempt})")
-            last_exc = e
-            restart_engine()
-    raise last_exc or RuntimeError("Stockfish analyse failed")
+    if not ENGINE_READY or (POOL is None and REMOTE is None):
+        init_engine()
+        if not ENGINE_READY:
+            raise RuntimeError("Stockfish not available")
+    if REMOTE is not None:
+        return REMOTE.analyse(board, limit, multipv=multipv, timeout=_within_deadline(REMOTE.default_timeout_s),
+                              ticket=ticket, game=game, early_stop=early_stop_rule(board, multipv or 1))
+    return POOL.analyse(board, limit, multipv=multipv, timeout=_within_deadline(POOL.checkout_timeout_s),
+                        ticket=ticket, game=game, early_stop=early_stop_rule(board, multipv or 1))
+
+
+def _within_deadline(timeout_s: float) -> float:
+    """The configured wait, shortened to what is left of the current request's deadline (if any)."""
+    left = admission_support.time_left()
+    return timeout_s if left is None else min(timeout_s, left)
 
 
 @atexit.register
 def close_engine():
     """Gracefully close on process exit."""
-    global ENGINE
     try:
-        if ENGINE is not None:
-            ENGINE.quit()
+        if REMOTE is not None:
+            REMOTE.close()
+        if LOCAL_WORKER is not None:
+            LOCAL_WORKER.stop()
+        if POOL is not None:
+            POOL.close()
     except Exception:
         pass
 
 
-# ----------------------------- small board feature helpers (for RAG cues) -----------------------------
-def is_castled_short(board: chess.Board, color: chess.Color) -> bool:
-    k = board.king(color)
-    return k in (chess.G1, chess.G8)
-
-
-def queen_on_h5_or_h4(board: chess.Board, color: chess.Color) -> bool:
-    sym = 'Q' if color == chess.WHITE else 'q'
-    for sq in (chess.H5, chess.H4):
-        p = board.piece_at(sq)
-        if p and p.symbol() == sym:
-            return True
-    return False
-
-
-def line_to_h7_or_h2(board: chess.Board, attacker_color: chess.Color, our_color: chess.Color) -> bool:
-    target = chess.H7 if our_color == chess.WHITE else chess.H2
-    for sq in board.attackers(attacker_color, target):
-        pc = board.piece_at(sq)
-        if pc and pc.color == attacker_color and pc.piece_type in (chess.BISHOP, chess.QUEEN):
-            return True
-    return False
-
-
-def our_back_rank_boxed(board: chess.Board, our_color: chess.Color) -> bool:
-    k = board.king(our_color)
-    if k not in (chess.E1, chess.G1, chess.C1, chess.E8, chess.G8, chess.C8):
-        return False
-    rank = 1 if our_color == chess.WHITE else 6
-    pawns = 0
-    for file_idx in (5, 6, 7):  # f,g,h
-        sq = chess.square(file_idx, rank)
-        p = board.piece_at(sq)
-        if p and p.piece_type == chess.PAWN and p.color == our_color:
-            pawns += 1
-    return pawns >= 2
-
-
-def their_major_on_open_file(board: chess.Board, opp_color: chess.Color) -> bool:
-    for pt in (chess.ROOK, chess.QUEEN):
-        for sq in board.pieces(pt, opp_color):
-            file_idx = chess.square_file(sq)
-            pawn_on_file = any(
-                (board.piece_at(chess.square(file_idx, r)) and
-                 board.piece_at(chess.square(file_idx, r)).piece_type == chess.PAWN)
-                for r in range(8)
-            )
-            if not pawn_on_file:
-                return True
-    return False
-
-
-def our_hanging_piece_exists(board: chess.Board, our_color: chess.Color) -> bool:
-    opp = not our_color
-    for sq, piece in board.piece_map().items():
-        if piece.color != our_color:
-            continue
-        attacked = board.is_attacked_by(opp, sq)
-        defended = board.is_attacked_by(our_color, sq)
-        if attacked and not defended:
-            return True
-    return False
-
-
-def their_king_castled_short(board: chess.Board, opp_color: chess.Color) -> bool:
-    k = board.king(opp_color)
-    return k in (chess.G1, chess.G8)
-
-
-def our_bishop_attacks_h7_or_h2(board: chess.Board, our_color: chess.Color, opp_color: chess.Color) -> bool:
-    target = chess.H7 if opp_color == chess.BLACK else chess.H2
-    for sq in board.attackers(our_color, target):
-        p = board.piece_at(sq)
-        if p and p.color == our_color and p.piece_type == chess.BISHOP:
-            return True
-    return False
-
-
-def our_knight_can_jump_g5_or_g4(board: chess.Board, our_color: chess.Color) -> bool:
-    targets = [chess.G5, chess.G4]
-    for from_sq in board.pieces(chess.KNIGHT, our_color):
-        for t in targets:
-            m = chess.Move(from_sq, t)
-            if m in board.legal_moves:
-                return True
-    return False
-
-
-def any_pinned_piece_to_king(board: chess.Board, opp_color: chess.Color) -> bool:
-    for sq, piece in board.piece_map().items():
-        if piece.color != opp_color:
-            continue
-        if board.is_pinned(opp_color, sq):
-            return True
-    return False
-
-
-def xray_same_file_as_king_with_one_blocker(board: chess.Board, our_color: chess.Color, opp_color: chess.Color) -> bool:
-    """Our rook/queen share file with enemy king, exactly one piece between."""
-    ksq = board.king(opp_color)
-    k_file = chess.square_file(ksq)
-    for pt in (chess.ROOK, chess.QUEEN):
-        for sq in board.pieces(pt, our_color):
-            if chess.square_file(sq) != k_file:
-                continue
-            blockers = 0
-            start_rank = chess.square_rank(sq)
-            end_rank = chess.square_rank(ksq)
-            step = 1 if end_rank > start_rank else -1
-            for r in range(start_rank + step, end_rank, step):
-                mid = chess.square(k_file, r)
-                if board.piece_at(mid):
-                    blockers += 1
-                    if blockers > 1:
-                        break
-            if blockers == 1:
-                return True
-    return False
-
-
-def queen_bishop_same_diagonal_with_blocker(board: chess.Board, our_color: chess.Color) -> bool:
-    """Our queen and bishop are aligned on a diagonal with exactly one friendly blocker between (discovered attack potential)."""
-    qs = list(board.pieces(chess.QUEEN, our_color))
-    bs = list(board.pieces(chess.BISHOP, our_color))
-    for q in qs:
-        for b in bs:
-            df = abs(chess.square_file(q) - chess.square_file(b))
-            dr = abs(chess.square_rank(q) - chess.square_rank(b))
-            if df != dr:
-                continue
-            sf = 1 if chess.square_file(b) > chess.square_file(q) else -1
-            sr = 1 if chess.square_rank(b) > chess.square_rank(q) else -1
-            f, r = chess.square_file(q) + sf, chess.square_rank(q) + sr
-            blockers = 0
-            while f != chess.square_file(b) and r != chess.square_rank(b):
-                sq = chess.square(f, r)
-                piece = board.piece_at(sq)
-                if piece:
-                    if piece.color == our_color:
-                        blockers += 1
-                    else:
-                        blockers = 99
-                        break
-                f += sf; r += sr
-            if blockers == 1:
-                return True
-    return False
-
-
-def f7_f2_under_pressure(board: chess.Board, our_color: chess.Color, opp_color: chess.Color) -> bool:
-    """Attackers on f7/f2 outnumber defenders (rough threshold)."""
-    target = chess.F7 if opp_color == chess.BLACK else chess.F2
-    att = len(board.attackers(our_color, target))
-    deff = len(board.attackers(opp_color, target))
-    return att >= max(2, deff + 1)
-
-
-def build_feature_tokens(board: chess.Board, last_move_san: Optional[str]) -> List[str]:
-    our_color = board.turn
-    opp_color = not our_color
-    feats = []
-
-    if last_move_san in ("Qh5", "Qh4"):
-        feats.append("opponent_queen_on_h5_or_h4")
-
-    if is_castled_short(board, our_color):
-        feats.append("our_king_castled_short")
-    if line_to_h7_or_h2(board, opp_color, our_color):
-        feats.append("line_to_h7_or_h2")
-    if our_back_rank_boxed(board, our_color):
-        feats.append("our_back_rank_boxed")
-    if their_major_on_open_file(board, opp_color):
-        feats.append("their_major_on_open_file")
-    if our_hanging_piece_exists(board, our_color):
-        feats.append("our_hanging_piece_exists")
-
-    if their_king_castled_short(board, opp_color):
-        feats.append("their_king_castled_short")
-    if our_bishop_attacks_h7_or_h2(board, our_color, opp_color):
-        feats.append("our_bishop_attacks_h7_or_h2")
-    if our_knight_can_jump_g5_or_g4(board, our_color):
-        feats.append("our_knight_can_jump_g5_or_g4")
-    if any_pinned_piece_to_king(board, opp_color):
-        feats.append("their_piece_pinned_to_king")
-    if xray_same_file_as_king_with_one_blocker(board, our_color, opp_color):
-        feats.append("xray_same_file_as_king_with_one_blocker")
-    if queen_bishop_same_diagonal_with_blocker(board, our_color):
-        feats.append("queen_bishop_same_diagonal_with_blocker")
-    if f7_f2_under_pressure(board, our_color, opp_color):
-        feats.append("f7_or_f2_under_pressure")
-
-    feats.append("phase_middlegame")  # safe default
-    return feats
-
-
 # ----------------------------- Small helpers -----------------------------
 def short_human_eval(score: chess.engine.PovScore) -> str:
     """Convert engine score to a short human string for the side-to-move POV."""
@@ -323,19 +184,35 @@ def san_of_move(board: chess.Board, move: chess.Move) -> str:
 
 
 # ----------------------------- Core engine queries -----------------------------
-def multipv_top(board: chess.Board, movetime_s: float = 0.4, lines: int = 3) -> List[Tuple[str, float]]:
-    """Ask Stockfish for multiple principal variations (MultiPV)."""
+# Runs the null-move threat search next to the MultiPV search when the pool has a second engine.
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sensei-search")
+
+
+@metrics_support.timed("multipv")
+def multipv_search(board: chess.Board,
+                   movetime_s: float = 0.4,
+                   lines: int = 3,
+                   ticket: Optional[session_support.Ticket] = None,
+                   game: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Raw MultiPV infos from Stockfish (best line first); [] if the engine is unavailable."""
     if not ENGINE_READY:
         return []
     try:
-        info_list = engine_analyse_safe(board, chess.engine.Limit(time=movetime_s), multipv=lines)
+        info_list = engine_analyse_safe(board, chess.engine.Limit(time=movetime_s), multipv=lines,
+                                        ticket=ticket, game=game)
+    except session_support.Superseded:
+        raise
     except Exception as e:
-        print(f"[engine] multipv_top failed: {e}")
+        print(f"[engine] multipv_search failed: {e}")
         return []
 
     if isinstance(info_list, dict):  # multipv=1 case
         info_list = [info_list]
+    return info_list
+
 
+def summarize_multipv(board: chess.Board, info_list: List[Dict[str, Any]]) -> List[Tuple[str, float]]:
+    """[(san, cp for side to move)] sorted best first."""
     results: List[Tuple[str, float]] = []
     for info in info_list:
         pv = info.get("pv", [])
@@ -352,7 +229,16 @@ def multipv_top(board: chess.Board, movetime_s: float = 0.4, lines: int = 3) ->
     return results
 
 
-def quick_threat_scan(board: chess.Board, time_s: float = 0.2) -> Dict[str, Any]:
+def multipv_top(board: chess.Board, movetime_s: float = 0.4, lines: int = 3) -> List[Tuple[str, float]]:
+    """Ask Stockfish for multiple principal variations (MultiPV)."""
+    return summarize_multipv(board, multipv_search(board, movetime_s, lines))
+
+
+@metrics_support.timed("threat_scan")
+def quick_threat_scan(board: chess.Board,
+                      time_s: float = 0.2,
+                      ticket: Optional[session_support.Ticket] = None,
+                      ctx: Optional[feature_support.PositionContext] = None) -> Dict[str, Any]:
     """Very fast 'what if we pass the move?' scan using a null move."""
     b = board.copy(stack=False)
     try:
@@ -361,20 +247,28 @@ def quick_threat_scan(board: chess.Board, time_s: float = 0.2) -> Dict[str, Any]
         return {"mate_threat": False, "checks_available": 0, "best_reply": None,
                 "opp_eval_if_idle_cp": None, "hanging_ours": [], "engine_down": False}
 
-    best_reply_san = None
-    opp_eval_cp = None
-    mate_threat = False
-    engine_down = False
-
     try:
-        info = engine_analyse_safe(b, chess.engine.Limit(time=time_s))
+        info = engine_analyse_safe(b, chess.engine.Limit(time=time_s), ticket=ticket)
+    except session_support.Superseded:
+        raise
     except Exception as e:
         print(f"[engine] quick_threat_scan failed: {e}")
         info = None
-        engine_down = True
+    return threats_from_info(board, b, info, ctx)
+
+
+def threats_from_info(board: chess.Board,
+                      passed: chess.Board,
+                      info: Optional[Dict[str, Any]],
+                      ctx: Optional[feature_support.PositionContext] = None) -> Dict[str, Any]:
+    """Threat summary from the null-move search on `passed` (info None: the engine failed)."""
+    best_reply_san = None
+    opp_eval_cp = None
+    mate_threat = False
+    engine_down = info is None
 
     if info is not None:
-        score_pov_opp = info["score"].pov(b.turn)
+        score_pov_opp = info["score"].pov(passed.turn)
         if score_pov_opp.is_mate():
             m = score_pov_opp.mate()
             mate_threat = bool(m and m > 0)
@@ -384,62 +278,187 @@ def quick_threat_scan(board: chess.Board, time_s: float = 0.2) -> Dict[str, Any]
 
         pv = info.get("pv", [])
         if pv:
-            best_reply_san = san_of_move(b, pv[0])
+            best_reply_san = san_of_move(passed, pv[0])
+
+    return {
+        "mate_threat": mate_threat,
+        "best_reply": best_reply_san,
+        "opp_eval_if_idle_cp": opp_eval_cp,
+        **board_threats(board, passed, ctx),
+        "engine_down": engine_down,
+    }
 
+
+def board_threats(board: chess.Board,
+                  passed: chess.Board,
+                  ctx: Optional[feature_support.PositionContext] = None) -> Dict[str, Any]:
+    """The engine-free part of the threat scan: opponent checks after a pass, our hanging pieces."""
     checks = 0
-    for mv in b.legal_moves:
+    for mv in passed.legal_moves:
         try:
-            if b.gives_check(mv):
+            if passed.gives_check(mv):
                 checks += 1
         except Exception:
             continue
 
     our_color = board.turn
-    opp_color = not our_color
+    ctx = ctx or feature_support.PositionContext(board)
     hanging: List[str] = []
-    for sq, piece in board.piece_map().items():
-        if piece.color != our_color:
-            continue
-        attacked_by_opp = board.is_attacked_by(opp_color, sq)
-        defended_by_us = board.is_attacked_by(our_color, sq)
-        if attacked_by_opp and not defended_by_us:
-            name = piece.symbol().upper() if our_color == chess.WHITE else piece.symbol().lower()
-            hanging.append(f"{name}{chess.square_name(sq)}")
+    for sq in chess.scan_reversed(ctx.hanging(our_color)):
+        piece = board.piece_at(sq)
+        name = piece.symbol().upper() if our_color == chess.WHITE else piece.symbol().lower()
+        hanging.append(f"{name}{chess.square_name(sq)}")
+    return {"checks_available": checks, "hanging_ours": hanging}
+
+
+@metrics_support.timed("plan")
+def plan_analysis(board: chess.Board,
+                  movetime_s: float = 0.4,
+                  threat_time_s: float = 0.2,
+                  lines: int = 3,
+                  ticket: Optional[session_support.Ticket] = None,
+                  game: Optional[str] = None,
+                  sequential: bool = False,
+                  priority: str = "interactive",
+                  deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    One search budget per position:
+    - the MultiPV search yields candidates, eval and the human eval string together
+    - the null-move threat scan runs concurrently on a second engine when the pool has one,
+      so latency is max(movetime, threat_time) instead of the sum
+    - sequential=True keeps both on one engine (batch work wants throughput, not latency)
+    - engine work is admitted in `priority` class and must be able to finish by `deadline`
+      (time.monotonic(); default: now + that class's deadline), else Overloaded is raised
+    """
+    with metrics_support.stage("position_context"):
+        ctx = feature_support.PositionContext(board)  # shared by the threat scan and the RAG cues
+    plan = book_plan(board, movetime_s, threat_time_s, ctx)
+    if plan is not None:
+        return plan
+    if ticket is not None and ticket.background:
+        # speculative work never queues: the pool only hands it engines nobody is waiting for
+        return _search_plan(board, ctx, movetime_s, threat_time_s, lines, ticket, game, sequential)
+    if deadline is None:
+        deadline = time.monotonic() + DEADLINE_S[priority]
+    t = time.perf_counter()
+    engines = 2 if _concurrent_searches() and not sequential else 1
+    with ADMISSION.admit(priority, deadline, cost_s=movetime_s, engines=engines):
+        metrics_support.record("admission_wait", t, time.perf_counter() - t)
+        with admission_support.deadline_scope(deadline):
+            return _search_plan(board, ctx, movetime_s, threat_time_s, lines, ticket, game, sequential)
+
+
+def _concurrent_searches() -> bool:
+    """Can the threat scan run beside the MultiPV search (a second engine, local or remote)?"""
+    return REMOTE is not None or (POOL is not None and POOL.size >= 2)
+
+
+def _search_plan(board: chess.Board,
+                 ctx: feature_support.PositionContext,
+                 movetime_s: float,
+                 threat_time_s: float,
+                 lines: int,
+                 ticket: Optional[session_support.Ticket],
+                 game: Optional[str],
+                 sequential: bool) -> Dict[str, Any]:
+    if game and POOL is not None:
+        POOL.slot_for_game(game)  # bind first, so the threat scan steers clear of the game's engine
+    # background (speculative) work runs sequentially so it never needs two idle engines at once
+    if _concurrent_searches() and not sequential and not (ticket is not None and ticket.background):
+        threat_future = _SEARCH_EXECUTOR.submit(
+            metrics_support.propagate(quick_threat_scan, board, threat_time_s, ticket, ctx))
+        info_list = multipv_search(board, movetime_s, lines, ticket=ticket, game=game)
+        threats = threat_future.result()
+    else:
+        threats = quick_threat_scan(board, time_s=threat_time_s, ticket=ticket, ctx=ctx)
+        info_list = multipv_search(board, movetime_s, lines, ticket=ticket, game=game)
+    return plan_from_infos(board, info_list, threats, ctx)
+
+
+# Known positions skip the engine: precomputed plans (tools/build_book.py), then an optional Polyglot book.
+BOOK = book_support.PositionBook(
+    path=os.getenv("SENSEI_BOOK_PATH", book_support.DEFAULT_PATH),
+    polyglot_path=os.getenv("SENSEI_POLYGLOT_PATH") or None,
+    enabled=os.getenv("SENSEI_BOOK", "1") != "0",
+)
+
+
+@metrics_support.timed("book")
+def book_plan(board: chess.Board,
+              movetime_s: float,
+              threat_time_s: float,
+              ctx: Optional[feature_support.PositionContext] = None) -> Optional[Dict[str, Any]]:
+    """A plan for a known position without touching the engine (plan["book"] says from where), else None."""
+    hit = BOOK.lookup(board, movetime_s, threat_time_s)
+    if hit is None:
+        return None
+    if "polyglot" not in hit:
+        return {**book_support.plan_from_entry(hit), "context": ctx}
+    # book moves carry weights, not evals
+    top = [(san_of_move(board, move), 0.0) for move, _ in hit["polyglot"]]
+    return {**static_plan(board, ctx, top), "book": "polyglot"}
+
+
+def static_plan(board: chess.Board,
+                ctx: Optional[feature_support.PositionContext] = None,
+                top: Optional[List[Tuple[str, float]]] = None) -> Dict[str, Any]:
+    """A plan without any search: threats are what the board shows, no eval, no PVs."""
+    passed = board.copy(stack=False)
+    passed.push(chess.Move.null())
+    threats = {"mate_threat": False, "best_reply": None, "opp_eval_if_idle_cp": None,
+               **board_threats(board, passed, ctx), "engine_down": False}
+    return {"threats": threats, "top": top or [], "eval_cp": None, "human_eval": None, "pvs": [], "context": ctx}
+
+
+def plan_from_infos(board: chess.Board,
+                    info_list: List[Dict[str, Any]],
+                    threats: Dict[str, Any],
+                    ctx: Optional[feature_support.PositionContext] = None) -> Dict[str, Any]:
+    """Candidates + eval from MultiPV infos (best line first), bundled with the threat scan."""
+    eval_cp = None
+    human_eval = None
+    if info_list and info_list[0].get("score") is not None:
+        pov = info_list[0]["score"].pov(board.turn)  # multipv=1 is the engine's best line
+        human_eval = short_human_eval(pov)
+        eval_cp = pov.score(mate_score=100000) / 100.0
 
     return {
-        "mate_threat": mate_threat,
-        "checks_available": checks,
-        "best_reply": best_reply_san,
-        "opp_eval_if_idle_cp": opp_eval_cp,
-        "hanging_ours": hanging,
-        "engine_down": engine_down,
+        "threats": threats,
+        "top": summarize_multipv(board, info_list),
+        "eval_cp": eval_cp,
+        "human_eval": human_eval,
+        "pvs": [info["pv"] for info in info_list if info.get("pv")],
+        "context": ctx,
     }
 
 
-def best_line_comment(board: chess.Board, last_move_san: Optional[str], movetime_s: float = 0.4):
+@metrics_support.timed("best_line_comment")
+def best_line_comment(board: chess.Board, last_move_san: Optional[str], plan: Dict[str, Any]):
     """
-    Drive engine once, produce short comments:
+    Produce short comments from an analysis plan (no extra engine call):
     - Opponent summary: last move + quick eval
     - Your suggestion: best move SAN + eval
     """
     if not ENGINE_READY:
         return ("Engine warming up…", "Retry in a moment.", [], None)
 
-    top = multipv_top(board, movetime_s=movetime_s, lines=3)
+    top = plan["top"]
     if not top:
         return ("Engine recovering…", "Retry shortly.", [], None)
 
     best_san, _ = top[0]
     candidates = [m for m, _ in top]
 
-    try:
-        info = engine_analyse_safe(board, chess.engine.Limit(time=0.2))
-        human_eval = short_human_eval(info["score"].pov(board.turn))
-        eval_cp = info["score"].pov(board.turn).score(mate_score=100000) / 100.0
-    except Exception as e:
-        print(f"[engine] best_line_comment quick eval failed: {e}")
-        human_eval = "+0.00"
-        eval_cp = 0.0
+    if plan.get("book") and plan["eval_cp"] is None:
+        # book moves (Polyglot) carry weights, not evals: no eval to quote, no "strongest" claim
+        opp_text = f"{last_move_san} — book position." if last_move_san else "Book position."
+        your_text = f"Book move: {best_san}."
+        if len(candidates) > 1:
+            your_text += f" Also played: {', '.join(candidates[1:3])}."
+        return (opp_text, your_text, candidates, None)
+
+    human_eval = plan["human_eval"] or "+0.00"
+    eval_cp = plan["eval_cp"]
 
     opp_text = f"{last_move_san} — position eval {human_eval}." if last_move_san else f"Position eval {human_eval}."
     your_text = f"Try {best_san}. It’s strongest here."
@@ -447,48 +466,154 @@ def best_line_comment(board: chess.Board, last_move_san: Optional[str], movetime
     return (opp_text, your_text, candidates, eval_cp)
 
 
-# ----------------------------- Flask routes -----------------------------
-@app.post("/api/analyze")
-def analyze():
-    # lazy init engine
-    if not ENGINE_READY:
-        init_engine()
-
-    # lazy init RAG index
-    if not rag_support.has_index():
-        rag_support.init_index("corpus/motifs")
-
-    data = request.get_json(silent=True) or {}
-    fen = data.get("fen")
-    if not fen:
-        return jsonify({"error": "fen is required"}), 400
-
-    last_move_san = data.get("last_move_san")
-    side_to_move = data.get("side_to_move")
-    movetime_ms = float(data.get("movetime_ms", 400))
-    threat_time_ms = float(data.get("threat_time_ms", 200))
-    movetime_s = max(0.08, min(1.0, movetime_ms / 1000.0))
-    threat_time_s = max(0.05, min(0.6, threat_time_ms / 1000.0))
-
+# ----------------------------- Analysis pipeline -----------------------------
+# With $SENSEI_STORE_URL (serve.py sets one for its workers) results are shared across processes.
+if os.getenv("SENSEI_STORE_URL"):
+    RESULT_CACHE = cache_support.SharedAnalysisCache(
+        store_support.open_store(os.environ["SENSEI_STORE_URL"]),
+        local_entries=int(os.getenv("SENSEI_CACHE_LOCAL_SIZE", "512")),
+        ttl_s=float(os.getenv("SENSEI_CACHE_TTL_S", "3600")),
+    )
+else:
+    RESULT_CACHE = cache_support.AnalysisCache(
+        max_entries=int(os.getenv("SENSEI_CACHE_SIZE", "4096")),
+        ttl_s=float(os.getenv("SENSEI_CACHE_TTL_S", "3600")),
+    )
+# Bursts of identical requests (auto-analyze on every board mutation) share one computation.
+IN_FLIGHT = cache_support.SingleFlight()
+# Streaming searches the client may cancel by stream_id.
+STREAMS = stream_support.StreamRegistry()
+# Per-client sessions: a newer position stops the session's older searches and queued work.
+SESSIONS = session_support.SessionRegistry()
+# Admission control in front of the pool: bounded queues per priority class, deadlines, fail fast.
+# Capacity counts engines: an interactive search holds two (threat scan alongside), a sequential batch one.
+ADMISSION = admission_support.Admission(
+    capacity=int(os.getenv("SENSEI_ADMIT_CAPACITY", str(engine_support.default_pool_size()))),
+    max_queue={
+        "interactive": int(os.getenv("SENSEI_QUEUE_INTERACTIVE", str(2 * engine_support.default_pool_size()))),
+        "batch": int(os.getenv("SENSEI_QUEUE_BATCH", str(4 * engine_support.default_pool_size()))),
+    },
+)
+DEADLINE_S = {
+    "interactive": float(os.getenv("SENSEI_DEADLINE_MS", "8000")) / 1000.0,
+    "batch": float(os.getenv("SENSEI_BATCH_DEADLINE_MS", "60000")) / 1000.0,
+}
+
+
+def request_deadline(data: Dict[str, Any]) -> float:
+    """time.monotonic() by which this request's answer is due: body deadline_ms, else the interactive default."""
     try:
-        board = chess.Board(fen)
-    except Exception as e:
-        return jsonify({"error": f"Invalid FEN: {e}"}), 400
+        budget_s = float(data["deadline_ms"]) / 1000.0
+    except (KeyError, TypeError, ValueError):
+        budget_s = DEADLINE_S["interactive"]
+    return time.monotonic() + max(0.1, min(60.0, budget_s))
+
+
+def degraded_payload(board: chess.Board,
+                     last_move_san: Optional[str],
+                     key: Tuple,
+                     overload: admission_support.Overloaded) -> Dict[str, Any]:
+    """Fail-fast answer for a request admission turned away: a cached result at any depth, else features + motifs."""
+    cached = RESULT_CACHE.get_any(key)
+    if cached is not None:
+        payload = {**cached, "cached": True}
+    else:
+        plan = static_plan(board, feature_support.PositionContext(board))
+        payload = {**compose_payload(board, last_move_san, plan, use_llm=False), "cached": False}
+    return {**payload, "degraded": overload.reason, "retry_after_ms": round(overload.retry_after_s * 1000)}
+
+
+def analyze_position(board: chess.Board,
+                     last_move_san: Optional[str],
+                     movetime_s: float,
+                     threat_time_s: float,
+                     use_llm: bool,
+                     ticket: Optional[session_support.Ticket] = None,
+                     game: Optional[str] = None) -> Dict[str, Any]:
+    """Engine + RAG (+ optional LLM) pipeline for one position; returns the /api/analyze payload."""
+    # 1+2) threats and best moves from one search budget (safe)
+    plan = plan_analysis(board, movetime_s=movetime_s, threat_time_s=threat_time_s, ticket=ticket, game=game)
+    return compose_payload(board, last_move_san, plan, use_llm)
+
+
+def _under_threat(threats: Dict[str, Any]) -> bool:
+    return bool(threats["mate_threat"] or threats["checks_available"] >= 1 or threats["hanging_ours"])
+
+
+@metrics_support.timed("llm")
+def llm_phrasing(last_move_san: Optional[str],
+                 candidates: List[str],
+                 eval_hint: Optional[float],
+                 threats: Dict[str, Any],
+                 card: Optional[Dict[str, Any]],
+                 budget_s: Optional[float] = None) -> Dict[str, str]:
+    """Gemini comments for a finished analysis; empty strings when it has nothing within budget."""
+    return gemini_support.generate_comments(
+        last_move_san=last_move_san,
+        engine_best_san=candidates[0] if candidates else "",
+        candidates=candidates,
+        eval_cp=eval_hint,
+        threats=threats,
+        motif_card=card,
+        budget_s=budget_s,
+    )
+
+
+def merge_llm_comments(threats: Dict[str, Any], opp_comment: str, your_comment: str,
+                       llm_out: Dict[str, str]) -> Tuple[str, str]:
+    if llm_out.get("opponent_comment"):
+        opp_comment = llm_out["opponent_comment"]
+    if llm_out.get("your_comment"):
+        if _under_threat(threats) and not llm_out["your_comment"].lower().startswith("parry"):
+            your_comment = "Parry threats first. " + llm_out["your_comment"]
+        else:
+            your_comment = llm_out["your_comment"]
+    return opp_comment, your_comment
+
 
-    if side_to_move:
-        stm_is_white = (side_to_move.lower() == "white")
-        if stm_is_white != board.turn:
-            board.turn = chess.WHITE if stm_is_white else chess.BLACK
+def threat_blurb(threats: Dict[str, Any]) -> str:
+    bits = []
+    if threats["mate_threat"]:
+        bits.append("mate threat")
+    if threats["checks_available"] >= 2:
+        bits.append(f"{threats['checks_available']} checking moves")
+    elif threats["checks_available"] == 1:
+        bits.append("a checking move")
+    if threats["hanging_ours"]:
+        bits.append(f"hanging: {', '.join(threats['hanging_ours'])}")
+    return (" Threat: " + "; ".join(bits) + ".") if bits else ""
 
-    # 1) threats (safe)
-    threats = quick_threat_scan(board, time_s=threat_time_s)
 
-    # 2) best moves (safe)
-    opp_comment, your_comment, candidates, eval_cp = best_line_comment(board, last_move_san, movetime_s)
+def motif_lookup(board: chess.Board,
+                 last_move_san: Optional[str],
+                 ctx: Optional[feature_support.PositionContext] = None) -> Tuple[List[str], List[Dict[str, Any]], bool]:
+    """
+    (feature tokens, motif cards, settled) for a position; needs no engine, so it can run during the search.
+    settled=False: tied cards were ordered before the query model loaded and may be reordered later.
+    """
+    with metrics_support.stage("features"):
+        feat_tokens = feature_support.build_feature_tokens(board, last_move_san, ctx)
+    settled = rag_support.ties_settled()
+    with metrics_support.stage("motifs"):
+        cards = rag_support.retrieve_motifs(feat_tokens, top_k=5)
+    return feat_tokens, cards, settled
+
+
+@metrics_support.timed("compose")
+def compose_payload(board: chess.Board,
+                    last_move_san: Optional[str],
+                    plan: Dict[str, Any],
+                    use_llm: bool,
+                    motifs: Optional[Tuple[List[str], List[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+    """
+    Turn an analysis plan into comments: engine text, then RAG cards, then optional LLM phrasing.
+    `motifs` is a motif_lookup() result computed earlier (else it is looked up here).
+    """
+    threats = plan["threats"]
+    opp_comment, your_comment, candidates, eval_cp = best_line_comment(board, last_move_san, plan)
 
     # 3) RAG: retrieve motif cards using cheap board features
-    feat_tokens = build_feature_tokens(board, last_move_san)
-    cards = rag_support.retrieve_motifs(feat_tokens, top_k=5)
+    feat_tokens, cards, rag_settled = motifs or motif_lookup(board, last_move_san, plan.get("context"))
     primary_card = cards[0] if cards else None
     rag_text = rag_support.format_comments_from_cards(cards, last_move_san)
 
@@ -496,65 +621,622 @@ def analyze():
     if rag_text["opponent_comment"]:
         opp_comment = rag_text["opponent_comment"]
     if rag_text["your_comment"]:
-        if threats["mate_threat"] or threats["checks_available"] >= 1 or threats["hanging_ours"]:
+        if _under_threat(threats):
             your_comment = "Parry threats first. " + rag_text["your_comment"]
         else:
             your_comment = rag_text["your_comment"]
 
-    # LLM phrasing layer (Gemini)
-    use_llm = bool(os.getenv("GOOGLE_API_KEY")) and bool(data.get("use_llm", False))
+    # LLM phrasing layer (Gemini); past its budget we keep the RAG text above
+    llm_fallback = False
     if use_llm:
-        engine_best_san = candidates[0] if candidates else None
-        llm_out = gemini_support.generate_comments(
-            last_move_san=last_move_san,
-            engine_best_san=engine_best_san or "",
-            candidates=candidates,
-            eval_cp=eval_cp,
-            threats=threats,
-            motif_card=primary_card,
-        )
-        if llm_out.get("opponent_comment"):
-            opp_comment = llm_out["opponent_comment"]
-        if llm_out.get("your_comment"):
-            if (threats["mate_threat"] or threats["checks_available"] >= 1 or threats["hanging_ours"]) \
-               and not llm_out["your_comment"].lower().startswith("parry"):
-                your_comment = "Parry threats first. " + llm_out["your_comment"]
-            else:
-                your_comment = llm_out["your_comment"]
+        llm_out = llm_phrasing(last_move_san, candidates, None if eval_cp is None else round(eval_cp, 2),
+                               threats, primary_card)
+        llm_fallback = not (llm_out.get("opponent_comment") or llm_out.get("your_comment"))
+        opp_comment, your_comment = merge_llm_comments(threats, opp_comment, your_comment, llm_out)
 
     # Append a concise threat blurb for transparency
-    bits = []
-    if threats["mate_threat"]:
-        bits.append("mate threat")
-    if threats["checks_available"] >= 2:
-        bits.append(f"{threats['checks_available']} checking moves")
-    elif threats["checks_available"] == 1:
-        bits.append("a checking move")
-    if threats["hanging_ours"]:
-        bits.append(f"hanging: {', '.join(threats['hanging_ours'])}")
-    if bits:
-        opp_comment = f"{opp_comment} Threat: " + "; ".join(bits) + "."
+    opp_comment += threat_blurb(threats)
 
-    return jsonify({
+    return {
         "llm_available": bool(os.getenv("GOOGLE_API_KEY")),
-        "llm_used": bool(os.getenv("GOOGLE_API_KEY")) and bool(data.get("use_llm", False)),
+        "llm_used": use_llm,
+        "llm_fallback": llm_fallback,
         "opponent_comment": opp_comment,
         "your_comment": your_comment,
         "candidates": candidates,
         "eval_hint": None if eval_cp is None else round(eval_cp, 2),
         "threats": threats,
         "features": feat_tokens,
-        "rag_cards_used": [c["id"] for c in cards]
-    }), 200
+        "rag_cards_used": [c["id"] for c in cards],
+        "book_hit": plan.get("book") is not None,
+        "rag_provisional": not rag_settled,
+    }
+
+
+def cacheable(payload: Dict[str, Any]) -> bool:
+    """
+    Only keep full engine answers; warm-up / recovery / LLM-timeout fallbacks must be retried,
+    and so must motif picks made before the tie-break model loaded (they would change afterwards).
+    """
+    return bool(payload["candidates"]) and not payload["threats"]["engine_down"] \
+        and not payload.get("llm_fallback") and not payload.get("rag_provisional")
+
+
+# ----------------------------- Deferred LLM comments -----------------------------
+# defer_llm: answer with engine + RAG text at once, Gemini phrasing follows under a comment_ticket.
+COMMENTS = comment_support.CommentStore(
+    workers=int(os.getenv("SENSEI_COMMENT_WORKERS", "4")),
+    ttl_s=float(os.getenv("SENSEI_COMMENT_TTL_S", "300")),
+)
+# the client is already served, so the background call may take longer than GEMINI_TIMEOUT_S
+# (gemini_support stretches its HTTP timeout to the budget)
+DEFERRED_LLM_BUDGET_S = float(os.getenv("SENSEI_DEFERRED_LLM_BUDGET_S", "20"))
+
+
+def defer_llm_comments(payload: Dict[str, Any],
+                       last_move_san: Optional[str],
+                       llm_key: Tuple,
+                       movetime_s: float,
+                       threat_time_s: float) -> Dict[str, Any]:
+    """Attach a comment_ticket to an engine + RAG payload; the finished LLM payload is cached under llm_key."""
+    base = {k: v for k, v in payload.items() if k != "cached"}
+
+    def job() -> Dict[str, Any]:
+        card_ids = base["rag_cards_used"]
+        card = rag_support.get_card(card_ids[0]) if card_ids else None
+        llm_out = llm_phrasing(last_move_san, base["candidates"], base["eval_hint"], base["threats"], card,
+                               budget_s=DEFERRED_LLM_BUDGET_S)
+        if not (llm_out.get("opponent_comment") or llm_out.get("your_comment")):
+            return {"opponent_comment": base["opponent_comment"], "your_comment": base["your_comment"],
+                    "llm_fallback": True}
+        opp, you = merge_llm_comments(base["threats"], base["opponent_comment"], base["your_comment"], llm_out)
+        if llm_out.get("opponent_comment"):
+            opp += threat_blurb(base["threats"])
+        full = {**base, "opponent_comment": opp, "your_comment": you, "llm_used": True, "llm_fallback": False}
+        if cacheable(full):
+            RESULT_CACHE.put(llm_key, full, movetime_s, threat_time_s)
+        return {"opponent_comment": opp, "your_comment": you, "llm_fallback": False}
+
+    return {**payload, "comment_ticket": COMMENTS.submit(job), "llm_pending": True}
+
+
+# ----------------------------- Speculative pre-analysis -----------------------------
+def speculative_jobs(board: chess.Board,
+                     plan: Dict[str, Any],
+                     movetime_s: float,
+                     threat_time_s: float,
+                     session_key: str,
+                     game: Optional[str]) -> List[speculation_support.SpecJob]:
+    """
+    Likely next positions, per candidate line (best first): after the candidate itself (pv[0], the
+    position a client analyzes right after playing it) and after the engine's predicted reply (pv[1]).
+    """
+    jobs: List[speculation_support.SpecJob] = []
+    for pv in plan.get("pvs", []):
+        if not pv:
+            continue
+        b = board.copy()
+        try:
+            move_san = san_of_move(b, pv[0])
+            b.push(pv[0])
+        except (ValueError, AssertionError):
+            continue
+        jobs.append(speculation_support.SpecJob(session_key, b.copy(), move_san, movetime_s, threat_time_s, game))
+        if len(pv) < 2 or b.is_game_over():
+            continue
+        try:
+            reply_san = san_of_move(b, pv[1])
+            b.push(pv[1])
+        except (ValueError, AssertionError):
+            continue
+        jobs.append(speculation_support.SpecJob(session_key, b, reply_san, movetime_s, threat_time_s, game))
+    return jobs
+
+
+def _run_speculation(job: speculation_support.SpecJob, ticket: session_support.Ticket) -> bool:
+    """Analyze one likely next position into RESULT_CACHE (engine + RAG, no LLM). True if stored."""
+    if POOL is None or not POOL.wait_idle(timeout=10.0):
+        return False
+    # the extension sends last_move_san=null; a `moves` client gets the last move's SAN -> store both
+    variants = [None] + ([job.reply_san] if job.reply_san else [])
+    keys = [cache_support.position_key(job.board, lm, False) for lm in variants]
+    if all(RESULT_CACHE.peek(k, job.movetime_s, job.threat_time_s) for k in keys):
+        return False
+
+    plan = plan_analysis(job.board, movetime_s=job.movetime_s, threat_time_s=job.threat_time_s,
+                         ticket=ticket, game=job.game)
+    ticket.check()  # preempted mid-way -> partial plan, don't store
+    stored = False
+    for last_move_san, key in zip(variants, keys):
+        payload = compose_payload(job.board, last_move_san, plan, use_llm=False)
+        if cacheable(payload):
+            RESULT_CACHE.put(key, payload, job.movetime_s, job.threat_time_s)
+            stored = True
+    return stored
+
+
+# Idle engines pre-analyze the opponent's likely replies while the user is thinking.
+SPECULATOR = speculation_support.Speculator(
+    _run_speculation,
+    per_session=int(os.getenv("SENSEI_SPECULATE_PER_MOVE", "3")),
+)
+
+
+def _board_from_moves(start_fen: Optional[str], moves: List[str]) -> chess.Board:
+    """Replay a game's UCI move history so the engine gets `position startpos moves ...`."""
+    try:
+        board = chess.Board(start_fen) if start_fen else chess.Board()
+    except Exception as e:
+        raise ValueError(f"Invalid FEN: {e}")
+    for uci in moves:
+        try:
+            board.push_uci(str(uci))
+        except ValueError as e:
+            raise ValueError(f"Illegal move in history at ply {board.ply() + 1}: {uci} ({e})")
+    return board
+
+
+def parse_analyze_request(data: Dict[str, Any]) -> Tuple[chess.Board, Optional[str], float, float, bool]:
+    """
+    Validate an analyze body -> (board, last_move_san, movetime_s, threat_time_s, use_llm).
+    The position is `fen`, or the game history `moves` (UCI, from `start_fen` or the start position).
+    """
+    fen = data.get("fen")
+    moves = data.get("moves")
+    if not fen and not moves:
+        raise ValueError("fen is required")
+
+    last_move_san = data.get("last_move_san")
+    side_to_move = data.get("side_to_move")
+    movetime_ms = float(data.get("movetime_ms", 400))
+    threat_time_ms = float(data.get("threat_time_ms", 200))
+    movetime_s = max(0.08, min(1.0, movetime_ms / 1000.0))
+    threat_time_s = max(0.05, min(0.6, threat_time_ms / 1000.0))
+
+    if moves:
+        if not isinstance(moves, list):
+            raise ValueError("moves must be a list of UCI moves")
+        board = _board_from_moves(data.get("start_fen"), moves)
+        if not last_move_san:
+            last = board.pop()
+            last_move_san = san_of_move(board, last)
+            board.push(last)
+    else:
+        try:
+            board = chess.Board(fen)
+        except Exception as e:
+            raise ValueError(f"Invalid FEN: {e}")
+
+        if side_to_move:
+            stm_is_white = (side_to_move.lower() == "white")
+            if stm_is_white != board.turn:
+                board.turn = chess.WHITE if stm_is_white else chess.BLACK
+
+    use_llm = bool(os.getenv("GOOGLE_API_KEY")) and bool(data.get("use_llm", False))
+    return board, last_move_san, movetime_s, threat_time_s, use_llm
+
+
+def _game_key(data: Dict[str, Any]) -> Optional[str]:
+    """Engine affinity key: game_id, else session_id (one game per client session)."""
+    game = data.get("game_id") or data.get("session_id")
+    return str(game) if game else None
+
+
+def _lazy_init():
+    # lazy init engine
+    if not ENGINE_READY:
+        init_engine()
+
+    # lazy init RAG index
+    if not rag_support.has_index():
+        with startup_stage("rag_index"):
+            rag_support.init_index("corpus/motifs")
+
+    if not BOOK.loaded:
+        with startup_stage("book"):
+            BOOK.load()
+
+
+# ----------------------------- Batch annotation -----------------------------
+BATCH_MAX_POSITIONS = int(os.getenv("SENSEI_BATCH_MAX_POSITIONS", "2000"))
+
+
+def annotate_position(board: chess.Board,
+                      last_move_san: Optional[str],
+                      movetime_s: float,
+                      threat_time_s: float) -> Dict[str, Any]:
+    """Engine + RAG payload (no LLM) for batch work; shares RESULT_CACHE with /api/analyze, queues behind it."""
+    key = cache_support.position_key(board, last_move_san, False)
+    cached = RESULT_CACHE.get(key, movetime_s, threat_time_s)
+    if cached is not None:
+        return cached
+    plan = plan_analysis(board, movetime_s=movetime_s, threat_time_s=threat_time_s, sequential=True,
+                         priority="batch")
+    payload = compose_payload(board, last_move_san, plan, use_llm=False)
+    if cacheable(payload):
+        RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+    return payload
+
+
+def batch_workers() -> int:
+    """Leave one engine for interactive requests while a batch runs."""
+    if REMOTE is not None:
+        return max(1, REMOTE.capacity() - 1)
+    if POOL is None:
+        return 1
+    return max(1, POOL.size - 1)
+
+
+# ----------------------------- Metrics -----------------------------
+@app.before_request
+def _start_timer():
+    g.request_t0 = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    t0 = getattr(g, "request_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics_support.REGISTRY.inc("sensei_requests_total", route=route, status=response.status_code)
+
+        def observe() -> None:
+            metrics_support.REGISTRY.observe("sensei_request_seconds", time.perf_counter() - t0, route=route)
+
+        if response.is_streamed:
+            # SSE / NDJSON bodies are generated after this hook: time them until the stream closes
+            response.call_on_close(observe)
+        else:
+            observe()
+    return response
+
+
+# gauges read from the same stats /api/health reports
+for _prefix, _stats in (
+    ("sensei_cache", RESULT_CACHE.stats),
+    ("sensei_in_flight", IN_FLIGHT.stats),
+    ("sensei_streams", STREAMS.stats),
+    ("sensei_sessions", SESSIONS.stats),
+    ("sensei_speculation", SPECULATOR.stats),
+    ("sensei_comments", COMMENTS.stats),
+    ("sensei_llm", gemini_support.stats),
+    ("sensei_book", BOOK.stats),
+    ("sensei_admission", ADMISSION.stats),
+    ("sensei_pool", lambda: POOL.stats() if POOL is not None else {}),
+    ("sensei_broker", lambda: REMOTE.stats() if REMOTE is not None else {}),
+):
+    metrics_support.REGISTRY.add_collector(_prefix, _stats)
+
+
+# ----------------------------- Flask routes -----------------------------
+@app.post("/api/analyze")
+def analyze():
+    _lazy_init()
+
+    data = request.get_json(silent=True) or {}
+    # debug: true returns this request's stage spans (engine wait vs search, RAG, LLM, ...)
+    with metrics_support.trace(enabled=bool(data.get("debug"))) as tr:
+        out, status = _analyze(data)
+    if tr is not None:
+        out = {**out, "debug": tr.export()}
+    resp = jsonify(out)
+    if out.get("degraded"):
+        resp.headers["Retry-After"] = str(max(1, math.ceil(out["retry_after_ms"] / 1000)))
+    return resp, status
+
+
+def _analyze(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    try:
+        board, last_move_san, movetime_s, threat_time_s, use_llm = parse_analyze_request(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    llm_key = cache_support.position_key(board, last_move_san, use_llm)
+    with metrics_support.stage("cache_lookup"):
+        cached = RESULT_CACHE.get(llm_key, movetime_s, threat_time_s)
+    if cached is not None:
+        return {**cached, "cached": True}, 200
+
+    # deferred phrasing: compute (or reuse) the plain engine + RAG answer, LLM follows by ticket
+    defer = use_llm and bool(data.get("defer_llm"))
+    if defer:
+        use_llm = False
+        key = cache_support.position_key(board, last_move_san, False)
+        with metrics_support.stage("cache_lookup"):
+            cached = RESULT_CACHE.get(key, movetime_s, threat_time_s)
+        if cached is not None:
+            payload = defer_llm_comments(cached, last_move_san, llm_key, movetime_s, threat_time_s)
+            return {**payload, "cached": True}, 200
+    else:
+        key = llm_key
+
+    session_id = data.get("session_id")
+    flight_key = key + (movetime_s, threat_time_s)
+    # the same position again (re-clicked Analyze) joins the running search instead of superseding it
+    ticket = SESSIONS.begin(str(session_id), position=flight_key) if session_id else None
+    game = _game_key(data)
+    deadline = request_deadline(data)
+
+    def compute() -> Dict[str, Any]:
+        plan = plan_analysis(board, movetime_s=movetime_s, threat_time_s=threat_time_s, ticket=ticket, game=game,
+                             deadline=deadline)
+        payload = compose_payload(board, last_move_san, plan, use_llm)
+        if cacheable(payload):
+            RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+            if game:  # anonymous clients don't share one speculation budget
+                SPECULATOR.submit(game, speculative_jobs(board, plan, movetime_s, threat_time_s, game, game))
+        return payload
+
+    try:
+        for attempt in (1, 2):
+            try:
+                payload, _shared = IN_FLIGHT.do(flight_key, compute)
+                break
+            except session_support.Superseded:
+                # We may have joined another session's computation that got superseded: retry as leader.
+                if attempt == 2 or (ticket is not None and ticket.cancelled):
+                    return {"error": "superseded by a newer position", "superseded": True}, 409
+    except admission_support.Overloaded as e:
+        return degraded_payload(board, last_move_san, key, e), 503
+    finally:
+        SESSIONS.finish(ticket)
+    if defer:
+        payload = defer_llm_comments(payload, last_move_san, llm_key, movetime_s, threat_time_s)
+    return {**payload, "cached": False}, 200
+
+
+@app.post("/api/analyze/stream")
+def analyze_stream():
+    """
+    Same body as /api/analyze, answered as server-sent events:
+      start   {stream_id}                          -- use it with /api/analyze/cancel
+      threats {...}                                -- null-move scan, as soon as it finishes
+      update  {depth, candidates, eval_hint, ...}  -- once per completed depth
+      done    {full /api/analyze payload}          -- or: cancelled {stream_id}; `degraded` when overloaded
+      comments {status, opponent_comment, ...}     -- defer_llm only: the LLM phrasing, after done
+    A newer position for the same session_id cancels the stream as well.
+    """
+    _lazy_init()
+
+    data = request.get_json(silent=True) or {}
+    try:
+        board, last_move_san, movetime_s, threat_time_s, use_llm = parse_analyze_request(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stream_id = str(data.get("stream_id") or stream_support.new_stream_id())
+    llm_key = cache_support.position_key(board, last_move_san, use_llm)
+    defer = use_llm and bool(data.get("defer_llm"))
+    if defer:
+        use_llm = False
+    key = cache_support.position_key(board, last_move_san, use_llm)
+    session_id = data.get("session_id")
+    ticket = SESSIONS.begin(str(session_id)) if session_id else None
+    game = _game_key(data)
+    deadline = request_deadline(data)
+
+    def events():
+        try:
+            yield from stream_events()
+        finally:
+            SESSIONS.finish(ticket)
+
+    def finish(payload: Dict[str, Any], cached: bool):
+        if not defer:
+            yield stream_support.sse_event("done", {**payload, "cached": cached})
+            return
+        payload = defer_llm_comments(payload, last_move_san, llm_key, movetime_s, threat_time_s)
+        yield stream_support.sse_event("done", {**payload, "cached": cached})
+        comments = COMMENTS.get(payload["comment_ticket"], DEFERRED_LLM_BUDGET_S + 1.0)
+        yield stream_support.sse_event("comments", {"comment_ticket": payload["comment_ticket"], **(comments or {})})
+
+    def stream_events():
+        yield stream_support.sse_event("start", {"stream_id": stream_id})
+
+        cached = RESULT_CACHE.get(llm_key, movetime_s, threat_time_s)
+        if cached is not None:
+            yield stream_support.sse_event("done", {**cached, "cached": True})
+            return
+        cached = RESULT_CACHE.get(key, movetime_s, threat_time_s) if defer else None
+        if cached is not None:
+            yield from finish(cached, True)
+            return
+
+        started = time.monotonic()
+        ctx = feature_support.PositionContext(board)
+        plan = book_plan(board, movetime_s, threat_time_s, ctx)
+        if plan is not None:
+            yield stream_support.sse_event("threats", plan["threats"])
+            payload = compose_payload(board, last_move_san, plan, use_llm)
+            if cacheable(payload):
+                RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+            yield from finish(payload, False)
+            return
+
+        # one admission seat covers both searches; a full queue answers `done` with a degraded payload
+        with ExitStack() as seat:
+            try:
+                seat.enter_context(ADMISSION.admit("interactive", deadline, cost_s=movetime_s, engines=2))
+            except admission_support.Overloaded as e:
+                yield stream_support.sse_event("done", degraded_payload(board, last_move_san, key, e))
+                return
+            # the copied context carries the deadline (engine wait) and the trace (threat span) along
+            with admission_support.deadline_scope(deadline):
+                threat_future = _SEARCH_EXECUTOR.submit(
+                    metrics_support.propagate(quick_threat_scan, board, threat_time_s, ticket, ctx))
+            threats: Optional[Dict[str, Any]] = None
+            info_list: List[Dict[str, Any]] = []
+            lines = max(1, min(3, board.legal_moves.count()))
+            registered = cancelled = False
+            limit = chess.engine.Limit(time=movetime_s)
+            early_stop = early_stop_rule(board, lines)
+            try:
+                if REMOTE is not None:
+                    # engine nodes answer whole searches: no per-depth updates, just the result
+                    with admission_support.deadline_scope(deadline):
+                        info_list = multipv_search(board, movetime_s, lines, ticket=ticket, game=game)
+                else:
+                    if POOL is None or not ENGINE_READY:
+                        raise engine_support.EngineUnavailable("Stockfish not available")
+                    with POOL.analysis(board, limit, multipv=lines,
+                                       timeout=min(POOL.checkout_timeout_s, max(0.0, deadline - time.monotonic())),
+                                       ticket=ticket, game=game) as search:
+                        STREAMS.register(stream_id, search)
+                        registered = True
+                        for info in search:
+                            if threats is None and threat_future.done():
+                                threats = threat_future.result()
+                                yield stream_support.sse_event("threats", threats)
+                            if early_stop is not None and early_stop(info):
+                                search.stop()
+                                POOL.note_early_stop(early_stop.reason, limit, time.monotonic() - started)
+                                early_stop = None  # remaining infos drain until bestmove
+                            # the last MultiPV line of a depth closes that depth
+                            if info.get("multipv", 1) != lines or not info.get("pv"):
+                                continue
+                            info_list = [i for i in search.multipv if i.get("pv")]
+                            plan = plan_from_infos(board, info_list, threats or {})
+                            yield stream_support.sse_event("update", {
+                                "depth": info.get("depth"),
+                                "elapsed_ms": round((time.monotonic() - started) * 1000),
+                                "candidates": [m for m, _ in plan["top"]],
+                                "eval_hint": None if plan["eval_cp"] is None else round(plan["eval_cp"], 2),
+                                "human_eval": plan["human_eval"],
+                            })
+            except Exception as e:
+                print(f"[engine] analyze_stream failed: {e}")
+            finally:
+                # gone from the registry => /api/analyze/cancel stopped it
+                cancelled = registered and not STREAMS.unregister(stream_id)
+                cancelled = cancelled or (ticket is not None and ticket.cancelled)
+
+            if cancelled:
+                yield stream_support.sse_event("cancelled", {"stream_id": stream_id})
+                return
+
+            if threats is None:
+                threats = threat_future.result()
+                yield stream_support.sse_event("threats", threats)
+
+        plan = plan_from_infos(board, info_list, threats, ctx)
+        payload = compose_payload(board, last_move_san, plan, use_llm)
+        if cacheable(payload):
+            RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+            if game:  # anonymous clients don't share one speculation budget
+                SPECULATOR.submit(game, speculative_jobs(board, plan, movetime_s, threat_time_s, game, game))
+        yield from finish(payload, False)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/batch")
+def batch():
+    """
+    Annotate a whole game (or many): body {"pgn": "..."} or {"fens": [...]}, plus movetime_ms /
+    threat_time_ms / include_start. Answers NDJSON: one line per position in input order, then a
+    {"done": true, ...} summary line.
+    """
+    _lazy_init()
+
+    data = request.get_json(silent=True) or {}
+    try:
+        movetime_s = max(0.05, min(1.0, float(data.get("movetime_ms", 200)) / 1000.0))
+        threat_time_s = max(0.05, min(0.6, float(data.get("threat_time_ms", 100)) / 1000.0))
+        limit = min(BATCH_MAX_POSITIONS, int(data.get("max_positions", BATCH_MAX_POSITIONS)))
+        if data.get("pgn"):
+            items = list(batch_support.positions_from_pgn(str(data["pgn"]), bool(data.get("include_start")),
+                                                          max_positions=limit))
+        elif isinstance(data.get("fens"), list):
+            items = list(batch_support.positions_from_fens([str(f) for f in data["fens"]], max_positions=limit))
+        else:
+            raise ValueError("pgn or fens is required")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not items:
+        return jsonify({"error": "no positions found"}), 400
+
+    stop = threading.Event()
+
+    def lines():
+        started = time.monotonic()
+        count = errors = 0
+        try:
+            for item, payload in batch_support.run_ordered(
+                    items,
+                    lambda it: annotate_position(chess.Board(it.fen), it.last_move_san, movetime_s, threat_time_s),
+                    batch_workers(), cancelled=stop):
+                record = batch_support.annotation_record(item, payload)
+                count += 1
+                errors += "error" in record
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            yield json.dumps(batch_support.summary(count, errors, time.monotonic() - started)) + "\n"
+        finally:
+            stop.set()  # client went away: don't start the rest
+
+    return Response(stream_with_context(lines()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/analyze/cancel")
+def analyze_cancel():
+    """Stop a streaming search (e.g. the position changed); frees its engine immediately."""
+    data = request.get_json(silent=True) or {}
+    stream_id = data.get("stream_id")
+    if not stream_id:
+        return jsonify({"error": "stream_id is required"}), 400
+    return jsonify({"cancelled": STREAMS.cancel(str(stream_id))})
+
+
+@app.get("/api/comments/<ticket_id>")
+def comments(ticket_id: str):
+    """Deferred LLM phrasing for a comment_ticket; ?wait_ms= long-polls (capped at 10 s)."""
+    try:
+        wait_s = min(max(float(request.args.get("wait_ms", 0)), 0.0), 10000.0) / 1000.0
+    except ValueError:
+        return jsonify({"error": "wait_ms must be a number"}), 400
+    out = COMMENTS.get(ticket_id, wait_s)
+    if out is None:
+        return jsonify({"error": "unknown or expired comment_ticket"}), 404
+    return jsonify(out), 202 if out["status"] == "pending" else 200
+
+
+@app.get("/api/metrics")
+def metrics():
+    """Prometheus text format: stage/request histograms, request counters, cache/pool/LLM gauges."""
+    return Response(metrics_support.REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.get("/api/health")
 def health():
-    return jsonify({"engine_ready": ENGINE_READY})
+    return jsonify({
+        "engine_ready": ENGINE_READY,
+        "worker": {"id": os.getenv("SENSEI_WORKER_ID"), "pid": os.getpid()},
+        "pool": POOL.stats() if POOL is not None else None,
+        "broker": REMOTE.stats() if REMOTE is not None else None,
+        "cache": RESULT_CACHE.stats(),
+        "in_flight": IN_FLIGHT.stats(),
+        "streams": STREAMS.stats(),
+        "sessions": SESSIONS.stats(),
+        "speculation": SPECULATOR.stats(),
+        "llm": gemini_support.stats(),
+        "comments": COMMENTS.stats(),
+        "book": BOOK.stats(),
+        "admission": ADMISSION.stats(),
+        "startup_ms": startup_report(),
+    })
 
 
 if __name__ == "__main__":
     init_engine()
     # init RAG on startup if you like; it will also lazy init in the route
-    rag_support.init_index("corpus/motifs")
+    with startup_stage("rag_index"):
+        rag_support.init_index("corpus/motifs")
+    with startup_stage("book"):
+        BOOK.load()
+    gemini_support.warm()
+    print(f"[startup] {startup_report()}")
     app.run(host="127.0.0.1", port=8000, debug=True)
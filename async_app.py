@@ -0,0 +1,524 @@
+# async_app.py
+# SenseiBoard — asyncio serving mode (aiohttp + python-chess's async engine protocol)
+#
+#   python async_app.py          # same /api/analyze contract as app.py, on 127.0.0.1:8000
+#
+# A request waiting on Stockfish, the motif lookup or a streaming search is a coroutine, not an OS
+# thread: one process keeps thousands of connections (and long-lived SSE clients) open on one loop.
+# Only blocking library calls (dense RAG, Gemini) go to a small fixed thread pool.
+# ---------------------------------------------------------------
+
+import os
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+import chess
+import chess.engine
+
+import admission_support
+import app as core  # shared pipeline: parsing, book, plans, composing, caches
+import async_engine_support
+import cache_support
+import engine_support
+import feature_support
+import gemini_support
+import metrics_support
+import rag_support
+import session_support
+import stream_support
+
+# ----------------------------- Engine + executors -----------------------------
+_size = engine_support.default_pool_size()
+POOL = async_engine_support.AsyncEnginePool(
+    core.find_engine_path(),
+    size=_size,
+    options=engine_support.default_engine_options(_size),
+    checkout_timeout_s=float(os.getenv("SENSEI_ENGINE_CHECKOUT_TIMEOUT_S", "5")),
+    max_waiting=int(os.getenv("SENSEI_ASYNC_MAX_WAITING", str(64 * _size))),
+)
+# blocking work only: dense motif retrieval, Gemini phrasing, fail-fast degraded answers
+_BLOCKING = ThreadPoolExecutor(max_workers=int(os.getenv("SENSEI_ASYNC_THREADS", "4")),
+                               thread_name_prefix="sensei-async")
+IN_FLIGHT = cache_support.AsyncSingleFlight()
+
+
+def offload(fn: Callable, *args: Any) -> Awaitable[Any]:
+    """Run a blocking call on the small pool, inside this request's trace."""
+    return asyncio.get_running_loop().run_in_executor(_BLOCKING, metrics_support.propagate(fn, *args))
+
+
+class _TaskStop:
+    """Lets a session ticket stop a request task the way it stops a search (ticket.attach)."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+
+    def stop(self) -> None:
+        self.task.cancel()
+
+
+# ----------------------------- Core engine queries -----------------------------
+async def multipv_search(board: chess.Board, movetime_s: float, lines: int, start_by: float) -> List[Dict[str, Any]]:
+    """Raw MultiPV infos (best line first); [] if the engine is unavailable."""
+    try:
+        with metrics_support.stage("multipv"):
+            info_list = await POOL.analyse(board, chess.engine.Limit(time=movetime_s), multipv=lines,
+                                           start_by=start_by, early_stop=core.early_stop_rule(board, lines))
+    except admission_support.Overloaded:
+        raise
+    except Exception as e:
+        print(f"[engine] multipv_search failed: {e}")
+        return []
+    return [info_list] if isinstance(info_list, dict) else info_list
+
+
+async def quick_threat_scan(board: chess.Board,
+                            time_s: float,
+                            start_by: float,
+                            ctx: Optional[feature_support.PositionContext] = None) -> Dict[str, Any]:
+    """Null-move threat scan (see app.quick_threat_scan)."""
+    passed = board.copy(stack=False)
+    try:
+        passed.push(chess.Move.null())
+    except Exception:
+        return {"mate_threat": False, "checks_available": 0, "best_reply": None,
+                "opp_eval_if_idle_cp": None, "hanging_ours": [], "engine_down": False}
+    try:
+        with metrics_support.stage("threat_scan"):
+            info = await POOL.analyse(passed, chess.engine.Limit(time=time_s), start_by=start_by,
+                                      early_stop=core.early_stop_rule(passed))
+    except admission_support.Overloaded:
+        raise
+    except Exception as e:
+        print(f"[engine] quick_threat_scan failed: {e}")
+        info = None
+    return core.threats_from_info(board, passed, info, ctx)
+
+
+async def plan_analysis(board: chess.Board,
+                        movetime_s: float,
+                        threat_time_s: float,
+                        deadline: float,
+                        ctx: feature_support.PositionContext,
+                        lines: int = 3) -> Dict[str, Any]:
+    """
+    app.plan_analysis on the loop: book first, else the threat scan and the MultiPV search run
+    concurrently. Each search must be able to start by deadline - its own time, else Overloaded.
+    """
+    plan = core.book_plan(board, movetime_s, threat_time_s, ctx)
+    if plan is not None:
+        return plan
+    with metrics_support.stage("plan"):
+        threat_task = asyncio.ensure_future(quick_threat_scan(board, threat_time_s, deadline - threat_time_s, ctx))
+        multipv_task = asyncio.ensure_future(multipv_search(board, movetime_s, lines, deadline - movetime_s))
+        try:
+            threats, info_list = await threat_task, await multipv_task
+        except BaseException:
+            # overloaded / superseded: the other search must not keep its engine
+            threat_task.cancel()
+            multipv_task.cancel()
+            raise
+    return core.plan_from_infos(board, info_list, threats, ctx)
+
+
+async def compose_payload(board: chess.Board,
+                          last_move_san: Optional[str],
+                          plan: Dict[str, Any],
+                          use_llm: bool,
+                          motifs: Optional[Tuple[List[str], List[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+    """app.compose_payload; the Gemini call (use_llm) runs off the loop."""
+    if use_llm:
+        return await offload(core.compose_payload, board, last_move_san, plan, True, motifs)
+    return core.compose_payload(board, last_move_san, plan, False, motifs)
+
+
+async def analyze_position(board: chess.Board,
+                           last_move_san: Optional[str],
+                           movetime_s: float,
+                           threat_time_s: float,
+                           use_llm: bool,
+                           deadline: float) -> Dict[str, Any]:
+    """Engine searches and the motif lookup in parallel, then comments; the /api/analyze payload."""
+    with metrics_support.stage("position_context"):
+        ctx = feature_support.PositionContext(board)
+    motifs = offload(core.motif_lookup, board, last_move_san, ctx)
+    try:
+        plan = await plan_analysis(board, movetime_s, threat_time_s, deadline, ctx)
+    except BaseException:
+        motifs.cancel()
+        raise
+    return await compose_payload(board, last_move_san, plan, use_llm, await motifs)
+
+
+async def wait_comments(ticket_id: str, wait_s: float) -> Optional[Dict[str, Any]]:
+    """COMMENTS.get(ticket_id, wait_s) without holding a thread while the LLM job runs."""
+    until = time.monotonic() + wait_s
+    while True:
+        out = core.COMMENTS.get(ticket_id)
+        if out is None or out["status"] != "pending" or time.monotonic() >= until:
+            return out
+        await asyncio.sleep(0.05)
+
+
+async def supersedable(ticket: Optional[session_support.Ticket], work: Awaitable[Any]) -> Any:
+    """
+    Await `work` in its own task, which a newer position for the ticket's session cancels:
+    that raises Superseded here, while cancelling the caller itself still propagates as usual.
+    """
+    task = asyncio.ensure_future(work)
+    if ticket is None:
+        return await task
+    stopper = _TaskStop(task)
+    ticket.attach(stopper)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if task.cancelled():
+            ticket.check()
+        raise
+    finally:
+        ticket.detach(stopper)
+
+
+async def _read_json(request: web.Request) -> Dict[str, Any]:
+    try:
+        data = await request.json()
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _json(out: Dict[str, Any], status: int = 200) -> web.Response:
+    resp = web.json_response(out, status=status, dumps=lambda o: json.dumps(o, ensure_ascii=False))
+    if out.get("degraded"):
+        resp.headers["Retry-After"] = str(max(1, math.ceil(out["retry_after_ms"] / 1000)))
+    return resp
+
+
+# ----------------------------- Metrics -----------------------------
+@web.middleware
+async def observe_request(request: web.Request, handler):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        resp = await handler(request)
+        status = resp.status
+        return resp
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        metrics_support.REGISTRY.observe("sensei_request_seconds", time.perf_counter() - t0, route=route)
+        metrics_support.REGISTRY.inc("sensei_requests_total", route=route, status=status)
+
+
+@web.middleware
+async def cors(request: web.Request, handler):
+    """Same policy as flask_cors in app.py: any origin on /api/*."""
+    if request.method == "OPTIONS":
+        resp = web.Response()
+        resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        resp.headers["Access-Control-Allow-Headers"] = request.headers.get("Access-Control-Request-Headers", "*")
+    else:
+        resp = await handler(request)
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    return resp
+
+
+metrics_support.REGISTRY.add_collector("sensei_async_pool", POOL.stats)
+metrics_support.REGISTRY.add_collector("sensei_async_in_flight", IN_FLIGHT.stats)
+
+
+# ----------------------------- Routes -----------------------------
+routes = web.RouteTableDef()
+
+
+@routes.post("/api/analyze")
+async def analyze(request: web.Request) -> web.Response:
+    data = await _read_json(request)
+    # debug: true returns this request's stage spans (engine wait vs search, RAG, LLM, ...)
+    with metrics_support.trace(enabled=bool(data.get("debug"))) as tr:
+        out, status = await _analyze(data)
+    if tr is not None:
+        out = {**out, "debug": tr.export()}
+    return _json(out, status)
+
+
+async def _analyze(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    try:
+        board, last_move_san, movetime_s, threat_time_s, use_llm = core.parse_analyze_request(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    llm_key = cache_support.position_key(board, last_move_san, use_llm)
+    with metrics_support.stage("cache_lookup"):
+        cached = core.RESULT_CACHE.get(llm_key, movetime_s, threat_time_s)
+    if cached is not None:
+        return {**cached, "cached": True}, 200
+
+    # deferred phrasing: compute (or reuse) the plain engine + RAG answer, LLM follows by ticket
+    defer = use_llm and bool(data.get("defer_llm"))
+    if defer:
+        use_llm = False
+        key = cache_support.position_key(board, last_move_san, False)
+        with metrics_support.stage("cache_lookup"):
+            cached = core.RESULT_CACHE.get(key, movetime_s, threat_time_s)
+        if cached is not None:
+            payload = core.defer_llm_comments(cached, last_move_san, llm_key, movetime_s, threat_time_s)
+            return {**payload, "cached": True}, 200
+    else:
+        key = llm_key
+
+    deadline = core.request_deadline(data)
+
+    async def compute() -> Dict[str, Any]:
+        payload = await analyze_position(board, last_move_san, movetime_s, threat_time_s, use_llm, deadline)
+        if core.cacheable(payload):
+            core.RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+        return payload
+
+    session_id = data.get("session_id")
+    flight_key = key + (movetime_s, threat_time_s)
+    ticket = core.SESSIONS.begin(str(session_id), position=flight_key) if session_id else None
+    try:
+        payload, _shared = await supersedable(ticket, IN_FLIGHT.do(flight_key, compute))
+    except session_support.Superseded:
+        return {"error": "superseded by a newer position", "superseded": True}, 409
+    except admission_support.Overloaded as e:
+        return await offload(core.degraded_payload, board, last_move_san, key, e), 503
+    finally:
+        core.SESSIONS.finish(ticket)
+    if defer:
+        payload = core.defer_llm_comments(payload, last_move_san, llm_key, movetime_s, threat_time_s)
+    return {**payload, "cached": False}, 200
+
+
+@routes.post("/api/analyze/stream")
+async def analyze_stream(request: web.Request) -> web.StreamResponse:
+    """Server-sent events, same events as app.analyze_stream (start, threats, update, done, comments)."""
+    data = await _read_json(request)
+    try:
+        board, last_move_san, movetime_s, threat_time_s, use_llm = core.parse_analyze_request(data)
+    except ValueError as e:
+        return _json({"error": str(e)}, 400)
+
+    stream_id = str(data.get("stream_id") or stream_support.new_stream_id())
+    llm_key = cache_support.position_key(board, last_move_san, use_llm)
+    defer = use_llm and bool(data.get("defer_llm"))
+    if defer:
+        use_llm = False
+    key = cache_support.position_key(board, last_move_san, use_llm)
+    deadline = core.request_deadline(data)
+
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                       "X-Accel-Buffering": "no"})
+    await resp.prepare(request)
+
+    async def send(event: str, payload: Dict[str, Any]) -> None:
+        await resp.write(stream_support.sse_event(event, payload).encode("utf-8"))
+
+    async def finish(payload: Dict[str, Any], cached: bool) -> None:
+        if not defer:
+            await send("done", {**payload, "cached": cached})
+            return
+        payload = core.defer_llm_comments(payload, last_move_san, llm_key, movetime_s, threat_time_s)
+        await send("done", {**payload, "cached": cached})
+        comments = await wait_comments(payload["comment_ticket"], core.DEFERRED_LLM_BUDGET_S + 1.0)
+        await send("comments", {"comment_ticket": payload["comment_ticket"], **(comments or {})})
+
+    session_id = data.get("session_id")
+    ticket = core.SESSIONS.begin(str(session_id)) if session_id else None
+    try:
+        await send("start", {"stream_id": stream_id})
+        cached = core.RESULT_CACHE.get(llm_key, movetime_s, threat_time_s)
+        if cached is None and defer:
+            cached = core.RESULT_CACHE.get(key, movetime_s, threat_time_s)
+            if cached is not None:
+                await finish(cached, True)
+                return resp
+        if cached is not None:
+            await send("done", {**cached, "cached": True})
+            return resp
+        await supersedable(ticket, _stream_search(board, last_move_san, movetime_s, threat_time_s, use_llm,
+                                                  deadline, stream_id, key, send, finish))
+    except session_support.Superseded:
+        await send("cancelled", {"stream_id": stream_id})
+    except ConnectionResetError:
+        pass  # client went away; the search was stopped on the way out
+    finally:
+        core.SESSIONS.finish(ticket)
+    return resp
+
+
+async def _stream_search(board: chess.Board,
+                         last_move_san: Optional[str],
+                         movetime_s: float,
+                         threat_time_s: float,
+                         use_llm: bool,
+                         deadline: float,
+                         stream_id: str,
+                         key: Tuple,
+                         send: Callable[[str, Dict[str, Any]], Awaitable[None]],
+                         finish: Callable[[Dict[str, Any], bool], Awaitable[None]]) -> None:
+    started = time.monotonic()
+    ctx = feature_support.PositionContext(board)
+    plan = core.book_plan(board, movetime_s, threat_time_s, ctx)
+    if plan is not None:
+        await send("threats", plan["threats"])
+        payload = await compose_payload(board, last_move_san, plan, use_llm)
+        if core.cacheable(payload):
+            core.RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+        await finish(payload, False)
+        return
+
+    threat_task = asyncio.ensure_future(quick_threat_scan(board, threat_time_s, deadline - threat_time_s, ctx))
+    motifs = offload(core.motif_lookup, board, last_move_san, ctx)
+    threats: Optional[Dict[str, Any]] = None
+    info_list: List[Dict[str, Any]] = []
+    lines = max(1, min(3, board.legal_moves.count()))
+    registered = cancelled = False
+    limit = chess.engine.Limit(time=movetime_s)
+    early_stop = core.early_stop_rule(board, lines)
+    try:
+        async with POOL.analysis(board, limit, multipv=lines, start_by=deadline - movetime_s) as search:
+            core.STREAMS.register(stream_id, search)
+            registered = True
+            async for info in search:
+                if threats is None and threat_task.done():
+                    threats = threat_task.result()
+                    await send("threats", threats)
+                if early_stop is not None and early_stop(info):
+                    search.stop()
+                    POOL.note_early_stop(early_stop.reason, limit, time.monotonic() - started)
+                    early_stop = None  # remaining infos drain until bestmove
+                # the last MultiPV line of a depth closes that depth
+                if info.get("multipv", 1) != lines or not info.get("pv"):
+                    continue
+                info_list = [i for i in search.multipv if i.get("pv")]
+                partial = core.plan_from_infos(board, info_list, threats or {})
+                await send("update", {
+                    "depth": info.get("depth"),
+                    "elapsed_ms": round((time.monotonic() - started) * 1000),
+                    "candidates": [m for m, _ in partial["top"]],
+                    "eval_hint": None if partial["eval_cp"] is None else round(partial["eval_cp"], 2),
+                    "human_eval": partial["human_eval"],
+                })
+    except admission_support.Overloaded as e:
+        threat_task.cancel()
+        motifs.cancel()
+        await send("done", await offload(core.degraded_payload, board, last_move_san, key, e))
+        return
+    except (asyncio.CancelledError, ConnectionResetError):
+        threat_task.cancel()
+        motifs.cancel()
+        raise
+    except Exception as e:
+        print(f"[engine] analyze_stream failed: {e}")
+    finally:
+        # gone from the registry => /api/analyze/cancel stopped it
+        cancelled = registered and not core.STREAMS.unregister(stream_id)
+
+    if cancelled:
+        threat_task.cancel()
+        motifs.cancel()
+        await send("cancelled", {"stream_id": stream_id})
+        return
+    try:
+        if threats is None:
+            threats = await threat_task
+            await send("threats", threats)
+    except admission_support.Overloaded:
+        threats = core.static_plan(board, ctx)["threats"]
+        await send("threats", threats)
+
+    plan = core.plan_from_infos(board, info_list, threats, ctx)
+    payload = await compose_payload(board, last_move_san, plan, use_llm, await motifs)
+    if core.cacheable(payload):
+        core.RESULT_CACHE.put(key, payload, movetime_s, threat_time_s)
+    await finish(payload, False)
+
+
+@routes.post("/api/analyze/cancel")
+async def analyze_cancel(request: web.Request) -> web.Response:
+    """Stop a streaming search (e.g. the position changed); frees its engine immediately."""
+    data = await _read_json(request)
+    stream_id = data.get("stream_id")
+    if not stream_id:
+        return _json({"error": "stream_id is required"}, 400)
+    return _json({"cancelled": core.STREAMS.cancel(str(stream_id))})
+
+
+@routes.get("/api/comments/{ticket_id}")
+async def comments(request: web.Request) -> web.Response:
+    """Deferred LLM phrasing for a comment_ticket; ?wait_ms= long-polls (capped at 10 s)."""
+    try:
+        wait_s = min(max(float(request.query.get("wait_ms", 0)), 0.0), 10000.0) / 1000.0
+    except ValueError:
+        return _json({"error": "wait_ms must be a number"}, 400)
+    out = await wait_comments(request.match_info["ticket_id"], wait_s)
+    if out is None:
+        return _json({"error": "unknown or expired comment_ticket"}, 404)
+    return _json(out, 202 if out["status"] == "pending" else 200)
+
+
+@routes.get("/api/metrics")
+async def metrics(request: web.Request) -> web.Response:
+    """Prometheus text format (same registry as app.py, plus the async pool)."""
+    return web.Response(text=metrics_support.REGISTRY.render(), content_type="text/plain")
+
+
+@routes.get("/api/health")
+async def health(request: web.Request) -> web.Response:
+    return _json({
+        "mode": "async",
+        "engine_ready": POOL.alive() > 0,
+        "pool": POOL.stats(),
+        "cache": core.RESULT_CACHE.stats(),
+        "in_flight": IN_FLIGHT.stats(),
+        "streams": core.STREAMS.stats(),
+        "sessions": core.SESSIONS.stats(),
+        "llm": gemini_support.stats(),
+        "comments": core.COMMENTS.stats(),
+        "book": core.BOOK.stats(),
+        "startup_ms": core.startup_report(),
+    })
+
+
+# ----------------------------- App -----------------------------
+async def _startup(application: web.Application) -> None:
+    with core.startup_stage("engine_pool"):
+        # best_line_comment (shared with app.py) reads ENGINE_READY
+        core.ENGINE_READY = await POOL.start() > 0
+    with core.startup_stage("rag_index"):
+        await offload(rag_support.init_index, "corpus/motifs")
+    with core.startup_stage("book"):
+        core.BOOK.load()
+    gemini_support.warm()
+    print(f"[startup] {core.startup_report()}")
+
+
+async def _cleanup(application: web.Application) -> None:
+    await POOL.close()
+    _BLOCKING.shutdown(wait=False)
+
+
+def make_app() -> web.Application:
+    application = web.Application(middlewares=[cors, observe_request])
+    application.add_routes(routes)
+    application.on_startup.append(_startup)
+    application.on_cleanup.append(_cleanup)
+    return application
+
+
+if __name__ == "__main__":
+    web.run_app(make_app(), host="127.0.0.1", port=8000)
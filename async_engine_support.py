@@ -0,0 +1,258 @@
+# async_engine_support.py
+# Stockfish pool for the asyncio server: engines driven through python-chess's async protocol
+# (chess.engine.popen_uci), so waiting on a search costs a coroutine, not an OS thread.
+from __future__ import annotations
+
+import asyncio
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import chess
+import chess.engine
+
+import admission_support
+import metrics_support
+from engine_support import ENGINE_FAILURES, EarlyStop, EngineUnavailable
+
+
+class AsyncEngineSlot:
+    """One pooled engine process (transport + UCI protocol) plus its bookkeeping."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.transport: Optional[asyncio.SubprocessTransport] = None
+        self.engine: Optional[chess.engine.Protocol] = None
+        self.searches = 0
+        self.failures = 0
+        self.restarts = 0
+
+
+class AsyncEnginePool:
+    """
+    Same job as engine_support.EnginePool, on the event loop:
+    - checkout() awaits an idle slot from a queue (up to a timeout); at most max_waiting coroutines
+      wait, beyond that admission_support.Overloaded is raised at once (queue_full), and a caller
+      whose search could no longer start by `start_by` gets it as well (deadline)
+    - a crashed engine is respawned in its slot and the search retried once
+    All methods must run on the loop that called start().
+    """
+
+    def __init__(self,
+                 path: str,
+                 size: int,
+                 options: Optional[Dict[str, Any]] = None,
+                 checkout_timeout_s: float = 5.0,
+                 max_waiting: int = 64):
+        self.path = path
+        self.size = max(1, size)
+        self.options = dict(options or {})
+        self.checkout_timeout_s = checkout_timeout_s
+        self.max_waiting = max(0, max_waiting)
+        self._slots: List[AsyncEngineSlot] = [AsyncEngineSlot(i) for i in range(self.size)]
+        self._idle: Optional[asyncio.Queue] = None
+        self._waiting = 0
+        self._timeouts = 0
+        self._rejected = {"queue_full": 0, "deadline": 0}
+        self._hold_s = 0.0  # EWMA of how long a slot stays checked out
+        self._early_stops: Dict[str, int] = {}
+        self._early_saved_s = 0.0
+        self._closed = False
+
+    # ----------------------------- lifecycle -----------------------------
+    async def _start_slot(self, slot: AsyncEngineSlot) -> bool:
+        try:
+            # IMPORTANT: send stderr to DEVNULL so we don't fill an unread PIPE.
+            transport, engine = await chess.engine.popen_uci(self.path, setpgrp=True, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            print(f"[engine] slot {slot.index}: could not start Stockfish at '{self.path}': {e}")
+            return False
+        try:
+            await engine.configure(self.options)
+        except Exception as e:
+            print(f"[engine] slot {slot.index}: configure failed: {e}")
+            transport.close()
+            return False
+        slot.transport, slot.engine = transport, engine
+        return True
+
+    async def start(self) -> int:
+        """Spawn every slot concurrently; returns how many engines are alive."""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for slot in self._slots:
+                self._idle.put_nowait(slot)
+        await asyncio.gather(*(self._start_slot(s) for s in self._slots if s.engine is None))
+        alive = self.alive()
+        if alive:
+            print(f"[engine] async pool ready: {alive}/{self.size} Stockfish at {self.path} {self.options}")
+        return alive
+
+    async def replace(self, slot: AsyncEngineSlot) -> bool:
+        """Kill & respawn one slot's engine (caller holds the slot)."""
+        if slot.transport is not None:
+            slot.transport.close()  # kills the process if it is still there
+        slot.transport = slot.engine = None
+        slot.restarts += 1
+        return await self._start_slot(slot)
+
+    def alive(self) -> int:
+        return sum(1 for s in self._slots if s.engine is not None)
+
+    async def close(self) -> None:
+        self._closed = True
+        for slot in self._slots:
+            if slot.engine is not None:
+                try:
+                    await asyncio.wait_for(slot.engine.quit(), 2.0)
+                except Exception:
+                    pass
+            if slot.transport is not None:
+                slot.transport.close()
+            slot.transport = slot.engine = None
+
+    # ----------------------------- checkout -----------------------------
+    def _retry_after(self) -> float:
+        """Client hint: time for the current waiters to drain through the pool."""
+        return max(0.1, (self._waiting + 1) * self._hold_s / self.size)
+
+    async def _wait_for_slot(self, timeout: float, by_deadline: bool) -> AsyncEngineSlot:
+        if self._waiting >= self.max_waiting or (by_deadline and timeout <= 0):
+            reason = "queue_full" if self._waiting >= self.max_waiting else "deadline"
+            self._rejected[reason] += 1
+            raise admission_support.Overloaded(reason, self._retry_after())
+        self._waiting += 1
+        try:
+            return await asyncio.wait_for(self._idle.get(), timeout)
+        except asyncio.TimeoutError:
+            if by_deadline:
+                self._rejected["deadline"] += 1
+                raise admission_support.Overloaded("deadline", self._retry_after())
+            self._timeouts += 1
+            raise EngineUnavailable(f"no engine free after {timeout:.2f}s")
+        finally:
+            self._waiting -= 1
+
+    @asynccontextmanager
+    async def checkout(self,
+                       timeout: Optional[float] = None,
+                       start_by: Optional[float] = None) -> AsyncIterator[AsyncEngineSlot]:
+        """Borrow an idle slot for the block; start_by is a time.monotonic() value."""
+        if self._closed or self._idle is None:
+            raise EngineUnavailable("engine pool closed")
+        timeout = self.checkout_timeout_s if timeout is None else timeout
+        by_deadline = start_by is not None and start_by - time.monotonic() < timeout
+        if by_deadline:
+            timeout = max(0.0, start_by - time.monotonic())
+        wait_start = time.perf_counter()
+        try:
+            slot = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            slot = await self._wait_for_slot(timeout, by_deadline)
+        metrics_support.record("engine_wait", wait_start, time.perf_counter() - wait_start)
+        held = time.monotonic()
+        try:
+            yield slot
+        finally:
+            took = time.monotonic() - held
+            self._hold_s = took if self._hold_s == 0.0 else 0.8 * self._hold_s + 0.2 * took
+            self._idle.put_nowait(slot)
+
+    async def analyse(self,
+                      board: chess.Board,
+                      limit: chess.engine.Limit,
+                      multipv: Optional[int] = None,
+                      timeout: Optional[float] = None,
+                      early_stop: Optional[EarlyStop] = None,
+                      start_by: Optional[float] = None):
+        """
+        Awaitable EnginePool.analyse: a dead engine is replaced and the search retried once.
+        With early_stop the search ends as soon as that rule fires. Returns dict or list[dict].
+        """
+        last_exc: Optional[BaseException] = None
+        for attempt in (1, 2):
+            async with self.checkout(timeout, start_by) as slot:
+                if slot.engine is None and not await self.replace(slot):
+                    raise EngineUnavailable("Stockfish not available")
+                try:
+                    slot.searches += 1
+                    with metrics_support.stage("engine_search"):
+                        return await self._search(slot.engine, board, limit, multipv, early_stop)
+                except ENGINE_FAILURES as e:
+                    print(f"[engine] slot {slot.index}: analyse failed ({type(e).__name__}); "
+                          f"replacing engine (attempt {attempt})")
+                    slot.failures += 1
+                    last_exc = e
+                    await self.replace(slot)
+        raise last_exc or RuntimeError("Stockfish analyse failed")
+
+    async def _search(self,
+                      engine: chess.engine.Protocol,
+                      board: chess.Board,
+                      limit: chess.engine.Limit,
+                      multipv: Optional[int],
+                      early_stop: Optional[EarlyStop]):
+        if early_stop is None:
+            return await engine.analyse(board, limit, multipv=multipv)
+        started = time.monotonic()
+        early_stop.reset()
+        with await engine.analysis(board, limit, multipv=multipv) as result:
+            async for info in result:
+                if early_stop(info):
+                    result.stop()
+                    self.note_early_stop(early_stop.reason, limit, time.monotonic() - started)
+                    break
+            await result.wait()
+        return result.multipv if multipv is not None else result.info
+
+    @asynccontextmanager
+    async def analysis(self,
+                       board: chess.Board,
+                       limit: chess.engine.Limit,
+                       multipv: Optional[int] = None,
+                       timeout: Optional[float] = None,
+                       start_by: Optional[float] = None) -> AsyncIterator[chess.engine.AnalysisResult]:
+        """Streaming search (async for info in result); stopped and the engine returned on exit. No retry."""
+        async with self.checkout(timeout, start_by) as slot:
+            if slot.engine is None and not await self.replace(slot):
+                raise EngineUnavailable("Stockfish not available")
+            slot.searches += 1
+            search_start = time.perf_counter()
+            try:
+                with await slot.engine.analysis(board, limit, multipv=multipv) as result:
+                    yield result
+            except ENGINE_FAILURES as e:
+                print(f"[engine] slot {slot.index}: analysis failed ({type(e).__name__}); replacing engine")
+                slot.failures += 1
+                await self.replace(slot)
+                raise
+            finally:
+                metrics_support.record("engine_search", search_start, time.perf_counter() - search_start)
+
+    def note_early_stop(self, reason: Optional[str], limit: chess.engine.Limit, elapsed_s: float) -> None:
+        key = reason or "rule"
+        self._early_stops[key] = self._early_stops.get(key, 0) + 1
+        if limit.time:
+            self._early_saved_s += max(0.0, limit.time - elapsed_s)
+
+    # ----------------------------- stats -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "alive": self.alive(),
+            "busy": self.size - (self._idle.qsize() if self._idle is not None else self.size),
+            "waiting": self._waiting,
+            "max_waiting": self.max_waiting,
+            "checkout_timeouts": self._timeouts,
+            "rejected": dict(self._rejected),
+            "hold_ms": round(self._hold_s * 1000, 1),
+            "early_stops": dict(self._early_stops),
+            "early_stop_saved_s": round(self._early_saved_s, 3),
+            "options": dict(self.options),
+            "slots": [
+                {"index": s.index, "alive": s.engine is not None, "searches": s.searches,
+                 "failures": s.failures, "restarts": s.restarts}
+                for s in self._slots
+            ],
+        }
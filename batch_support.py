@@ -0,0 +1,145 @@
+# batch_support.py
+# Whole-game annotation: PGN / FEN list -> positions, fanned out over engines, results in input order.
+from __future__ import annotations
+
+import io
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, Optional, TextIO, Tuple, Union
+
+import chess
+import chess.pgn
+
+
+class BatchItem:
+    """One position to annotate: the board *before* the side to move plays, plus where it came from."""
+
+    __slots__ = ("index", "game", "ply", "fen", "last_move_san", "headers")
+
+    def __init__(self, index: int, game: int, ply: int, fen: str,
+                 last_move_san: Optional[str], headers: Optional[Dict[str, str]] = None):
+        self.index = index
+        self.game = game
+        self.ply = ply
+        self.fen = fen
+        self.last_move_san = last_move_san
+        self.headers = headers
+
+    def record(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"index": self.index, "game": self.game, "ply": self.ply,
+                               "fen": self.fen, "last_move_san": self.last_move_san}
+        if self.headers:
+            out["headers"] = self.headers
+        return out
+
+
+def positions_from_pgn(pgn: Union[str, TextIO],
+                       include_start: bool = False,
+                       max_positions: Optional[int] = None) -> Iterator[BatchItem]:
+    """
+    Every position reached in every game of a PGN stream (mainline only), read lazily game by game.
+    include_start also yields each game's initial position (ply 0). A game's headers ride on its first item.
+    """
+    handle = io.StringIO(pgn) if isinstance(pgn, str) else pgn
+    index = 0
+    game_no = 0
+    while True:
+        game = chess.pgn.read_game(handle)
+        if game is None:
+            return
+        headers = {k: game.headers[k] for k in ("White", "Black", "Result", "Event") if k in game.headers}
+        board = game.board()
+        if include_start:
+            yield BatchItem(index, game_no, board.ply(), board.fen(), None, headers)
+            index += 1
+            headers = None
+        for move in game.mainline_moves():
+            san = board.san(move)
+            board.push(move)
+            if max_positions is not None and index >= max_positions:
+                return
+            yield BatchItem(index, game_no, board.ply(), board.fen(), san, headers)
+            index += 1
+            headers = None
+        game_no += 1
+
+
+def positions_from_fens(fens: Iterable[str], max_positions: Optional[int] = None) -> Iterator[BatchItem]:
+    """One item per non-empty FEN line; raises ValueError naming the first bad one."""
+    index = 0
+    for line in fens:
+        fen = line.strip()
+        if not fen or fen.startswith("#"):
+            continue
+        try:
+            board = chess.Board(fen)
+        except ValueError as e:
+            raise ValueError(f"Invalid FEN #{index}: {fen} ({e})")
+        if max_positions is not None and index >= max_positions:
+            return
+        yield BatchItem(index, 0, board.ply(), board.fen(), None)
+        index += 1
+
+
+def run_ordered(items: Iterable[BatchItem],
+                fn: Callable[[BatchItem], Dict[str, Any]],
+                workers: int,
+                window: Optional[int] = None,
+                cancelled: Optional[threading.Event] = None) -> Iterator[Tuple[BatchItem, Dict[str, Any]]]:
+    """
+    Run fn over items on `workers` threads and yield (item, result) in input order.
+    At most `window` (default 2 * workers) items are in flight, so a long PGN streams in bounded memory.
+    fn's exceptions become {"error": ...} results; `cancelled` stops submitting new work.
+    """
+    workers = max(1, workers)
+    window = max(workers, window or 2 * workers)
+    pending: Deque[Tuple[BatchItem, Future]] = deque()
+    source = iter(items)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sensei-batch") as pool:
+        try:
+            while True:
+                while len(pending) < window and not (cancelled is not None and cancelled.is_set()):
+                    item = next(source, None)
+                    if item is None:
+                        break
+                    pending.append((item, pool.submit(fn, item)))
+                if not pending:
+                    return
+                item, fut = pending.popleft()
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                yield item, result
+        finally:
+            for _, fut in pending:
+                fut.cancel()
+
+
+def annotation_record(item: BatchItem, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The JSONL line for one annotated position: where it is + the engine/RAG findings.
+    Warm-up / recovery placeholders (engine down, no candidates with legal moves) become errors.
+    """
+    out = item.record()
+    if "error" not in payload and (payload["threats"].get("engine_down")
+                                   or not payload["candidates"] and any(chess.Board(item.fen).legal_moves)):
+        payload = {"error": "no engine answer"}
+    if "error" in payload:
+        out["error"] = payload["error"]
+        return out
+    for k in ("candidates", "eval_hint", "threats", "features", "rag_cards_used",
+              "opponent_comment", "your_comment"):
+        out[k] = payload.get(k)
+    return out
+
+
+def summary(count: int, errors: int, elapsed_s: float) -> Dict[str, Any]:
+    return {
+        "done": True,
+        "positions": count,
+        "errors": errors,
+        "ms": round(elapsed_s * 1000),
+        "positions_per_s": round(count / elapsed_s, 2) if elapsed_s > 0 else None,
+    }
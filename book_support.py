@@ -0,0 +1,170 @@
+# book_support.py
+# Opening fast path: precomputed analyses (built offline by tools/build_book.py) and an optional
+# Polyglot book, both keyed by the position's Zobrist hash, so well-known positions skip the engine.
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+DEFAULT_PATH = "corpus/book.jsonl"
+
+
+def book_key(board: chess.Board) -> str:
+    """Polyglot Zobrist hash as 16 hex digits (JSON has no 64-bit ints)."""
+    return f"{chess.polyglot.zobrist_hash(board):016x}"
+
+
+def entry_from_plan(board: chess.Board,
+                    plan: Dict[str, Any],
+                    movetime_s: float,
+                    threat_time_s: float) -> Dict[str, Any]:
+    """One store line: an analysis plan without its live objects (moves as UCI, no PositionContext)."""
+    return {
+        "key": book_key(board),
+        "fen": board.fen(),
+        "top": [[san, cp] for san, cp in plan["top"]],
+        "eval_cp": plan["eval_cp"],
+        "human_eval": plan["human_eval"],
+        "threats": plan["threats"],
+        "pvs": [[m.uci() for m in pv] for pv in plan.get("pvs", [])],
+        "movetime_ms": round(movetime_s * 1000),
+        "threat_time_ms": round(threat_time_s * 1000),
+    }
+
+
+def plan_from_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of entry_from_plan (the caller adds "context")."""
+    return {
+        "threats": dict(entry["threats"]),
+        "top": [(san, float(cp)) for san, cp in entry["top"]],
+        "eval_cp": entry["eval_cp"],
+        "human_eval": entry["human_eval"],
+        "pvs": [[chess.Move.from_uci(u) for u in pv] for pv in entry.get("pvs", [])],
+        "book": "store",
+    }
+
+
+def read_entries(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def write_entries(path: Path, entries: Iterable[Dict[str, Any]]) -> int:
+    """Write the store atomically (readers never see a half-written file). Returns the line count."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    n = 0
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            n += 1
+    os.replace(tmp, path)
+    return n
+
+
+class PositionBook:
+    """
+    Zobrist hash -> precomputed plan, loaded once into a dict (a lookup is one hash + one dict get).
+    - store entries answer requests whose movetime/threat_time they cover (same rule as the result cache)
+    - a Polyglot book, if configured, answers remaining positions with its weighted moves only
+    """
+
+    def __init__(self, path: Optional[str] = None, polyglot_path: Optional[str] = None, enabled: bool = True):
+        self.path = Path(path or DEFAULT_PATH)
+        self.polyglot_path = polyglot_path
+        self.enabled = enabled
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._polyglot: Optional[chess.polyglot.MemoryMappedReader] = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.hits = 0
+        self.polyglot_hits = 0
+        self.misses = 0
+        self.shallow = 0  # stored, but searched for less time than requested
+
+    def load(self) -> int:
+        """(Re)read the store and open the Polyglot book; missing files just leave the book empty."""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if self.enabled and self.path.exists():
+            try:
+                for entry in read_entries(self.path):
+                    entries[entry["key"]] = entry
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[book] could not read {self.path}: {e}")
+                entries = {}
+        reader = None
+        if self.enabled and self.polyglot_path:
+            try:
+                reader = chess.polyglot.open_reader(self.polyglot_path)
+            except OSError as e:
+                print(f"[book] could not open Polyglot book {self.polyglot_path}: {e}")
+        with self._lock:
+            old, self._polyglot = self._polyglot, reader
+            self._entries = entries
+            self.loaded = True
+        if old is not None:
+            old.close()
+        if entries or reader is not None:
+            print(f"[book] {len(entries)} precomputed positions"
+                  + (f", Polyglot book {self.polyglot_path}" if reader is not None else ""))
+        return len(entries)
+
+    def lookup(self, board: chess.Board, movetime_s: float, threat_time_s: float) -> Optional[Dict[str, Any]]:
+        """A stored entry covering the request, else {"polyglot": [(move, weight), ...]}, else None."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(book_key(board)) if self._entries else None
+        if entry is not None:
+            if entry["movetime_ms"] >= round(movetime_s * 1000) and \
+                    entry["threat_time_ms"] >= round(threat_time_s * 1000):
+                with self._lock:
+                    self.hits += 1
+                return entry
+            with self._lock:
+                self.shallow += 1
+        moves = self.polyglot_moves(board)
+        with self._lock:
+            if moves:
+                self.polyglot_hits += 1
+            else:
+                self.misses += 1
+        return {"polyglot": moves} if moves else None
+
+    def polyglot_moves(self, board: chess.Board, limit: int = 3) -> List[Tuple[chess.Move, int]]:
+        """Book moves by weight (best first), legal in this position."""
+        reader = self._polyglot
+        if reader is None:
+            return []
+        try:
+            found = [(e.move, e.weight) for e in reader.find_all(board) if board.is_legal(e.move)]
+        except (OSError, ValueError):
+            return []
+        found.sort(key=lambda mw: mw[1], reverse=True)
+        return found[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "positions": len(self._entries),
+                "polyglot": self._polyglot is not None,
+                "hits": self.hits,
+                "polyglot_hits": self.polyglot_hits,
+                "misses": self.misses,
+                "shallow": self.shallow,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            reader, self._polyglot = self._polyglot, None
+        if reader is not None:
+            reader.close()
@@ -0,0 +1,358 @@
+# cache_support.py
+# Analysis result cache for SenseiBoard, keyed by Zobrist hash: in-process, or shared by worker processes.
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+
+def position_key(board: chess.Board, *extra: Hashable) -> Tuple[Hashable, ...]:
+    """Zobrist hash of the position (side to move, castling, ep included) plus request extras."""
+    return (chess.polyglot.zobrist_hash(board),) + tuple(extra)
+
+
+class _Entry:
+    __slots__ = ("payload", "movetime_s", "threat_time_s", "stored_at")
+
+    def __init__(self, payload: Dict[str, Any], movetime_s: float, threat_time_s: float, age_s: float = 0.0):
+        self.payload = payload
+        self.movetime_s = movetime_s
+        self.threat_time_s = threat_time_s
+        self.stored_at = time.monotonic() - age_s
+
+    def covers(self, movetime_s: float, threat_time_s: float) -> bool:
+        """A result searched at least as long answers the request (depth-aware reuse)."""
+        return self.movetime_s >= movetime_s and self.threat_time_s >= threat_time_s
+
+
+class AnalysisCache:
+    """
+    Bounded LRU + TTL cache of analyze payloads.
+    - key: position_key(board, last_move_san, use_llm)
+    - an entry searched for >= the requested movetime/threat_time is a hit
+    - max_entries <= 0 disables it: every get() misses, put() stores nothing
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_s: float = 3600.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shallow = 0       # present, but searched for less time than requested
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_s > 0 and now - entry.stored_at > self.ttl_s
+
+    def get(self, key: Hashable, movetime_s: float, threat_time_s: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self._expired(entry, time.monotonic()):
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            if not entry.covers(movetime_s, threat_time_s):
+                self.shallow += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry.payload
+
+    def get_any(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Unexpired entry at whatever depth it was searched (degraded answers); no counters touched."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or self._expired(entry, time.monotonic()):
+                return None
+            return entry.payload
+
+    def peek(self, key: Hashable, movetime_s: float, threat_time_s: float) -> bool:
+        """Would get() hit? Doesn't touch recency or the hit/miss counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and not self._expired(entry, time.monotonic()) \
+                and entry.covers(movetime_s, threat_time_s)
+
+    def put(self, key: Hashable, payload: Dict[str, Any], movetime_s: float, threat_time_s: float,
+            age_s: float = 0.0) -> None:
+        """age_s: how long ago the payload was computed (a copy from elsewhere expires on the original's clock)."""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None and not self._expired(old, time.monotonic()) \
+               and old.covers(movetime_s, threat_time_s):
+                # keep the deeper result; just refresh its recency
+                self._data.move_to_end(key)
+                return
+            self._data[key] = _Entry(payload, movetime_s, threat_time_s, age_s)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shallow_misses": self.shallow,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _record_covers(record: Dict[str, Any], movetime_s: float, threat_time_s: float) -> bool:
+    """_Entry.covers for a record read back from the shared store."""
+    return record["movetime_s"] >= movetime_s and record["threat_time_s"] >= threat_time_s
+
+
+class SharedAnalysisCache:
+    """
+    AnalysisCache shared by worker processes through a key-value store (store_support.RespStore),
+    with a small per-process LRU in front. Same interface and depth rule as AnalysisCache; the store
+    bounds the shared size (its own LRU eviction) and entries expire there after ttl_s.
+    A store failure counts as a miss and the store is skipped for retry_s: a down store costs hit
+    rate, never an answer (nor a socket timeout per request).
+    """
+
+    def __init__(self,
+                 store: Any,
+                 local_entries: int = 512,
+                 ttl_s: float = 3600.0,
+                 prefix: str = "sensei:result:",
+                 retry_s: float = 2.0):
+        self.store = store
+        self.ttl_s = ttl_s
+        self.prefix = prefix
+        self.retry_s = retry_s
+        self._down_until = 0.0
+        self.local = AnalysisCache(max_entries=local_entries, ttl_s=ttl_s)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+        self.shallow = 0
+        self.errors = 0
+
+    def _store_key(self, key: Hashable) -> str:
+        zobrist, *extra = key
+        return f"{self.prefix}{zobrist:016x}:{json.dumps(extra, separators=(',', ':'))}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _failed(self, op: str, e: Exception) -> None:
+        self._count("errors")
+        self._down_until = time.monotonic() + self.retry_s
+        print(f"[cache] shared store {op} failed, skipping it for {self.retry_s:.0f}s: {e}")
+
+    def _fetch(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """The stored record {"payload", "movetime_s", "threat_time_s", "stored_at"}, or None."""
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            raw = self.store.get(self._store_key(key))
+        except OSError as e:
+            self._failed("get", e)
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def get(self, key: Hashable, movetime_s: float, threat_time_s: float) -> Optional[Dict[str, Any]]:
+        payload = self.local.get(key, movetime_s, threat_time_s)
+        if payload is not None:
+            self._count("hits")
+            self._count("local_hits")
+            return payload
+        record = self._fetch(key)
+        if record is None:
+            self._count("misses")
+            return None
+        if not _record_covers(record, movetime_s, threat_time_s):
+            self._count("shallow")
+            self._count("misses")
+            return None
+        # the local copy only gets what is left of the record's TTL (stored_at is wall-clock time)
+        age_s = max(0.0, time.time() - record.get("stored_at", time.time()))
+        self.local.put(key, record["payload"], record["movetime_s"], record["threat_time_s"], age_s)
+        self._count("hits")
+        return record["payload"]
+
+    def get_any(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Unexpired entry at whatever depth it was searched (degraded answers); no counters touched."""
+        payload = self.local.get_any(key)
+        if payload is not None:
+            return payload
+        record = self._fetch(key)
+        return record["payload"] if record is not None else None
+
+    def peek(self, key: Hashable, movetime_s: float, threat_time_s: float) -> bool:
+        """Would get() hit? Doesn't touch the counters."""
+        if self.local.peek(key, movetime_s, threat_time_s):
+            return True
+        record = self._fetch(key)
+        return record is not None and _record_covers(record, movetime_s, threat_time_s)
+
+    def put(self, key: Hashable, payload: Dict[str, Any], movetime_s: float, threat_time_s: float) -> None:
+        self.local.put(key, payload, movetime_s, threat_time_s)
+        old = self._fetch(key)
+        if old is not None and _record_covers(old, movetime_s, threat_time_s):
+            return  # another worker stored a deeper result
+        if time.monotonic() < self._down_until:
+            return
+        record = {"payload": payload, "movetime_s": movetime_s, "threat_time_s": threat_time_s,
+                  "stored_at": time.time()}
+        try:
+            self.store.set(self._store_key(key), json.dumps(record, ensure_ascii=False).encode("utf-8"), self.ttl_s)
+        except OSError as e:
+            self._failed("set", e)
+
+    def clear(self) -> None:
+        """Local entries only; the shared store is cleared (or evicts) on its own."""
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        local = self.local.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "shared",
+                "store": self.store.stats(),
+                "size": local["size"],
+                "max_entries": self.local.max_entries,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "local_hits": self.local_hits,
+                "misses": self.misses,
+                "shallow_misses": self.shallow,
+                "store_errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key onto one in-flight computation.
+    The first caller runs fn(); everyone arriving before it finishes gets its result (or error).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared) where shared is True if another caller computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines (one event loop): callers with the same key await one shared task.
+    A caller that is cancelled only stops waiting; the task itself is cancelled once nobody waits.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Tuple[asyncio.Task, list]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared) where shared is True if another caller started it."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            call = self._calls[key] = (task, [0])
+            task.add_done_callback(lambda _t: self._calls.pop(key, None))
+            self.leaders += 1
+        task, waiters = call
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            waiters[0] -= 1
+            if waiters[0] == 0 and not task.done():
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
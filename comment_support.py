@@ -0,0 +1,76 @@
+# comment_support.py
+# Deferred LLM phrasing: the engine answer goes out first, comments are fetched by ticket.
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class CommentStore:
+    """
+    comment_ticket -> background phrasing job, kept for ttl_s after submission.
+    get() answers {"status": "pending"} until the job is done, then {"status": "ready", ...result}.
+    """
+
+    def __init__(self, workers: int = 4, ttl_s: float = 300.0, max_entries: int = 4096):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="sensei-comments")
+        self._jobs: "OrderedDict[str, Tuple[float, Future]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.expired = 0
+        self.failed = 0
+
+    def _evict(self, now: float) -> None:
+        while self._jobs:
+            ticket_id, (created, _) = next(iter(self._jobs.items()))
+            if now - created < self.ttl_s and len(self._jobs) <= self.max_entries:
+                break
+            del self._jobs[ticket_id]
+            self.expired += 1
+
+    def submit(self, fn: Callable[[], Dict[str, Any]]) -> str:
+        ticket_id = uuid.uuid4().hex
+        fut = self._executor.submit(fn)
+        now = time.monotonic()
+        with self._lock:
+            self._jobs[ticket_id] = (now, fut)
+            self.submitted += 1
+            self._evict(now)
+        return ticket_id
+
+    def get(self, ticket_id: str, wait_s: float = 0.0) -> Optional[Dict[str, Any]]:
+        """None for unknown / expired tickets; waits up to wait_s for a pending job."""
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._jobs.get(ticket_id)
+        if entry is None:
+            return None
+        fut = entry[1]
+        try:
+            result = fut.result(timeout=max(0.0, wait_s))
+        except FutureTimeout:
+            return {"status": "pending"}
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"[comments] job failed: {e}")
+            return {"status": "failed"}
+        return {"status": "ready", **result}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(1 for _, fut in self._jobs.values() if not fut.done())
+            return {
+                "tickets": len(self._jobs),
+                "pending": pending,
+                "submitted": self.submitted,
+                "expired": self.expired,
+                "failed": self.failed,
+                "ttl_s": self.ttl_s,
+            }
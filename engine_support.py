@@ -0,0 +1,656 @@
+# engine_support.py
+# Stockfish process pool for SenseiBoard: N engines, checkout/checkin, per-slot recovery from a warm standby.
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import chess
+import chess.engine
+from chess.engine import EngineTerminatedError, EngineError
+
+import metrics_support
+
+# Errors that mean "this engine process is gone or wedged" -> replace the slot.
+ENGINE_FAILURES = (EngineTerminatedError, EngineError, BrokenPipeError)
+
+
+class EngineUnavailable(RuntimeError):
+    """No engine could be checked out (pool exhausted or Stockfish missing)."""
+
+
+def find_engine_path() -> str:
+    """Find Stockfish binary path from $STOCKFISH_PATH or assume 'stockfish' in PATH."""
+    return os.getenv("STOCKFISH_PATH") or "stockfish"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def _total_ram_mb() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def default_pool_size() -> int:
+    """$SENSEI_ENGINES, else half the cores (each engine gets >= 2 threads), capped at 8."""
+    cores = os.cpu_count() or 2
+    return max(1, _env_int("SENSEI_ENGINES", min(8, cores // 2)))
+
+
+def default_engine_options(pool_size: int) -> Dict[str, int]:
+    """Split cores and a slice of RAM evenly across the pool."""
+    cores = os.cpu_count() or 2
+    threads = _env_int("SENSEI_ENGINE_THREADS", max(1, cores // max(1, pool_size)))
+    ram_mb = _total_ram_mb()
+    # 1/16 of RAM for all hash tables together, clamped per engine to [16, 256] MB.
+    per_engine = (ram_mb // 16) // max(1, pool_size) if ram_mb else 64
+    hash_mb = _env_int("SENSEI_ENGINE_HASH_MB", max(16, min(256, per_engine)))
+    return {"Threads": threads, "Hash": hash_mb}
+
+
+class EarlyStop:
+    """
+    Early-exit rule for one search, fed every info of engine.analysis(); the Limit stays the upper bound.
+    Stops when:
+      - the position has a single legal move (first scored line is enough)
+      - the best line reports a mate
+      - from min_depth on, the best move, its eval (within margin_cp) and the gap to the second line
+        (not shrinking by more than margin_cp) held for stable_depths consecutive depths
+    With lines > 1 a depth is judged once its second line arrives, so every line of the stopped search
+    and the gap come from the same depth.
+    """
+
+    def __init__(self,
+                 forced: bool = False,
+                 lines: int = 1,
+                 stable_depths: int = 4,
+                 margin_cp: int = 20,
+                 min_depth: int = 10):
+        self.forced = forced
+        self.lines = lines
+        self.stable_depths = max(1, stable_depths)
+        self.margin_cp = margin_cp
+        self.min_depth = min_depth
+        self.reset()
+
+    @classmethod
+    def for_board(cls, board: chess.Board, lines: int = 1, **kwargs: Any) -> "EarlyStop":
+        return cls(forced=board.legal_moves.count() == 1, lines=lines, **kwargs)
+
+    def reset(self) -> None:
+        self.reason: Optional[str] = None
+        self._pending: Optional[Tuple[int, chess.Move, int, bool]] = None  # line 1: depth, move, cp, mate
+        self._last: Optional[Tuple[int, chess.Move, int, Optional[int]]] = None
+        self._stable = 0
+
+    def __call__(self, info: Dict[str, Any]) -> bool:
+        if info.get("lowerbound") or info.get("upperbound"):
+            return False  # aspiration-window fail, not a finished line
+        score, pv = info.get("score"), info.get("pv")
+        if score is None or not pv:
+            return False
+        depth = info.get("depth", 0)
+        cp = score.relative.score(mate_score=100000)
+        k = info.get("multipv", 1)
+        if k == 1:
+            if self.forced:
+                return self._fire("forced")
+            self._pending = (depth, pv[0], cp, score.is_mate())
+            return self._judge(None) if self.lines < 2 else False
+        if k == 2 and self._pending is not None and self._pending[0] == depth:
+            return self._judge(self._pending[2] - cp)
+        return False
+
+    def _judge(self, gap: Optional[int]) -> bool:
+        depth, move, cp, mate = self._pending
+        self._pending = None
+        if mate:
+            return self._fire("mate")
+        last = self._last
+        if last is not None and depth <= last[0]:
+            return False
+        steady = (last is not None and move == last[1] and abs(cp - last[2]) <= self.margin_cp
+                  and (gap is None or last[3] is None or gap >= last[3] - self.margin_cp))
+        self._stable = self._stable + 1 if steady else 0
+        self._last = (depth, move, cp, gap)
+        if depth >= self.min_depth and self._stable + 1 >= self.stable_depths:
+            return self._fire("stable")
+        return False
+
+    def _fire(self, reason: str) -> bool:
+        self.reason = reason
+        return True
+
+
+class EngineSlot:
+    """One pooled Stockfish process plus its bookkeeping."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.engine: Optional[chess.engine.SimpleEngine] = None
+        self.busy = False
+        self.searches = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_used = time.monotonic()
+
+
+class EnginePool:
+    """
+    Fixed-size pool of Stockfish processes.
+    - checkout() hands out an idle slot (blocking up to a timeout) and returns it on exit
+    - a crashed engine is replaced in its own slot; other slots keep serving
+    - with standby=True one extra engine is kept spawned and configured: a failed slot swaps it in
+      at once and a new standby is spawned in the background
+    - a prober pings engines idle for probe_interval_s; one that misses probe_timeout_s is hung and replaced
+    - a game can be bound to one slot so consecutive moves reuse that engine's hash table
+    """
+
+    def __init__(self,
+                 path: str,
+                 size: int,
+                 options: Optional[Dict[str, Any]] = None,
+                 checkout_timeout_s: float = 5.0,
+                 games_per_engine: int = 8,
+                 game_idle_s: float = 600.0,
+                 standby: bool = True,
+                 probe_interval_s: float = 5.0,
+                 probe_timeout_s: float = 2.0):
+        self.path = path
+        self.size = max(1, size)
+        self.options = dict(options or {})
+        self.checkout_timeout_s = checkout_timeout_s
+        self.games_per_engine = max(1, games_per_engine)
+        self.game_idle_s = game_idle_s
+        self._slots: List[EngineSlot] = [EngineSlot(i) for i in range(self.size)]
+        self._games: Dict[str, Tuple[int, float]] = {}  # game_id -> (slot index, last seen)
+        self._games_evicted = 0
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self._timeouts = 0
+        self._dropped = 0
+        self._background: List[Any] = []  # tickets of speculative searches currently holding a slot
+        self._preempted = 0
+        self._early_stops: Dict[str, int] = {}
+        self._early_saved_s = 0.0
+        self._closed = False
+        # warm standby + prober
+        self.standby_enabled = standby
+        self.probe_interval_s = probe_interval_s
+        self.probe_timeout_s = probe_timeout_s
+        self._standby: Optional[chess.engine.SimpleEngine] = None
+        self._standby_lock = threading.Lock()
+        self._standby_spawning = False
+        self._standby_spawns = 0
+        self._failovers = {"warm": 0, "cold": 0}
+        self._failover_reasons: Dict[str, int] = {}
+        self._failover_s = 0.0
+        self._last_failover_ms: Optional[float] = None
+        self._probes = 0
+        self._prober: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ----------------------------- lifecycle -----------------------------
+    def _spawn(self) -> chess.engine.SimpleEngine:
+        # IMPORTANT: send stderr to DEVNULL so we don't fill an unread PIPE.
+        engine = chess.engine.SimpleEngine.popen_uci(
+            self.path,
+            setpgrp=True,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            engine.configure(self.options)
+        except Exception:
+            engine.quit()
+            raise
+        return engine
+
+    def _start_slot(self, slot: EngineSlot) -> bool:
+        try:
+            slot.engine = self._spawn()
+            return True
+        except Exception as e:
+            print(f"[engine] slot {slot.index}: could not start Stockfish at '{self.path}': {e}")
+            slot.engine = None
+            return False
+
+    def start(self) -> int:
+        """Spawn every empty slot (the standby and the prober start in the background); returns engines alive."""
+        for slot in self._slots:
+            if slot.engine is None:
+                self._start_slot(slot)
+        alive = self.alive()
+        if alive:
+            print(f"[engine] pool ready: {alive}/{self.size} Stockfish at {self.path} {self.options}")
+            self._refill_standby()
+            if self.probe_interval_s > 0 and self._prober is None:
+                self._prober = threading.Thread(target=self._probe_loop, name="sensei-engine-probe", daemon=True)
+                self._prober.start()
+        return alive
+
+    def replace(self, slot: EngineSlot, reason: str = "crash") -> bool:
+        """
+        Put a fresh engine in a failed slot (caller holds the slot): the warm standby if there is one,
+        else a cold spawn. The failed process is killed without waiting for it; a new standby follows
+        in the background.
+        """
+        t = time.perf_counter()
+        old, slot.engine = slot.engine, None
+        if old is not None:
+            old.close()  # kills the process; quit() would wait on a hung engine
+        slot.restarts += 1
+        engine = self._take_standby()
+        if engine is not None:
+            slot.engine = engine
+            kind = "warm"
+        else:
+            self._start_slot(slot)
+            kind = "cold"
+        self._refill_standby()
+        took = time.perf_counter() - t
+        with self._cond:
+            self._failovers[kind] += 1
+            self._failover_reasons[reason] = self._failover_reasons.get(reason, 0) + 1
+            self._failover_s += took
+            self._last_failover_ms = round(took * 1000, 2)
+        metrics_support.REGISTRY.observe("sensei_engine_failover_seconds", took, kind=kind, reason=reason)
+        print(f"[engine] slot {slot.index}: {reason}, {kind} failover in {took * 1000:.1f} ms")
+        return slot.engine is not None
+
+    # ----------------------------- standby -----------------------------
+    def _take_standby(self) -> Optional[chess.engine.SimpleEngine]:
+        with self._standby_lock:
+            engine, self._standby = self._standby, None
+        if engine is not None and engine.returncode.done():  # died while waiting
+            return None
+        return engine
+
+    def _refill_standby(self) -> None:
+        """Spawn a standby in the background unless one is ready or on its way."""
+        with self._standby_lock:
+            if not self.standby_enabled or self._closed or self._standby is not None or self._standby_spawning:
+                return
+            self._standby_spawning = True
+        threading.Thread(target=self._spawn_standby, name="sensei-engine-standby", daemon=True).start()
+
+    def _spawn_standby(self) -> None:
+        engine = None
+        try:
+            engine = self._spawn()
+        except Exception as e:
+            print(f"[engine] standby: could not start Stockfish at '{self.path}': {e}")
+        with self._standby_lock:
+            self._standby_spawning = False
+            if engine is not None and not self._closed:
+                self._standby, engine = engine, None
+                self._standby_spawns += 1
+        if engine is not None:  # pool closed meanwhile
+            engine.close()
+
+    # ----------------------------- health probe -----------------------------
+    def _ping(self, engine: chess.engine.SimpleEngine) -> bool:
+        """isready/readyok within probe_timeout_s (SimpleEngine.ping() would wait its 10 s default)."""
+        try:
+            coro = asyncio.wait_for(engine.protocol.ping(), self.probe_timeout_s)
+            asyncio.run_coroutine_threadsafe(coro, engine.protocol.loop).result(self.probe_timeout_s + 1.0)
+            return True
+        except Exception:
+            return False
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.probe_interval_s):
+            for slot in self._slots:
+                if self._stop.is_set():
+                    return
+                self.probe(slot)
+            with self._standby_lock:
+                standby = self._standby
+            if standby is not None and not self._ping(standby):
+                with self._standby_lock:
+                    if self._standby is standby:
+                        self._standby = None
+                standby.close()
+                print("[engine] standby failed its probe; respawning")
+                self._refill_standby()
+
+    def probe(self, slot: EngineSlot) -> Optional[bool]:
+        """
+        Ping one slot if it has been idle for probe_interval_s and nobody is queueing; a dead or hung
+        engine is replaced before a request lands on it. None when the slot was skipped.
+        """
+        with self._cond:
+            if slot.busy or self._waiting or self._closed or \
+                    time.monotonic() - slot.last_used < self.probe_interval_s:
+                return None
+            slot.busy = True
+        try:
+            self._probes += 1
+            if slot.engine is None:
+                ok = False
+            else:
+                ok = self._ping(slot.engine)
+                slot.last_used = time.monotonic()
+            if not ok:
+                slot.failures += 1
+                hung = slot.engine is not None and not slot.engine.returncode.done()
+                self.replace(slot, reason="hung" if hung else "dead")
+            return ok
+        finally:
+            with self._cond:
+                slot.busy = False
+                self._cond.notify_all()
+
+    def alive(self) -> int:
+        return sum(1 for s in self._slots if s.engine is not None)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._stop.set()
+        with self._standby_lock:
+            standby, self._standby = self._standby, None
+        if standby is not None:
+            standby.close()
+        for slot in self._slots:
+            try:
+                if slot.engine is not None:
+                    slot.engine.quit()
+            except Exception:
+                pass
+            slot.engine = None
+
+    # ----------------------------- game affinity -----------------------------
+    def _evict_idle_games(self, now: float) -> None:
+        stale = [g for g, (_, seen) in self._games.items() if now - seen > self.game_idle_s]
+        for g in stale:
+            del self._games[g]
+        self._games_evicted += len(stale)
+
+    def _games_on(self, index: int) -> int:
+        return sum(1 for idx, _ in self._games.values() if idx == index)
+
+    def slot_for_game(self, game_id: str) -> Optional[int]:
+        """
+        Slot index bound to game_id (binding it to the least-loaded engine on first sight).
+        None when every engine already carries games_per_engine games; the game then runs unbound.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._evict_idle_games(now)
+            bound = self._games.get(game_id)
+            if bound is not None:
+                self._games[game_id] = (bound[0], now)
+                return bound[0]
+            load, index = min((self._games_on(s.index), s.index) for s in self._slots)
+            if load >= self.games_per_engine:
+                return None
+            self._games[game_id] = (index, now)
+            return index
+
+    # ----------------------------- checkout -----------------------------
+    def _pick_idle(self, prefer: Optional[int]) -> Optional[EngineSlot]:
+        idle = [s for s in self._slots if not s.busy]
+        if not idle:
+            return None
+        if prefer is not None:
+            for s in idle:
+                if s.index == prefer:
+                    return s
+        # leave engines that carry games free for their own game's next request
+        return min(idle, key=lambda s: (self._games_on(s.index), s.index))
+
+    @contextmanager
+    def checkout(self,
+                 timeout: Optional[float] = None,
+                 ticket: Optional[Any] = None,
+                 prefer: Optional[int] = None) -> Iterator[EngineSlot]:
+        """
+        Borrow an idle slot for the duration of the block.
+        With a session ticket (session_support.Ticket), queued work is dropped once it is superseded.
+        `prefer` picks that slot when idle (game affinity); otherwise any idle slot is used.
+        A background ticket never waits: it gets an idle engine nobody is queueing for, or
+        EngineUnavailable. Foreground requests that have to wait preempt running background searches.
+        """
+        background = ticket is not None and ticket.background
+        timeout = self.checkout_timeout_s if timeout is None else timeout
+        wait_start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if background:
+                slot = None if self._waiting else self._pick_idle(prefer)
+                if slot is None:
+                    raise EngineUnavailable("no idle engine for background work")
+                self._background.append(ticket)
+            else:
+                self._waiting += 1
+                try:
+                    while True:
+                        if self._closed:
+                            raise EngineUnavailable("engine pool closed")
+                        if ticket is not None and ticket.cancelled:
+                            self._dropped += 1
+                            ticket.check()
+                        slot = self._pick_idle(prefer)
+                        if slot is not None:
+                            break
+                        self._preempt_background()
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise EngineUnavailable(f"no engine free after {timeout:.2f}s")
+                        # re-check a session ticket every 50 ms so stale work leaves the queue quickly
+                        self._cond.wait(min(remaining, 0.05) if ticket is not None else remaining)
+                finally:
+                    self._waiting -= 1
+            slot.busy = True
+        # time queued for an engine, reported apart from the search itself
+        metrics_support.record("engine_wait", wait_start, time.perf_counter() - wait_start)
+        try:
+            yield slot
+        finally:
+            with self._cond:
+                slot.busy = False
+                slot.last_used = time.monotonic()
+                if background:
+                    self._background.remove(ticket)
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Block until some engine is idle and no real request is queued (for background work)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._waiting or all(s.busy for s in self._slots):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _preempt_background(self) -> None:
+        """Stop speculative searches so a waiting real request gets their engines (caller holds _cond)."""
+        for t in self._background:
+            if not t.cancelled:
+                t.cancel()
+                self._preempted += 1
+
+    def analyse(self,
+                board: chess.Board,
+                limit: chess.engine.Limit,
+                multipv: Optional[int] = None,
+                timeout: Optional[float] = None,
+                ticket: Optional[Any] = None,
+                game: Optional[str] = None,
+                early_stop: Optional[EarlyStop] = None):
+        """
+        Pooled ENGINE.analyse. A dead engine is replaced in its slot and the search retried once.
+        With a session ticket the search can be stopped by a newer position (raises Superseded).
+        With a game id the search goes to the game's engine; pass the board with its move stack so
+        the engine sees `position startpos moves ...` and reuses last move's hash entries.
+        With early_stop the search ends as soon as that rule fires (limit is then only the ceiling).
+        Returns dict or list[dict] like python-chess.
+        """
+        prefer = self.slot_for_game(game) if game else None
+        last_exc: Optional[BaseException] = None
+        for attempt in (1, 2):
+            with self.checkout(timeout, ticket=ticket, prefer=prefer) as slot:
+                if slot.engine is None and not self.replace(slot, reason="dead"):
+                    raise EngineUnavailable("Stockfish not available")
+                try:
+                    slot.searches += 1
+                    with metrics_support.stage("engine_search"):
+                        if ticket is not None or early_stop is not None:
+                            return self._analyse_stream(slot.engine, board, limit, multipv, ticket, early_stop)
+                        if multipv is not None:
+                            return slot.engine.analyse(board, limit, multipv=multipv)
+                        return slot.engine.analyse(board, limit)
+                except ENGINE_FAILURES as e:
+                    print(f"[engine] slot {slot.index}: analyse failed ({type(e).__name__}); "
+                          f"replacing engine (attempt {attempt})")
+                    slot.failures += 1
+                    last_exc = e
+                    self.replace(slot)
+        raise last_exc or RuntimeError("Stockfish analyse failed")
+
+    def _analyse_stream(self,
+                        engine: chess.engine.SimpleEngine,
+                        board: chess.Board,
+                        limit: chess.engine.Limit,
+                        multipv: Optional[int],
+                        ticket: Optional[Any],
+                        early_stop: Optional[EarlyStop]):
+        """
+        engine.analyse() built on engine.analysis(): ticket.cancel() can stop() it mid-search,
+        and early_stop is checked on every info.
+        """
+        started = time.monotonic()
+        if early_stop is not None:
+            early_stop.reset()
+        with engine.analysis(board, limit, multipv=multipv) as result:
+            if ticket is not None:
+                ticket.attach(result)
+            try:
+                if early_stop is None:
+                    result.wait()
+                else:
+                    for info in result:
+                        if early_stop(info):
+                            result.stop()
+                            self.note_early_stop(early_stop.reason, limit, time.monotonic() - started)
+                            break
+                    result.wait()
+            finally:
+                if ticket is not None:
+                    ticket.detach(result)
+        if ticket is not None:
+            ticket.check()
+        return result.multipv if multipv is not None else result.info
+
+    def note_early_stop(self, reason: Optional[str], limit: chess.engine.Limit, elapsed_s: float) -> None:
+        """Count a search ended by an EarlyStop rule and the part of its time limit it gave back."""
+        with self._cond:
+            key = reason or "rule"
+            self._early_stops[key] = self._early_stops.get(key, 0) + 1
+            if limit.time:
+                self._early_saved_s += max(0.0, limit.time - elapsed_s)
+
+    @contextmanager
+    def analysis(self,
+                 board: chess.Board,
+                 limit: chess.engine.Limit,
+                 multipv: Optional[int] = None,
+                 timeout: Optional[float] = None,
+                 ticket: Optional[Any] = None,
+                 game: Optional[str] = None) -> Iterator[chess.engine.SimpleAnalysisResult]:
+        """
+        Pooled ENGINE.analysis: iterate infos as depths complete, stop() to abort early.
+        The search is stopped and the engine returned to the pool when the block exits.
+        No retry here (the caller already streamed partial output); a dead engine is still replaced.
+        """
+        prefer = self.slot_for_game(game) if game else None
+        with self.checkout(timeout, ticket=ticket, prefer=prefer) as slot:
+            if slot.engine is None and not self.replace(slot, reason="dead"):
+                raise EngineUnavailable("Stockfish not available")
+            slot.searches += 1
+            search_start = time.perf_counter()
+            try:
+                with slot.engine.analysis(board, limit, multipv=multipv) as result:
+                    if ticket is not None:
+                        ticket.attach(result)
+                    try:
+                        yield result
+                    finally:
+                        if ticket is not None:
+                            ticket.detach(result)
+            except ENGINE_FAILURES as e:
+                print(f"[engine] slot {slot.index}: analysis failed ({type(e).__name__}); replacing engine")
+                slot.failures += 1
+                self.replace(slot)
+                raise
+            finally:
+                metrics_support.record("engine_search", search_start, time.perf_counter() - search_start)
+
+    # ----------------------------- stats -----------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._evict_idle_games(time.monotonic())
+            failovers = sum(self._failovers.values())
+            return {
+                "size": self.size,
+                "alive": self.alive(),
+                "busy": sum(1 for s in self._slots if s.busy),
+                "waiting": self._waiting,
+                "checkout_timeouts": self._timeouts,
+                "dropped_superseded": self._dropped,
+                "background": len(self._background),
+                "preempted": self._preempted,
+                "early_stops": dict(self._early_stops),
+                "early_stop_saved_s": round(self._early_saved_s, 3),
+                "standby": {"enabled": self.standby_enabled, "ready": self._standby is not None,
+                            "spawns": self._standby_spawns},
+                "failovers": {
+                    **self._failovers,
+                    "reasons": dict(self._failover_reasons),
+                    "last_ms": self._last_failover_ms,
+                    "mean_ms": round(self._failover_s / failovers * 1000, 2) if failovers else None,
+                },
+                "probes": self._probes,
+                "games_bound": len(self._games),
+                "games_evicted": self._games_evicted,
+                "games_per_engine": self.games_per_engine,
+                "options": dict(self.options),
+                "slots": [
+                    {"index": s.index, "alive": s.engine is not None, "busy": s.busy,
+                     "searches": s.searches, "failures": s.failures, "restarts": s.restarts,
+                     "games": self._games_on(s.index)}
+                    for s in self._slots
+                ],
+            }
+
+
+def pool_from_env() -> EnginePool:
+    """The pool app.py and engine_worker.py run: $SENSEI_ENGINES processes, Threads/Hash sized from the box."""
+    size = default_pool_size()
+    return EnginePool(
+        find_engine_path(),
+        size=size,
+        options=default_engine_options(size),
+        checkout_timeout_s=float(os.getenv("SENSEI_ENGINE_CHECKOUT_TIMEOUT_S", "5")),
+        games_per_engine=int(os.getenv("SENSEI_GAMES_PER_ENGINE", "8")),
+        game_idle_s=float(os.getenv("SENSEI_GAME_IDLE_S", "600")),
+        standby=os.getenv("SENSEI_ENGINE_STANDBY", "1") != "0",
+        probe_interval_s=float(os.getenv("SENSEI_ENGINE_PROBE_S", "5")),
+        probe_timeout_s=float(os.getenv("SENSEI_ENGINE_PROBE_TIMEOUT_S", "2")),
+    )
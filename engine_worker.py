@@ -0,0 +1,52 @@
+# engine_worker.py
+# SenseiBoard — engine node: runs searches that web nodes put on the job queue (queue_support).
+#
+#   python tools/resp_store.py --port 6381 --no-evict &                   # or a Redis without eviction
+#   SENSEI_BROKER_URL=redis://127.0.0.1:6381 python engine_worker.py       # one per engine host
+#   SENSEI_BROKER_URL=redis://127.0.0.1:6381 python app.py                 # web nodes, no local engines
+#
+# Engine count, threads and hash default to the box (as for app.py); scale engine nodes on CPU or
+# on the broker's queue depth (/api/health "broker.scale", sensei_broker_* gauges on any web node).
+# ---------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+import engine_support
+import queue_support
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="SenseiBoard engine worker (job queue consumer)")
+    parser.add_argument("--broker", default=os.getenv("SENSEI_BROKER_URL", ""),
+                        help="redis:// or unix:// broker URL (default $SENSEI_BROKER_URL)")
+    parser.add_argument("--id", default=os.getenv("SENSEI_WORKER_ID"), help="worker id (default host-pid)")
+    args = parser.parse_args(argv)
+    if not args.broker or args.broker == "local":
+        parser.error("needs a shared broker: --broker redis://host:port/db (or $SENSEI_BROKER_URL)")
+
+    pool = engine_support.pool_from_env()
+    if pool.start() == 0:
+        print("[broker] no engine started; exiting", flush=True)
+        return 1
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    worker = queue_support.EngineWorker(queue_support.open_broker(args.broker), pool, worker_id=args.id)
+    worker.start()
+    while not stop.wait(1.0):
+        pass
+    print(f"[broker] engine worker {worker.worker_id} stopping: {worker.stats()}", flush=True)
+    worker.stop()
+    pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,6 +14,8 @@ console.log("[Sensei] content script alive. typeof Chess =", typeof Chess, "extI
   // Constants (no user controls)
   const DEFAULT_THINK_MS = 350;
   const DEFAULT_THREAT_MS = 150;
+  // One analysis session per tab: the server drops our stale positions when a newer one arrives.
+  const SESSION_ID = (crypto.randomUUID && crypto.randomUUID()) || `tab-${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
   // UI
   const root = document.createElement("div");
@@ -215,7 +217,10 @@ console.log("[Sensei] content script alive. typeof Chess =", typeof Chess, "extI
       side_to_move: null, // auto
       movetime_ms: DEFAULT_THINK_MS,
       threat_time_ms: DEFAULT_THREAT_MS,
-      use_llm: true
+      use_llm: true,
+      defer_llm: true, // engine + motif text first, LLM phrasing follows via comment_ticket
+      session_id: SESSION_ID,
+      deadline_ms: 8000 // the server answers degraded (503) rather than late
     };
 
     state.isAnalyzing = true;
@@ -229,6 +234,16 @@ console.log("[Sensei] content script alive. typeof Chess =", typeof Chess, "extI
 
       els.lastAnalysisTime.textContent = `${((Date.now() - startTime) / 1000).toFixed(1)}s`;
 
+      // 409: a newer position from this tab replaced this one; its own analyze() call will render.
+      if (reply?.status === 409) return;
+
+      // 503 + degraded: server overloaded; motif/threat text without engine lines (or an older result)
+      if (reply?.status === 503 && reply.data?.degraded) {
+        displayResults(reply.data);
+        setStatus("Server busy - partial analysis", "warning");
+        return;
+      }
+
       if (!reply?.ok) {
         els.opp.innerHTML = `<span class="bad">Analysis failed:</span> ${escapeHtml(reply?.error || reply?.status || "Unknown error")}`;
         setStatus("Analysis failed", "bad");
@@ -237,6 +252,7 @@ console.log("[Sensei] content script alive. typeof Chess =", typeof Chess, "extI
 
       displayResults(reply.data || {});
       setStatus("Analysis complete", "good");
+      if (reply.data?.comment_ticket) fetchComments(reply.data.comment_ticket, fen);
     } catch (err) {
       els.opp.innerHTML = `<span class="bad">Connection error:</span> ${escapeHtml(String(err))}`;
       setStatus("Connection error", "bad");
@@ -246,6 +262,19 @@ console.log("[Sensei] content script alive. typeof Chess =", typeof Chess, "extI
     }
   }
 
+  // Deferred LLM phrasing: swap in the coach comments if the board hasn't moved on meanwhile.
+  async function fetchComments(ticket, fen) {
+    for (let attempt = 0; attempt < 3; attempt++) {
+      const reply = await chrome.runtime.sendMessage({ type: "sensei.comments", ticket, waitMs: 8000 })
+        .catch(() => null);
+      if (state.lastPosition !== fen || !reply?.ok) return;
+      const data = reply.data || {};
+      if (data.status === "pending") continue;
+      if (data.status === "ready" && !data.llm_fallback) displayResults(data);
+      return;
+    }
+  }
+
   function setLoadingState(loading) {
     [els.opp, els.you].forEach(el => {
       el.classList.toggle("loading", loading);
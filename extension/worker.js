@@ -1,6 +1,8 @@
 // worker.js — extension background fetch proxy
 
 const API = "http://127.0.0.1:8000/api/analyze"; // try 127.0.0.1 (often happier than 'localhost')
+const COMMENTS_API = "http://127.0.0.1:8000/api/comments/";
+const ANALYZE_TIMEOUT_MS = 10000; // a bit above the deadline_ms content.js sends
 
 chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
   if (msg?.type === "sensei.analyze") {
@@ -10,6 +12,7 @@ chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify(msg.payload),
+          signal: AbortSignal.timeout(ANALYZE_TIMEOUT_MS),
         });
         const data = await res.json().catch(() => ({}));
         sendResponse({ ok: res.ok, data, status: res.status });
@@ -19,4 +22,16 @@ chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
     })();
     return true; // keep the message channel open for async response
   }
+  if (msg?.type === "sensei.comments") {
+    (async () => {
+      try {
+        const res = await fetch(`${COMMENTS_API}${encodeURIComponent(msg.ticket)}?wait_ms=${msg.waitMs || 8000}`);
+        const data = await res.json().catch(() => ({}));
+        sendResponse({ ok: res.ok, data, status: res.status });
+      } catch (err) {
+        sendResponse({ ok: false, error: String(err) });
+      }
+    })();
+    return true;
+  }
 });
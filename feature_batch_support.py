@@ -0,0 +1,359 @@
+# feature_batch_support.py
+# feature_support's cue set for many positions at once: boards packed into NumPy uint64 bitboard
+# arrays, every cue computed with whole-array bit operations (Kogge-Stone fills for sliders), fed
+# by a streaming PGN reader. For mining game databases (tools/mine_features.py); verify() checks
+# exact agreement with the scalar build_feature_tokens.
+from __future__ import annotations
+
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+import chess
+import chess.pgn
+import numpy as np
+
+import feature_support
+
+# column order of extract(): the order build_feature_tokens emits tokens in
+CUES: Tuple[str, ...] = (
+    "opponent_queen_on_h5_or_h4",
+    "our_king_castled_short",
+    "line_to_h7_or_h2",
+    "our_back_rank_boxed",
+    "their_major_on_open_file",
+    "our_hanging_piece_exists",
+    "their_king_castled_short",
+    "our_bishop_attacks_h7_or_h2",
+    "our_knight_can_jump_g5_or_g4",
+    "their_piece_pinned_to_king",
+    "xray_same_file_as_king_with_one_blocker",
+    "queen_bishop_same_diagonal_with_blocker",
+    "f7_or_f2_under_pressure",
+    "phase_middlegame",
+)
+
+_U = np.uint64
+_ALL = _U(chess.BB_ALL)
+_NOT_A = _U(chess.BB_ALL & ~chess.BB_FILE_A)
+_NOT_H = _U(chess.BB_ALL & ~chess.BB_FILE_H)
+_NOT_AB = _U(chess.BB_ALL & ~(chess.BB_FILE_A | chess.BB_FILE_B))
+_NOT_GH = _U(chess.BB_ALL & ~(chess.BB_FILE_G | chess.BB_FILE_H))
+
+# (shift, wrap mask): positive shifts go towards h8, the mask drops squares that wrapped a board edge
+_ORTH = ((8, _ALL), (-8, _ALL), (1, _NOT_A), (-1, _NOT_H))
+_DIAG = ((9, _NOT_A), (7, _NOT_H), (-7, _NOT_A), (-9, _NOT_H))
+_KNIGHT = ((17, _NOT_A), (15, _NOT_H), (10, _NOT_AB), (6, _NOT_GH),
+           (-6, _NOT_AB), (-10, _NOT_GH), (-15, _NOT_A), (-17, _NOT_H))
+
+
+def _shift(bb: np.ndarray, n: int) -> np.ndarray:
+    return bb << _U(n) if n > 0 else bb >> _U(-n)
+
+
+def _step(bb: np.ndarray, n: int, wrap: np.uint64) -> np.ndarray:
+    return _shift(bb, n) & wrap
+
+
+def _ray(gen: np.ndarray, empty: np.ndarray, n: int, wrap: np.uint64) -> np.ndarray:
+    """Sliding attacks of every piece in gen along one direction, up to and including the first blocker."""
+    pro = empty & wrap
+    gen = gen | pro & _shift(gen, n)
+    pro = pro & _shift(pro, n)
+    gen = gen | pro & _shift(gen, 2 * n)
+    pro = pro & _shift(pro, 2 * n)
+    gen = gen | pro & _shift(gen, 4 * n)
+    return _step(gen, n, wrap)
+
+
+def _slides(gen: np.ndarray, empty: np.ndarray, dirs) -> np.ndarray:
+    out = np.zeros_like(gen)
+    for n, wrap in dirs:
+        out |= _ray(gen, empty, n, wrap)
+    return out
+
+
+def _knights(bb: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(bb)
+    for n, wrap in _KNIGHT:
+        out |= _step(bb, n, wrap)
+    return out
+
+
+def _kings(bb: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(bb)
+    for n, wrap in _ORTH + _DIAG:
+        out |= _step(bb, n, wrap)
+    return out
+
+
+def _pawn_attacks(bb: np.ndarray, white: np.ndarray) -> np.ndarray:
+    """Capture squares of pawns in bb, moving up the board where `white` is set."""
+    up = _step(bb, 9, _NOT_A) | _step(bb, 7, _NOT_H)
+    down = _step(bb, -7, _NOT_A) | _step(bb, -9, _NOT_H)
+    return np.where(white, up, down)
+
+
+def _file_fill(bb: np.ndarray) -> np.ndarray:
+    """Every square on a file that holds a bit of bb."""
+    for n in (8, 16, 32):
+        bb = bb | _shift(bb, n) | _shift(bb, -n)
+    return bb
+
+
+def _lsb(bb: np.ndarray) -> np.ndarray:
+    return bb & (~bb + _U(1))
+
+
+def _square(square: chess.Square, n: int) -> np.ndarray:
+    return np.full(n, chess.BB_SQUARES[square], dtype=np.uint64)
+
+
+# ----------------------------- packing -----------------------------
+class PositionBatch:
+    """
+    Packed positions: one uint64 array per piece type and per color (python-chess bitboards),
+    the side to move, the last-move flag the scalar cue reads from SAN, and where each came from.
+    boards / sans are kept only when asked for (verify, FEN output).
+    """
+
+    def __init__(self, rows: List[Tuple[int, ...]], boards: Optional[List[chess.Board]] = None,
+                 sans: Optional[List[Optional[str]]] = None):
+        cols = np.array(rows, dtype=np.uint64).reshape(-1, 12).T
+        (self.pawns, self.knights, self.bishops, self.rooks, self.queens, self.kings,
+         self.white, self.black) = cols[:8]
+        self.turn = cols[8].astype(bool)
+        self.queen_h5_h4 = cols[9].astype(bool)
+        self.game = cols[10].astype(np.int64)
+        self.ply = cols[11].astype(np.int64)
+        self.boards = boards
+        self.sans = sans
+
+    def __len__(self) -> int:
+        return len(self.turn)
+
+
+def pack_row(board: chess.Board, last_move_san: Optional[str], game: int = 0) -> Tuple[int, ...]:
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], int(board.turn),
+            int(last_move_san in ("Qh5", "Qh4")), game, board.ply())
+
+
+def pack(boards: List[chess.Board], last_move_sans: Optional[List[Optional[str]]] = None,
+         keep_boards: bool = False) -> PositionBatch:
+    sans = last_move_sans or [None] * len(boards)
+    rows = [pack_row(b, s) for b, s in zip(boards, sans)]
+    return PositionBatch(rows, list(boards) if keep_boards else None, list(sans) if keep_boards else None)
+
+
+class _MainlineVisitor(chess.pgn.BaseVisitor):
+    """Packs every mainline position of one game while it is parsed; variations are skipped."""
+
+    def __init__(self, game: int, include_start: bool, keep_boards: bool):
+        self.game = game
+        self.include_start = include_start
+        self.keep_boards = keep_boards
+        self.rows: List[Tuple[int, ...]] = []
+        self.boards: List[chess.Board] = []
+        self.sans: List[Optional[str]] = []
+        self.error: Optional[Exception] = None
+        self._san: Optional[str] = None
+        self._started = False
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def parse_san(self, board: chess.Board, san: str) -> chess.Move:
+        self._san = san  # the token as written; the scalar cue compares SAN text too
+        return board.parse_san(san)
+
+    def visit_board(self, board: chess.Board) -> None:
+        if not self._started:  # the game's starting position
+            self._started = True
+            if not self.include_start:
+                return
+        self.rows.append(pack_row(board, self._san, self.game))
+        if self.keep_boards:
+            self.boards.append(board.copy(stack=False))
+            self.sans.append(self._san)
+
+    def handle_error(self, error: Exception) -> None:
+        self.error = self.error or error  # the parser skips the rest of this game
+
+    def result(self) -> bool:
+        return self._started
+
+
+def iter_pgn_batches(handle: TextIO,
+                     batch_size: int = 8192,
+                     include_start: bool = False,
+                     keep_boards: bool = False,
+                     max_positions: Optional[int] = None,
+                     errors: Optional[List[Tuple[int, str]]] = None) -> Iterator[PositionBatch]:
+    """
+    Stream a PGN (any size) as PositionBatches of up to batch_size mainline positions, game by game.
+    Games with an illegal move keep their positions up to it; (game index, message) goes to errors.
+    """
+    rows: List[Tuple[int, ...]] = []
+    boards: List[chess.Board] = []
+    sans: List[Optional[str]] = []
+    total = 0
+    game = 0
+    while max_positions is None or total < max_positions:
+        visitor = _MainlineVisitor(game, include_start, keep_boards)
+        if not chess.pgn.read_game(handle, Visitor=lambda: visitor):
+            break
+        if visitor.error is not None and errors is not None:
+            errors.append((game, str(visitor.error)))
+        take = len(visitor.rows) if max_positions is None else min(len(visitor.rows), max_positions - total)
+        rows.extend(visitor.rows[:take])
+        boards.extend(visitor.boards[:take])
+        sans.extend(visitor.sans[:take])
+        total += take
+        game += 1
+        while len(rows) >= batch_size:
+            yield PositionBatch(rows[:batch_size], boards[:batch_size] if keep_boards else None,
+                                sans[:batch_size] if keep_boards else None)
+            del rows[:batch_size], boards[:batch_size], sans[:batch_size]
+    if rows:
+        yield PositionBatch(rows, boards if keep_boards else None, sans if keep_boards else None)
+
+
+# ----------------------------- cues -----------------------------
+class _Side:
+    """One color's piece bitboards per position (color chosen per row)."""
+
+    def __init__(self, batch: PositionBatch, white: np.ndarray):
+        self.is_white = white
+        self.occ = np.where(white, batch.white, batch.black)
+        self.pawns = batch.pawns & self.occ
+        self.knights = batch.knights & self.occ
+        self.bishops = batch.bishops & self.occ
+        self.rooks = batch.rooks & self.occ
+        self.queens = batch.queens & self.occ
+        self.king = batch.kings & self.occ
+
+    def attacks(self, empty: np.ndarray) -> np.ndarray:
+        """Union of attacks_mask over this side's pieces (pawns: capture squares)."""
+        return (_pawn_attacks(self.pawns, self.is_white) | _knights(self.knights) | _kings(self.king)
+                | _slides(self.bishops | self.queens, empty, _DIAG)
+                | _slides(self.rooks | self.queens, empty, _ORTH))
+
+    def attackers(self, target: np.ndarray, empty: np.ndarray) -> np.ndarray:
+        """This side's pieces attacking the single square in target (Board.attackers_mask)."""
+        return (_pawn_attacks(target, ~self.is_white) & self.pawns
+                | _knights(target) & self.knights
+                | _kings(target) & self.king
+                | _slides(target, empty, _DIAG) & (self.bishops | self.queens)
+                | _slides(target, empty, _ORTH) & (self.rooks | self.queens))
+
+
+def _pinned(own: _Side, them: _Side, empty: np.ndarray) -> np.ndarray:
+    """own's pieces that are the only piece between own's king and an enemy slider (Board.is_pinned)."""
+    pinned = np.zeros_like(empty)
+    for dirs, snipers in ((_ORTH, them.rooks | them.queens), (_DIAG, them.bishops | them.queens)):
+        for n, wrap in dirs:
+            first = _ray(own.king, empty, n, wrap) & own.occ
+            beyond = _ray(own.king, empty | first, n, wrap) & snipers
+            pinned |= np.where(beyond != 0, first, _U(0))
+    return pinned
+
+
+def _between(a: np.ndarray, b: np.ndarray, empty: np.ndarray) -> np.ndarray:
+    """Squares strictly between a and b when they share a clear line (chess.between), else 0."""
+    out = np.zeros_like(a)
+    for n, wrap in _ORTH + _DIAG:
+        back = next(w for m, w in _ORTH + _DIAG if m == -n)
+        out |= _ray(a, empty, n, wrap) & _ray(b, empty, -n, back)
+    return out
+
+
+def extract(batch: PositionBatch) -> np.ndarray:
+    """bool matrix (positions x CUES): row i, column j is set iff build_feature_tokens emits CUES[j]."""
+    n = len(batch)
+    occupied = batch.white | batch.black
+    empty = ~occupied
+    our = _Side(batch, batch.turn)
+    opp = _Side(batch, ~batch.turn)
+    out = np.zeros((n, len(CUES)), dtype=bool)
+    col = {name: i for i, name in enumerate(CUES)}
+    short = _U(chess.BB_G1 | chess.BB_G8)
+
+    # h-pawn / f-pawn square of the side not to move
+    their_h = np.where(opp.is_white, _U(chess.BB_H2), _U(chess.BB_H7))
+    their_f = np.where(opp.is_white, _U(chess.BB_F2), _U(chess.BB_F7))
+    their_h_diag = _slides(their_h, empty, _DIAG)
+
+    out[:, col["opponent_queen_on_h5_or_h4"]] = batch.queen_h5_h4
+    out[:, col["our_king_castled_short"]] = our.king & short != 0
+    # sliders of the side not to move aimed at its own h-pawn square, as line_to_h7_or_h2 is called
+    out[:, col["line_to_h7_or_h2"]] = (their_h_diag & (opp.bishops | opp.queens)
+                                       | _slides(their_h, empty, _ORTH) & opp.queens) != 0
+
+    shield = np.where(our.is_white, _U(chess.BB_F2 | chess.BB_G2 | chess.BB_H2),
+                      _U(chess.BB_F7 | chess.BB_G7 | chess.BB_H7))
+    back_rank = _U(chess.BB_E1 | chess.BB_G1 | chess.BB_C1 | chess.BB_E8 | chess.BB_G8 | chess.BB_C8)
+    out[:, col["our_back_rank_boxed"]] = (our.king & back_rank != 0) & (np.bitwise_count(our.pawns & shield) >= 2)
+
+    out[:, col["their_major_on_open_file"]] = (opp.rooks | opp.queens) & ~_file_fill(batch.pawns) != 0
+
+    our_attacks = our.attacks(empty)
+    opp_attacks = opp.attacks(empty)
+    out[:, col["our_hanging_piece_exists"]] = our.occ & opp_attacks & ~our_attacks != 0
+    out[:, col["their_king_castled_short"]] = opp.king & short != 0
+    out[:, col["our_bishop_attacks_h7_or_h2"]] = their_h_diag & our.bishops != 0
+
+    # a legal knight move to g5/g4: unpinned knight, target not our own piece, and out of any check
+    checkers = opp.attackers(our.king, empty)
+    n_checkers = np.bitwise_count(checkers)
+    evasion = np.where(n_checkers == 0, _ALL,
+                       np.where(n_checkers == 1, checkers | _between(our.king, checkers, empty), _U(0)))
+    targets = _U(chess.BB_G5 | chess.BB_G4) & ~our.occ & evasion
+    our_pinned = _pinned(our, opp, empty)
+    out[:, col["our_knight_can_jump_g5_or_g4"]] = _knights(targets) & our.knights & ~our_pinned != 0
+
+    out[:, col["their_piece_pinned_to_king"]] = _pinned(opp, our, empty) != 0
+
+    # the second piece up or down the enemy king's file is one of our rooks/queens
+    xray = np.zeros(n, dtype=bool)
+    for step, wrap in _ORTH[:2]:
+        first = _ray(opp.king, empty, step, wrap) & occupied
+        second = _ray(opp.king, empty | first, step, wrap) & ~first & (our.rooks | our.queens)
+        xray |= second != 0
+    out[:, col["xray_same_file_as_king_with_one_blocker"]] = xray
+
+    # from each of our queens: the first piece on a diagonal is ours and the second is our bishop
+    aligned = np.zeros(n, dtype=bool)
+    queens = our.queens.copy()
+    while queens.any():
+        queen = _lsb(queens)
+        queens ^= queen
+        for step, wrap in _DIAG:
+            first = _ray(queen, empty, step, wrap) & our.occ
+            second = _ray(queen, empty | first, step, wrap) & ~first & our.bishops
+            aligned |= (first != 0) & (second != 0)
+    out[:, col["queen_bishop_same_diagonal_with_blocker"]] = aligned
+
+    attackers = np.bitwise_count(our.attackers(their_f, empty)).astype(np.int64)
+    defenders = np.bitwise_count(opp.attackers(their_f, empty)).astype(np.int64)
+    out[:, col["f7_or_f2_under_pressure"]] = attackers >= np.maximum(2, defenders + 1)
+
+    out[:, col["phase_middlegame"]] = True
+    return out
+
+
+def tokens(row: np.ndarray) -> List[str]:
+    """One extract() row as the token list build_feature_tokens returns."""
+    return [CUES[j] for j in np.flatnonzero(row)]
+
+
+def verify(batch: PositionBatch, matrix: Optional[np.ndarray] = None) -> List[Tuple[int, List[str], List[str]]]:
+    """(row, vectorized tokens, scalar tokens) for every row where they differ; needs keep_boards."""
+    if batch.boards is None:
+        raise ValueError("verify needs a batch packed with keep_boards=True")
+    matrix = extract(batch) if matrix is None else matrix
+    diffs = []
+    for i, (board, san) in enumerate(zip(batch.boards, batch.sans)):
+        fast = tokens(matrix[i])
+        slow = feature_support.build_feature_tokens(board, san)
+        if fast != slow:
+            diffs.append((i, fast, slow))
+    return diffs
@@ -0,0 +1,219 @@
+# feature_support.py
+# Cheap board cues for RAG retrieval, computed from one shared per-position attack map.
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+import chess
+
+_H7_H2 = {chess.WHITE: chess.H2, chess.BLACK: chess.H7}          # h-pawn square of each side
+_F7_F2 = {chess.WHITE: chess.F2, chess.BLACK: chess.F7}
+_BACK_RANK_KING = chess.BB_E1 | chess.BB_G1 | chess.BB_C1 | chess.BB_E8 | chess.BB_G8 | chess.BB_C8
+_SHORT_CASTLED = chess.BB_G1 | chess.BB_G8
+_KINGSIDE_SHIELD = {                                              # f/g/h pawns in front of the king
+    chess.WHITE: chess.BB_F2 | chess.BB_G2 | chess.BB_H2,
+    chess.BLACK: chess.BB_F7 | chess.BB_G7 | chess.BB_H7,
+}
+
+
+def _popcount(bb: int) -> int:
+    return bin(bb).count("1")
+
+
+class PositionContext:
+    """
+    Attack/defend bitboards for one position, built once and shared by every cue detector
+    and by quick_threat_scan:
+      attacks[sq]      squares the piece on sq attacks (pawns: capture squares)
+      attacked_by[c]   union of all of c's attacks
+      pinned[c]        c's pieces pinned to c's king
+      pawns            all pawns (file masks test open files)
+    Legal moves are only generated if a detector asks for them.
+    """
+
+    def __init__(self, board: chess.Board):
+        self.board = board
+        self.occupied = board.occupied
+        self.occupied_co = {chess.WHITE: board.occupied_co[chess.WHITE],
+                            chess.BLACK: board.occupied_co[chess.BLACK]}
+        self.pawns = board.pawns
+        self.attacks: Dict[chess.Square, int] = {}
+        self.attacked_by = {chess.WHITE: 0, chess.BLACK: 0}
+        for color in chess.COLORS:
+            for sq in chess.scan_reversed(self.occupied_co[color]):
+                mask = board.attacks_mask(sq)
+                self.attacks[sq] = mask
+                self.attacked_by[color] |= mask
+        self.pinned = {color: self._pinned_mask(color) for color in chess.COLORS}
+        self._legal_moves: Optional[List[chess.Move]] = None
+
+    def _pinned_mask(self, color: chess.Color) -> int:
+        """Same rule as Board.is_pinned: the only piece between our king and an enemy slider."""
+        king = self.board.king(color)
+        if king is None:
+            return 0
+        b = self.board
+        them = self.occupied_co[not color]
+        snipers = them & (
+            (chess.BB_RANK_ATTACKS[king][0] | chess.BB_FILE_ATTACKS[king][0]) & (b.rooks | b.queens)
+            | chess.BB_DIAG_ATTACKS[king][0] & (b.bishops | b.queens)
+        )
+        pinned = 0
+        for sniper in chess.scan_reversed(snipers):
+            blockers = chess.between(king, sniper) & self.occupied
+            if blockers and _popcount(blockers) == 1:
+                pinned |= blockers & self.occupied_co[color]
+        return pinned
+
+    def pieces(self, piece_type: chess.PieceType, color: chess.Color) -> int:
+        return self.board.pieces_mask(piece_type, color)
+
+    def attackers(self, color: chess.Color, square: chess.Square) -> int:
+        """Mask of color's pieces attacking square (same as Board.attackers_mask)."""
+        bb = chess.BB_SQUARES[square]
+        mask = 0
+        for sq in chess.scan_reversed(self.occupied_co[color]):
+            if self.attacks[sq] & bb:
+                mask |= chess.BB_SQUARES[sq]
+        return mask
+
+    def hanging(self, color: chess.Color) -> int:
+        """color's pieces attacked by the opponent and not defended."""
+        return self.occupied_co[color] & self.attacked_by[not color] & ~self.attacked_by[color]
+
+    @property
+    def legal_moves(self) -> List[chess.Move]:
+        if self._legal_moves is None:
+            self._legal_moves = list(self.board.legal_moves)
+        return self._legal_moves
+
+
+# ----------------------------- cue detectors -----------------------------
+def is_castled_short(ctx: PositionContext, color: chess.Color) -> bool:
+    return bool(ctx.pieces(chess.KING, color) & _SHORT_CASTLED)
+
+
+def queen_on_h5_or_h4(ctx: PositionContext, color: chess.Color) -> bool:
+    return bool(ctx.pieces(chess.QUEEN, color) & (chess.BB_H5 | chess.BB_H4))
+
+
+def line_to_h7_or_h2(ctx: PositionContext, attacker_color: chess.Color, our_color: chess.Color) -> bool:
+    sliders = ctx.pieces(chess.BISHOP, attacker_color) | ctx.pieces(chess.QUEEN, attacker_color)
+    return bool(ctx.attackers(attacker_color, _H7_H2[not our_color]) & sliders)
+
+
+def our_back_rank_boxed(ctx: PositionContext, our_color: chess.Color) -> bool:
+    if not ctx.pieces(chess.KING, our_color) & _BACK_RANK_KING:
+        return False
+    return _popcount(ctx.pieces(chess.PAWN, our_color) & _KINGSIDE_SHIELD[our_color]) >= 2
+
+
+def their_major_on_open_file(ctx: PositionContext, opp_color: chess.Color) -> bool:
+    majors = ctx.pieces(chess.ROOK, opp_color) | ctx.pieces(chess.QUEEN, opp_color)
+    for sq in chess.scan_reversed(majors):
+        if not chess.BB_FILES[chess.square_file(sq)] & ctx.pawns:
+            return True
+    return False
+
+
+def our_hanging_piece_exists(ctx: PositionContext, our_color: chess.Color) -> bool:
+    return bool(ctx.hanging(our_color))
+
+
+def their_king_castled_short(ctx: PositionContext, opp_color: chess.Color) -> bool:
+    return bool(ctx.pieces(chess.KING, opp_color) & _SHORT_CASTLED)
+
+
+def our_bishop_attacks_h7_or_h2(ctx: PositionContext, our_color: chess.Color, opp_color: chess.Color) -> bool:
+    return bool(ctx.attackers(our_color, _H7_H2[opp_color]) & ctx.pieces(chess.BISHOP, our_color))
+
+
+def our_knight_can_jump_g5_or_g4(ctx: PositionContext, our_color: chess.Color) -> bool:
+    knights = ctx.pieces(chess.KNIGHT, our_color)
+    targets = chess.BB_G5 | chess.BB_G4
+    # cheap reject before touching legal moves: no knight of ours attacks either square
+    if not any(ctx.attacks[sq] & targets for sq in chess.scan_reversed(knights)):
+        return False
+    return any(chess.BB_SQUARES[m.from_square] & knights and chess.BB_SQUARES[m.to_square] & targets
+               for m in ctx.legal_moves)
+
+
+def any_pinned_piece_to_king(ctx: PositionContext, opp_color: chess.Color) -> bool:
+    return bool(ctx.pinned[opp_color])
+
+
+def xray_same_file_as_king_with_one_blocker(ctx: PositionContext, our_color: chess.Color, opp_color: chess.Color) -> bool:
+    """Our rook/queen share file with enemy king, exactly one piece between."""
+    ksq = ctx.board.king(opp_color)
+    if ksq is None:
+        return False
+    majors = ctx.pieces(chess.ROOK, our_color) | ctx.pieces(chess.QUEEN, our_color)
+    for sq in chess.scan_reversed(majors & chess.BB_FILES[chess.square_file(ksq)]):
+        if _popcount(chess.between(sq, ksq) & ctx.occupied) == 1:
+            return True
+    return False
+
+
+def queen_bishop_same_diagonal_with_blocker(ctx: PositionContext, our_color: chess.Color) -> bool:
+    """Our queen and bishop are aligned on a diagonal with exactly one friendly blocker between (discovered attack potential)."""
+    for q in chess.scan_reversed(ctx.pieces(chess.QUEEN, our_color)):
+        for b in chess.scan_reversed(ctx.pieces(chess.BISHOP, our_color)):
+            df = abs(chess.square_file(q) - chess.square_file(b))
+            dr = abs(chess.square_rank(q) - chess.square_rank(b))
+            if df != dr:
+                continue
+            between = chess.between(q, b)
+            if between & ctx.occupied_co[not our_color]:
+                continue
+            if _popcount(between & ctx.occupied_co[our_color]) == 1:
+                return True
+    return False
+
+
+def f7_f2_under_pressure(ctx: PositionContext, our_color: chess.Color, opp_color: chess.Color) -> bool:
+    """Attackers on f7/f2 outnumber defenders (rough threshold)."""
+    target = _F7_F2[opp_color]
+    att = _popcount(ctx.attackers(our_color, target))
+    deff = _popcount(ctx.attackers(opp_color, target))
+    return att >= max(2, deff + 1)
+
+
+def build_feature_tokens(board: chess.Board,
+                         last_move_san: Optional[str],
+                         ctx: Optional[PositionContext] = None) -> List[str]:
+    ctx = ctx or PositionContext(board)
+    our_color = board.turn
+    opp_color = not our_color
+    feats = []
+
+    if last_move_san in ("Qh5", "Qh4"):
+        feats.append("opponent_queen_on_h5_or_h4")
+
+    if is_castled_short(ctx, our_color):
+        feats.append("our_king_castled_short")
+    if line_to_h7_or_h2(ctx, opp_color, our_color):
+        feats.append("line_to_h7_or_h2")
+    if our_back_rank_boxed(ctx, our_color):
+        feats.append("our_back_rank_boxed")
+    if their_major_on_open_file(ctx, opp_color):
+        feats.append("their_major_on_open_file")
+    if our_hanging_piece_exists(ctx, our_color):
+        feats.append("our_hanging_piece_exists")
+
+    if their_king_castled_short(ctx, opp_color):
+        feats.append("their_king_castled_short")
+    if our_bishop_attacks_h7_or_h2(ctx, our_color, opp_color):
+        feats.append("our_bishop_attacks_h7_or_h2")
+    if our_knight_can_jump_g5_or_g4(ctx, our_color):
+        feats.append("our_knight_can_jump_g5_or_g4")
+    if any_pinned_piece_to_king(ctx, opp_color):
+        feats.append("their_piece_pinned_to_king")
+    if xray_same_file_as_king_with_one_blocker(ctx, our_color, opp_color):
+        feats.append("xray_same_file_as_king_with_one_blocker")
+    if queen_bishop_same_diagonal_with_blocker(ctx, our_color):
+        feats.append("queen_bishop_same_diagonal_with_blocker")
+    if f7_f2_under_pressure(ctx, our_color, opp_color):
+        feats.append("f7_or_f2_under_pressure")
+
+    feats.append("phase_middlegame")  # safe default
+    return feats
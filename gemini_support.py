@@ -5,22 +5,60 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Any, Dict, List
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
 
-import google.generativeai as genai
+# google.generativeai (grpc, protobuf, ...) is imported on first use in _client():
+# servers without GOOGLE_API_KEY never pay for it.
 
 # Configure once
 _API_KEY = os.getenv("GOOGLE_API_KEY")
 _MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+# e.g. http://127.0.0.1:8089 for tools/gemini_stub.py (REST transport)
+_BASE_URL = os.getenv("GEMINI_BASE_URL")
+# hard per-request budget; past it the caller keeps the RAG text
+TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", "4.0"))
+CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "1024"))
+
+_EMPTY = {"opponent_comment": "", "your_comment": ""}
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+# LLM calls run here so a slow answer never holds a request past TIMEOUT_S
+_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+                               thread_name_prefix="sensei-gemini")
+
+# context JSON (sort_keys) -> parsed comments; LRU
+_CACHE: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+_PENDING: Dict[str, Future] = {}
+_LOCK = threading.Lock()
+_STATS = {"calls": 0, "cache_hits": 0, "joined": 0, "timeouts": 0, "errors": 0}
 
 def _configured() -> bool:
     return bool(_API_KEY)
 
 def _client():
+    """One configured GenerativeModel per process."""
+    global _MODEL
     if not _configured():
         raise RuntimeError("GOOGLE_API_KEY not set")
-    genai.configure(api_key=_API_KEY)
-    return genai.GenerativeModel(_MODEL_NAME)
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            import google.generativeai as genai
+            if _BASE_URL:
+                genai.configure(api_key=_API_KEY, transport="rest",
+                                client_options={"api_endpoint": _BASE_URL})
+            else:
+                genai.configure(api_key=_API_KEY)
+            _MODEL = genai.GenerativeModel(_MODEL_NAME)
+        return _MODEL
+
+def warm() -> None:
+    """Import + configure the client off the request path (no-op without GOOGLE_API_KEY)."""
+    if _configured():
+        _EXECUTOR.submit(_client)
 
 def _safe_take(text: str, max_words: int = 25) -> str:
     words = text.strip().split()
@@ -35,10 +73,12 @@ def generate_comments(
     eval_cp: float | None,
     threats: Dict[str, Any],
     motif_card: Dict[str, Any] | None,
+    budget_s: float | None = None,
 ) -> Dict[str, str]:
     """
     Return {"opponent_comment": str, "your_comment": str}
     - Short, grounded summaries. The model rephrases known facts; it doesn't invent moves.
+    - Cached by the context JSON; empty strings if nothing arrives within budget_s (default TIMEOUT_S).
     """
     if not _configured():
         # No key set -> caller should skip LLM
@@ -75,9 +115,35 @@ def generate_comments(
         f"Context JSON:\n{json.dumps(context, ensure_ascii=False)}"
     )
 
+    key = json.dumps(context, ensure_ascii=False, sort_keys=True)
+    with _LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None:
+            _CACHE.move_to_end(key)
+            _STATS["cache_hits"] += 1
+            return dict(hit)
+        fut = _PENDING.get(key)
+        if fut is None:
+            _STATS["calls"] += 1
+            # the HTTP timeout covers the caller's budget (deferred comments wait longer than TIMEOUT_S)
+            request_timeout_s = max(TIMEOUT_S * 2, 10.0, budget_s or 0.0)
+            fut = _PENDING[key] = _EXECUTOR.submit(_call, key, sys, user, request_timeout_s)
+        else:
+            _STATS["joined"] += 1
+
+    try:
+        out = fut.result(timeout=TIMEOUT_S if budget_s is None else budget_s)
+    except FutureTimeout:
+        # the call keeps running and fills the cache for the next request
+        with _LOCK:
+            _STATS["timeouts"] += 1
+        return dict(_EMPTY)
+    return dict(out) if out else dict(_EMPTY)
+
+def _call(key: str, sys: str, user: str, timeout_s: float) -> Optional[Dict[str, str]]:
     try:
         model = _client()
-        resp = model.generate_content([sys, user])
+        resp = model.generate_content([sys, user], request_options={"timeout": timeout_s})
         text = resp.text or ""
         # Try to parse JSON; if it isn't pure JSON, try to find a JSON block
         try:
@@ -89,8 +155,22 @@ def generate_comments(
 
         opp = _safe_take(str(data.get("opponent_comment", "")).strip())
         you = _safe_take(str(data.get("your_comment", "")).strip())
+        out = {"opponent_comment": opp, "your_comment": you}
+    except Exception as e:
+        # Fallback: None => caller retains previous comments
+        print(f"[gemini] generate failed: {e}")
+        out = None
+    with _LOCK:
+        _PENDING.pop(key, None)
+        if out is None:
+            _STATS["errors"] += 1
+        elif out["opponent_comment"] or out["your_comment"]:
+            _CACHE[key] = out
+            while len(_CACHE) > CACHE_SIZE:
+                _CACHE.popitem(last=False)
+    return out
 
-        return {"opponent_comment": opp, "your_comment": you}
-    except Exception:
-        # Fallback: empty => caller retains previous comments
-        return {"opponent_comment": "", "your_comment": ""}
+def stats() -> Dict[str, Any]:
+    with _LOCK:
+        return {**_STATS, "configured": _configured(), "stub": bool(_BASE_URL), "timeout_s": TIMEOUT_S,
+                "cache_size": len(_CACHE), "in_flight": len(_PENDING)}
@@ -0,0 +1,223 @@
+# metrics_support.py
+# Per-stage timing spans, an optional per-request trace, and Prometheus text export.
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# seconds; engine searches sit in the 0.05 - 1 s range, cue/RAG stages well below 1 ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Registry:
+    """
+    Histograms + counters recorded in-process, plus collectors: callables returning nested stats
+    dicts (cache, pool, ...) whose numeric leaves are exported as gauges at scrape time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hist: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._hist.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = Histogram()
+            h.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def add_collector(self, prefix: str, fn: Callable[[], Dict[str, Any]]) -> None:
+        self._collectors.append((prefix, fn))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        out: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                self._header(out, name, "counter")
+                for labels, v in sorted(self._counters[name].items()):
+                    out.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+            for name in sorted(self._hist):
+                self._header(out, name, "histogram")
+                for labels, h in sorted(self._hist[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        out.append(f"{name}_bucket{_fmt_labels(labels, ('le', _fmt_value(bound)))} {cumulative}")
+                    out.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {h.count}")
+                    out.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h.sum)}")
+                    out.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+        for prefix, fn in self._collectors:
+            try:
+                stats = fn()
+            except Exception as e:
+                print(f"[metrics] collector {prefix} failed: {e}")
+                continue
+            for name, value in _flatten(prefix, stats):
+                self._header(out, name, "gauge")
+                out.append(f"{name} {_fmt_value(value)}")
+        return "\n".join(out) + "\n"
+
+    def _header(self, out: List[str], name: str, kind: str) -> None:
+        if name in self._help:
+            out.append(f"# HELP {name} {self._help[name]}")
+        out.append(f"# TYPE {name} {kind}")
+
+
+def _flatten(prefix: str, stats: Any) -> Iterator[Tuple[str, float]]:
+    """Numeric / bool leaves of a nested stats dict as (prefix_path, value); lists and strings are skipped."""
+    if isinstance(stats, bool):
+        yield prefix, float(stats)
+    elif isinstance(stats, (int, float)):
+        yield prefix, stats
+    elif isinstance(stats, dict):
+        for k, v in stats.items():
+            yield from _flatten(f"{prefix}_{k}", v)
+
+
+REGISTRY = Registry()
+REGISTRY.describe("sensei_stage_seconds", "Time spent per analysis stage (nested stages joined by '/').")
+REGISTRY.describe("sensei_request_seconds", "HTTP request latency by route.")
+REGISTRY.describe("sensei_requests_total", "HTTP requests by route and status.")
+REGISTRY.describe("sensei_engine_failover_seconds", "Time to replace a failed engine (warm standby or cold spawn).")
+
+
+# ----------------------------- spans -----------------------------
+class Trace:
+    """Spans of one request (start offsets relative to the request start), collected across threads."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, seconds: float) -> None:
+        with self._lock:
+            self.spans.append({"stage": name,
+                               "start_ms": round((start - self.t0) * 1000, 2),
+                               "ms": round(seconds * 1000, 2)})
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"total_ms": round((time.perf_counter() - self.t0) * 1000, 2), "spans": spans}
+
+
+_TRACE: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("sensei_trace", default=None)
+_STAGE: contextvars.ContextVar[str] = contextvars.ContextVar("sensei_stage", default="")
+
+
+@contextmanager
+def trace(enabled: bool = True) -> Iterator[Optional[Trace]]:
+    """Collect this request's spans (None when disabled; stages are still timed into histograms)."""
+    token = _TRACE.set(Trace() if enabled else None)
+    try:
+        yield _TRACE.get()
+    finally:
+        _TRACE.reset(token)
+
+
+def _path(name: str) -> str:
+    parent = _STAGE.get()
+    return f"{parent}/{name}" if parent else name
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as stage `name`, nested under the enclosing stage (threads: see propagate())."""
+    full = _path(name)
+    token = _STAGE.set(full)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _STAGE.reset(token)
+        _finish(full, start, time.perf_counter() - start)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of stage()."""
+    def wrap(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def record(name: str, start: float, seconds: float) -> None:
+    """Record an already measured span (start is a perf_counter() value)."""
+    _finish(_path(name), start, seconds)
+
+
+def _finish(full: str, start: float, seconds: float) -> None:
+    REGISTRY.observe("sensei_stage_seconds", seconds, stage=full)
+    tr = _TRACE.get()
+    if tr is not None:
+        tr.add(full, start, seconds)
+
+
+def propagate(fn: Callable, *args: Any, **kwargs: Any) -> Callable[[], Any]:
+    """Bind fn to the caller's trace/stage so work handed to an executor lands in the same trace."""
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn, *args, **kwargs)
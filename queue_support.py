@@ -0,0 +1,636 @@
+# queue_support.py
+# Engine searches as jobs on a queue: web nodes submit, engine workers (engine_worker.py, any host)
+# run them on their own EnginePool and send results back to the submitting node.
+#
+#   job     {id, board, limit, multipv, early_stop, game, deadline, lease_s, attempts, max_attempts, reply_to}
+#   result  {id, ok, infos | error, worker, queued_ms, search_ms}
+#
+# A reserved job is leased for lease_s; a worker that dies mid-search lets its lease lapse and the
+# reaper (run by every worker and web node) puts the job back at the head of the queue, up to
+# max_attempts, then answers it with an error. Jobs past their deadline are answered, not run.
+# Brokers: LocalBroker (in-process, for one box and for testing) and RedisBroker (Redis or the
+# tools/resp_store.py stand-in). Both expose depth / wait / worker gauges for autoscaling.
+from __future__ import annotations
+
+import json
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeout
+from typing import Any, Deque, Dict, List, Optional, Set
+
+import chess
+import chess.engine
+
+import engine_support
+import session_support
+import store_support
+from engine_support import EarlyStop, EngineUnavailable
+
+# slack a worker leaves between its search and the end of the job's lease (see EngineWorker.run)
+LEASE_MARGIN_S = 1.0
+
+
+# ----------------------------- wire format -----------------------------
+def board_to_wire(board: chess.Board) -> Dict[str, Any]:
+    """Root FEN + moves, so the worker's engine sees the game history (null moves as 0000)."""
+    return {"fen": board.root().fen(), "moves": [m.uci() for m in board.move_stack]}
+
+
+def board_from_wire(data: Dict[str, Any]) -> chess.Board:
+    board = chess.Board(data["fen"])
+    for uci in data.get("moves", ()):
+        board.push(chess.Move.from_uci(uci))
+    return board
+
+
+def score_to_wire(score: chess.engine.PovScore) -> Dict[str, int]:
+    white = score.white()
+    return {"mate": white.mate()} if white.is_mate() else {"cp": white.score()}
+
+
+def score_from_wire(data: Dict[str, int]) -> chess.engine.PovScore:
+    inner = chess.engine.Mate(data["mate"]) if "mate" in data else chess.engine.Cp(data["cp"])
+    return chess.engine.PovScore(inner, chess.WHITE)
+
+
+_INFO_FIELDS = ("depth", "seldepth", "multipv", "nodes", "nps", "time")
+
+
+def info_to_wire(info: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a python-chess info dict the app reads; scores go from White's point of view."""
+    out = {k: info[k] for k in _INFO_FIELDS if k in info}
+    if info.get("score") is not None:
+        out["score"] = score_to_wire(info["score"])
+    if info.get("pv"):
+        out["pv"] = [m.uci() for m in info["pv"]]
+    return out
+
+
+def info_from_wire(data: Dict[str, Any]) -> Dict[str, Any]:
+    info: Dict[str, Any] = {k: data[k] for k in _INFO_FIELDS if k in data}
+    if "score" in data:
+        info["score"] = score_from_wire(data["score"])
+    if "pv" in data:
+        info["pv"] = [chess.Move.from_uci(u) for u in data["pv"]]
+    return info
+
+
+def early_stop_to_wire(rule: Optional[EarlyStop]) -> Optional[Dict[str, Any]]:
+    if rule is None:
+        return None
+    return {"forced": rule.forced, "lines": rule.lines, "stable_depths": rule.stable_depths,
+            "margin_cp": rule.margin_cp, "min_depth": rule.min_depth}
+
+
+def failure(job: Dict[str, Any], error: str, **extra: Any) -> Dict[str, Any]:
+    return {"id": job["id"], "ok": False, "error": error, **extra}
+
+
+def retry_or_fail(job: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+    """After a lost lease: None (job["attempts"] bumped, requeue it) or the failure result to send."""
+    job["attempts"] = job.get("attempts", 0) + 1
+    if now >= job["deadline"]:
+        return failure(job, "engine worker lost; deadline passed", expired=True)
+    if job["attempts"] >= job.get("max_attempts", 2):
+        return failure(job, f"engine worker lost {job['attempts']} times")
+    return None
+
+
+def scale_signals(depth: int, in_flight: int, oldest_wait_s: float,
+                  workers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Autoscaling inputs for engine nodes: backlog, utilisation and a desired worker count."""
+    slots = sum(w.get("slots", 0) for w in workers)
+    busy = sum(w.get("busy", 0) for w in workers)
+    per_worker = slots / len(workers) if workers else 1
+    return {
+        "queued": depth,
+        "in_flight": in_flight,
+        "oldest_wait_s": round(oldest_wait_s, 3),
+        "workers": len(workers),
+        "slots": slots,
+        "busy": busy,
+        "utilization": round(busy / slots, 3) if slots else None,
+        "desired_workers": max(1, math.ceil((depth + in_flight) / max(1.0, per_worker))),
+    }
+
+
+# ----------------------------- brokers -----------------------------
+class LocalBroker:
+    """In-process broker: a FIFO of job ids, leases with monotonic expiry, one reply deque per node."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue: Deque[str] = deque()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._leases: Dict[str, float] = {}  # job id -> lease expiry (monotonic)
+        self._replies: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._workers: Dict[str, Dict[str, Any]] = {}
+        self._counts = {"submitted": 0, "completed": 0, "requeued": 0, "lost": 0}
+        self.url = "local"
+
+    def submit(self, job: Dict[str, Any]) -> None:
+        with self._cond:
+            self._jobs[job["id"]] = job
+            self._queue.append(job["id"])
+            self._counts["submitted"] += 1
+            self._cond.notify_all()
+
+    def reserve(self, worker_id: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout_s
+        with self._cond:
+            while True:
+                while self._queue:
+                    job = self._jobs.get(self._queue.popleft())
+                    if job is not None:  # else: answered by a slow first worker after its requeue
+                        self._leases[job["id"]] = time.monotonic() + job["lease_s"]
+                        return job
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+
+    def complete(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        with self._cond:
+            self._send(job, result)
+            self._leases.pop(job["id"], None)
+            self._jobs.pop(job["id"], None)
+            self._counts["completed"] += 1
+
+    def _send(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self._replies.setdefault(job["reply_to"], deque()).append(result)
+        self._cond.notify_all()
+
+    def next_results(self, reply_to: str, timeout_s: float) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout_s
+        with self._cond:
+            while not self._replies.get(reply_to):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return []
+                self._cond.wait(left)
+            out = list(self._replies[reply_to])
+            self._replies[reply_to].clear()
+            return out
+
+    def reap(self) -> int:
+        now = time.monotonic()
+        moved = 0
+        with self._cond:
+            for job_id, expires in list(self._leases.items()):
+                if expires > now:
+                    continue
+                del self._leases[job_id]
+                job = self._jobs[job_id]
+                result = retry_or_fail(job, time.time())
+                if result is None:
+                    self._queue.appendleft(job_id)
+                    self._counts["requeued"] += 1
+                else:
+                    self._send(job, result)
+                    del self._jobs[job_id]
+                    self._counts["lost"] += 1
+                moved += 1
+            if moved:
+                self._cond.notify_all()
+        return moved
+
+    def heartbeat(self, worker_id: str, info: Dict[str, Any], ttl_s: float) -> None:
+        with self._cond:
+            self._workers[worker_id] = {**info, "expires": time.monotonic() + ttl_s}
+
+    def leave(self, worker_id: str) -> None:
+        with self._cond:
+            self._workers.pop(worker_id, None)
+
+    def ping(self) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            workers = [{k: v for k, v in w.items() if k != "expires"}
+                       for w in self._workers.values() if w["expires"] > now]
+            waiting = [self._jobs[i] for i in self._queue if i in self._jobs]
+            oldest = time.time() - waiting[0]["enqueued_at"] if waiting else 0.0
+            return {"backend": "local", **dict(self._counts),
+                    "scale": scale_signals(len(waiting), len(self._leases), oldest, workers)}
+
+
+class RedisBroker:
+    """
+    The same protocol over Redis lists (reliable-queue pattern):
+      {p}queue       job ids waiting (RPUSH; retries LPUSH to the head)
+      {p}processing  job ids reserved (BLMOVE queue -> processing)
+      {p}job:<id>    the job (expires with its deadline)    {p}lease:<id>  set while a worker holds it
+      {p}reply:<node> results for one web node, expiring reply_ttl_s after the last push
+      {p}worker:<id> heartbeat, {p}workers registry
+    A reserved id without a lease on two reaper passes in a row has lost its worker.
+    Use an instance without eviction for the broker (tools/resp_store.py --no-evict, or Redis with
+    maxmemory-policy noeviction): keys here must not be LRU-dropped.
+    """
+
+    def __init__(self, store: store_support.RespStore, prefix: str = "sensei:jobs:", reply_ttl_s: float = 60.0):
+        self.store = store
+        self.prefix = prefix
+        self.reply_ttl_s = reply_ttl_s
+        self.url = store.shown_url
+        self._suspects: Set[bytes] = set()
+        self._lock = threading.Lock()
+
+    def _key(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    def _count(self, name: str) -> None:
+        try:
+            self.store.call("INCR", self._key("count", name))
+        except store_support.StoreError:
+            pass
+
+    def _reply(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        key = self._key("reply", job["reply_to"])
+        self.store.call("RPUSH", key, json.dumps(result).encode())
+        self.store.call("PEXPIRE", key, int(self.reply_ttl_s * 1000))
+
+    def submit(self, job: Dict[str, Any]) -> None:
+        ttl_s = max(1.0, job["deadline"] - time.time()) + 60.0
+        self.store.set(self._key("job", job["id"]), json.dumps(job).encode(), ttl_s)
+        self.store.call("RPUSH", self._key("queue"), job["id"])
+        self._count("submitted")
+
+    def reserve(self, worker_id: str, timeout_s: float) -> Optional[Dict[str, Any]]:
+        job_id = self.store.call("BLMOVE", self._key("queue"), self._key("processing"), "LEFT", "RIGHT",
+                                 timeout_s, block_s=timeout_s)
+        if job_id is None:
+            return None
+        raw = self.store.get(self._key("job", job_id.decode()))
+        if raw is None:  # expired long ago: nobody is waiting for it
+            self.store.call("LREM", self._key("processing"), 1, job_id)
+            return None
+        job = json.loads(raw)
+        self.store.set(self._key("lease", job["id"]), worker_id.encode(), job["lease_s"])
+        return job
+
+    def complete(self, job: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self._reply(job, result)
+        self.store.call("LREM", self._key("processing"), 1, job["id"])
+        self.store.call("DEL", self._key("job", job["id"]), self._key("lease", job["id"]))
+        self._count("completed")
+
+    def next_results(self, reply_to: str, timeout_s: float) -> List[Dict[str, Any]]:
+        key = self._key("reply", reply_to)
+        first = self.store.call("BLPOP", key, timeout_s, block_s=timeout_s)
+        if not first:
+            return []
+        out = [json.loads(first[1])]
+        while True:
+            raw = self.store.call("LPOP", key)
+            if raw is None:
+                return out
+            out.append(json.loads(raw))
+
+    def reap(self) -> int:
+        """Requeue (or fail) reserved jobs whose lease is gone; safe to run on many nodes at once."""
+        with self._lock:
+            reserved = self.store.call("LRANGE", self._key("processing"), 0, -1) or []
+            leaseless = {job_id for job_id in reserved
+                         if not self.store.call("EXISTS", self._key("lease", job_id.decode()))}
+            lost, self._suspects = leaseless & self._suspects, leaseless - self._suspects
+        moved = 0
+        for job_id in lost:
+            # LREM decides which reaper owns the retry
+            if self.store.call("LREM", self._key("processing"), 1, job_id) != 1:
+                continue
+            raw = self.store.get(self._key("job", job_id.decode()))
+            if raw is None:
+                continue
+            job = json.loads(raw)
+            result = retry_or_fail(job, time.time())
+            if result is None:
+                self.store.set(self._key("job", job["id"]), json.dumps(job).encode(),
+                               max(1.0, job["deadline"] - time.time()) + 60.0)
+                self.store.call("LPUSH", self._key("queue"), job["id"])
+                self._count("requeued")
+            else:
+                self._reply(job, result)
+                self.store.delete(self._key("job", job["id"]))
+                self._count("lost")
+            moved += 1
+        return moved
+
+    def heartbeat(self, worker_id: str, info: Dict[str, Any], ttl_s: float) -> None:
+        self.store.set(self._key("worker", worker_id), json.dumps(info).encode(), ttl_s)
+        registry = self._key("workers")
+        self.store.call("LREM", registry, 0, worker_id)
+        self.store.call("RPUSH", registry, worker_id)
+
+    def leave(self, worker_id: str) -> None:
+        self.store.call("LREM", self._key("workers"), 0, worker_id)
+        self.store.delete(self._key("worker", worker_id))
+
+    def ping(self) -> bool:
+        return self.store.ping()
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            depth = self.store.call("LLEN", self._key("queue"))
+            in_flight = self.store.call("LLEN", self._key("processing"))
+            oldest = 0.0
+            head = self.store.call("LINDEX", self._key("queue"), 0)
+            raw = self.store.get(self._key("job", head.decode())) if head else None
+            if raw is not None:
+                oldest = max(0.0, time.time() - json.loads(raw)["enqueued_at"])
+            workers = []
+            for worker_id in self.store.call("LRANGE", self._key("workers"), 0, -1) or []:
+                raw = self.store.get(self._key("worker", worker_id.decode()))
+                if raw is None:  # heartbeat expired: the worker is gone
+                    self.store.call("LREM", self._key("workers"), 0, worker_id)
+                else:
+                    workers.append(json.loads(raw))
+            counts = {name: int(self.store.get(self._key("count", name)) or 0)
+                      for name in ("submitted", "completed", "requeued", "lost")}
+        except store_support.StoreError as e:
+            return {"backend": "redis", "url": self.url, "reachable": False, "error": str(e)}
+        return {"backend": "redis", "url": self.url, "reachable": True, **counts,
+                "scale": scale_signals(depth, in_flight, oldest, workers)}
+
+
+def open_broker(url: str):
+    """LocalBroker for "local", else a RedisBroker on the redis:// or unix:// store at `url`."""
+    if url == "local":
+        return LocalBroker()
+    # reads block on BLPOP/BLMOVE with their own timeout; plain calls keep the store's default
+    return RedisBroker(store_support.open_store(url))
+
+
+# ----------------------------- web side -----------------------------
+class RemoteEngine:
+    """
+    EnginePool.analyse over a broker. Each node has its own reply queue; one dispatcher thread
+    hands results to the waiting requests, so a waiting request holds no store connection.
+    """
+
+    def __init__(self,
+                 broker,
+                 node_id: Optional[str] = None,
+                 max_attempts: int = 2,
+                 lease_grace_s: float = 5.0,
+                 default_timeout_s: float = 10.0,
+                 reap_interval_s: float = 1.0):
+        self.broker = broker
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.max_attempts = max(1, max_attempts)
+        self.lease_grace_s = lease_grace_s
+        self.default_timeout_s = default_timeout_s
+        self.reap_interval_s = reap_interval_s
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counts = {"submitted": 0, "ok": 0, "failed": 0, "timeouts": 0, "superseded": 0, "broker_errors": 0}
+        self._round_trip_s = 0.0  # EWMA, submit -> result
+        self._queued_s = 0.0  # EWMA, time jobs waited for a worker
+
+    def start(self) -> "RemoteEngine":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch, name="sensei-broker-replies", daemon=True)
+            self._thread.start()
+        return self
+
+    def ready(self) -> bool:
+        return self.broker.ping()
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            fut.cancel()
+
+    def _dispatch(self) -> None:
+        last_reap = 0.0
+        while not self._stop.is_set():
+            try:
+                for result in self.broker.next_results(self.node_id, 1.0):
+                    with self._lock:
+                        fut = self._pending.pop(result["id"], None)
+                    if fut is not None and not fut.done():  # else: late or duplicate, nobody waits
+                        fut.set_result(result)
+                if time.monotonic() - last_reap >= self.reap_interval_s:
+                    last_reap = time.monotonic()
+                    self.broker.reap()
+            except store_support.StoreError as e:
+                print(f"[broker] reply dispatcher: {e}; retrying")
+                self._stop.wait(1.0)
+
+    def analyse(self,
+                board: chess.Board,
+                limit: chess.engine.Limit,
+                multipv: Optional[int] = None,
+                timeout: Optional[float] = None,
+                ticket: Optional[session_support.Ticket] = None,
+                game: Optional[str] = None,
+                early_stop: Optional[EarlyStop] = None):
+        """
+        Submit one search and wait for its result (dict, or list[dict] with multipv).
+        timeout bounds queueing + search; it becomes the job's deadline on the engine node.
+        A ticket superseded meanwhile raises Superseded (the job itself still runs).
+        """
+        if ticket is not None:
+            ticket.check()
+        timeout = self.default_timeout_s if timeout is None else timeout
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "board": board_to_wire(board),
+            "limit": {k: v for k, v in (("time", limit.time), ("depth", limit.depth), ("nodes", limit.nodes))
+                      if v is not None},
+            "multipv": multipv,
+            "early_stop": early_stop_to_wire(early_stop),
+            "game": game,
+            "deadline": now + timeout,
+            "lease_s": (limit.time or 1.0) + self.lease_grace_s,
+            "attempts": 0,
+            "max_attempts": self.max_attempts,
+            "reply_to": self.node_id,
+            "enqueued_at": now,
+        }
+        fut: Future = Future()
+        with self._lock:
+            self._pending[job["id"]] = fut
+            self._counts["submitted"] += 1
+        try:
+            self.broker.submit(job)
+            result = self._wait(fut, job["deadline"], ticket)
+        except store_support.StoreError as e:
+            self._counts["broker_errors"] += 1
+            raise EngineUnavailable(f"job broker unreachable: {e}") from e
+        finally:
+            with self._lock:
+                self._pending.pop(job["id"], None)
+
+        took = time.time() - now
+        self._round_trip_s = took if self._round_trip_s == 0.0 else 0.8 * self._round_trip_s + 0.2 * took
+        if result.get("queued_ms") is not None:
+            queued = result["queued_ms"] / 1000.0
+            self._queued_s = queued if self._queued_s == 0.0 else 0.8 * self._queued_s + 0.2 * queued
+        if not result["ok"]:
+            self._counts["failed"] += 1
+            raise EngineUnavailable(f"remote search failed: {result['error']}")
+        self._counts["ok"] += 1
+        infos = [info_from_wire(i) for i in result["infos"]]
+        if multipv is not None:
+            return infos
+        return infos[0] if infos else {}
+
+    def _wait(self, fut: Future, deadline: float, ticket: Optional[session_support.Ticket]) -> Dict[str, Any]:
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                self._counts["timeouts"] += 1
+                raise EngineUnavailable("remote search missed its deadline")
+            try:
+                # with a ticket, wake up now and then to notice a newer position
+                return fut.result(timeout=min(left, 0.05) if ticket is not None else left)
+            except CancelledError:
+                raise EngineUnavailable("remote engine closed")
+            except FutureTimeout:
+                if ticket is not None and ticket.cancelled:
+                    self._counts["superseded"] += 1
+                    ticket.check()
+
+    def capacity(self) -> int:
+        """Engine slots across live workers (0 when none has checked in)."""
+        try:
+            return self.broker.stats().get("scale", {}).get("slots", 0)
+        except store_support.StoreError:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = len(self._pending)
+        return {
+            "node": self.node_id,
+            "waiting": waiting,
+            **dict(self._counts),
+            "round_trip_ms": round(self._round_trip_s * 1000, 1),
+            "queued_ms": round(self._queued_s * 1000, 1),
+            "queue": self.broker.stats(),
+        }
+
+
+# ----------------------------- engine side -----------------------------
+class EngineWorker:
+    """
+    Pulls jobs from the broker into a local EnginePool: one puller thread per engine, plus a
+    heartbeat thread that also reaps lost leases. Worker-side engine crashes are retried by the
+    pool itself; a failed search is answered with an error rather than requeued.
+    """
+
+    def __init__(self,
+                 broker,
+                 pool: engine_support.EnginePool,
+                 worker_id: Optional[str] = None,
+                 concurrency: Optional[int] = None,
+                 heartbeat_s: float = 1.0):
+        self.broker = broker
+        self.pool = pool
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = max(1, concurrency or pool.size)
+        self.heartbeat_s = heartbeat_s
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._counts = {"done": 0, "failed": 0, "expired": 0, "broker_errors": 0}
+
+    def start(self) -> "EngineWorker":
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._pull, name=f"sensei-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._beat, name="sensei-job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+        print(f"[broker] engine worker {self.worker_id}: {self.concurrency} slots on {self.broker.url}")
+        return self
+
+    def stop(self, timeout_s: float = 5.0) -> None:
+        """Stop taking jobs; searches in progress finish (up to timeout_s) and are answered."""
+        self._stop.set()
+        deadline = time.monotonic() + timeout_s
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        try:
+            self.broker.leave(self.worker_id)
+        except store_support.StoreError:
+            pass
+
+    def _pull(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.broker.reserve(self.worker_id, 1.0)
+            except store_support.StoreError as e:
+                self._counts["broker_errors"] += 1
+                print(f"[broker] reserve failed: {e}; retrying")
+                self._stop.wait(1.0)
+                continue
+            if job is None:
+                continue
+            with self._lock:
+                self._busy += 1
+            try:
+                result = self.run(job)
+                self.broker.complete(job, result)
+            except store_support.StoreError as e:
+                # the lease lapses and the reaper retries the job elsewhere
+                self._counts["broker_errors"] += 1
+                print(f"[broker] could not answer job {job['id']}: {e}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def run(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """One job -> its result message (never raises for search failures)."""
+        started = time.time()
+        queued_ms = round((started - job["enqueued_at"]) * 1000, 1)
+        if started >= job["deadline"]:
+            self._counts["expired"] += 1
+            return failure(job, "deadline passed before a worker was free", expired=True, queued_ms=queued_ms)
+        board = board_from_wire(job["board"])
+        params = job.get("early_stop")
+        # the lease covers the search plus lease_grace_s: waiting for an engine past that would let
+        # the reaper hand the job to a second worker while this one still runs it
+        search_s = job["limit"].get("time") or 1.0
+        checkout_s = max(0.0, min(job["deadline"] - started, job["lease_s"] - search_s - LEASE_MARGIN_S))
+        try:
+            out = self.pool.analyse(board, chess.engine.Limit(**job["limit"]), multipv=job["multipv"],
+                                    timeout=checkout_s, game=job.get("game"),
+                                    early_stop=EarlyStop(**params) if params else None)
+        except Exception as e:
+            self._counts["failed"] += 1
+            return failure(job, f"{type(e).__name__}: {e}", worker=self.worker_id, queued_ms=queued_ms)
+        self._counts["done"] += 1
+        infos = out if isinstance(out, list) else [out]
+        return {"id": job["id"], "ok": True, "infos": [info_to_wire(i) for i in infos],
+                "worker": self.worker_id, "queued_ms": queued_ms,
+                "search_ms": round((time.time() - started) * 1000, 1)}
+
+    def _beat(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.broker.heartbeat(self.worker_id, self.stats(), ttl_s=3 * self.heartbeat_s)
+                self.broker.reap()
+            except store_support.StoreError as e:
+                print(f"[broker] heartbeat failed: {e}")
+            self._stop.wait(self.heartbeat_s)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            busy = self._busy
+        return {"id": self.worker_id, "slots": self.concurrency, "busy": busy,
+                "alive_engines": self.pool.alive(), **dict(self._counts)}
@@ -2,19 +2,63 @@
 # minimal LlamaIndex setup for SenseiBoard
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 
-from llama_index.core import VectorStoreIndex, Document, StorageContext, Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+# llama-index / torch / sentence-transformers are imported lazily (see _embed_model):
+# the exact cue index below needs none of them, so cold start stays cheap.
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-# ------------- configure a small, fast embedding model -------------
-# all-MiniLM-L6-v2 is tiny and good enough for our short cards.
-Settings.embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-_INDEX = None
+_EMBED = None                           # HuggingFaceEmbedding, loaded on first use
+_EMBED_LOCK = threading.Lock()
+_EMBED_FAILED = False                   # model could not load: corpus order is the final tie-break
 _CARDS: Dict[str, Dict[str, Any]] = {}  # id -> card
+_READY = False
+
+# Persisted card embeddings (see build_store): one L2-normalised row per card,
+# memory-mapped read-only so worker processes share the pages.
+_VECTORS = None                          # np.ndarray (n_cards, dim), mmap
+_ROWS: Dict[str, int] = {}               # card id -> row in _VECTORS
+_QUERY_CACHE: "OrderedDict[str, Any]" = OrderedDict()
+_QUERY_CACHE_SIZE = 256
+_QUERY_CACHE_LOCK = threading.Lock()    # request threads share the LRU
+
+# Exact cue index (built in init_index):
+#   _CUE_BITS  recognition cue -> bit
+#   _BY_CUE    cue -> ids of cards needing it (inverted index)
+#   _MASKS     card id -> (cue bitmask, number of cues, corpus order)
+_CUE_BITS: Dict[str, int] = {}
+_BY_CUE: Dict[str, List[str]] = {}
+_MASKS: Dict[str, Tuple[int, int, int]] = {}
+_CUELESS: List[str] = []  # cards without recognition cues always match
+
+MAX_CARDS = 2
+
+# stage -> milliseconds for the last init_index (reported by /api/health)
+STARTUP_MS: Dict[str, float] = {}
+
+def _embed_model() -> Any:
+    """Import llama-index + load MiniLM once, only when something actually has to be embedded."""
+    global _EMBED
+    with _EMBED_LOCK:
+        if _EMBED is not None:
+            return _EMBED
+        t = time.perf_counter()
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        STARTUP_MS["import_llama_index"] = round((time.perf_counter() - t) * 1000, 1)
+
+        # ------------- configure a small, fast embedding model -------------
+        # all-MiniLM-L6-v2 is tiny and good enough for our short cards.
+        t = time.perf_counter()
+        _EMBED = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+        STARTUP_MS["load_embed_model"] = round((time.perf_counter() - t) * 1000, 1)
+        return _EMBED
 
 def _load_cards(corpus_dir: str = "corpus/motifs") -> List[Dict[str, Any]]:
     cards: List[Dict[str, Any]] = []
@@ -39,58 +83,246 @@ def _card_to_text(card: Dict[str, Any]) -> str:
     ]
     return "\n".join(parts)
 
-def init_index(corpus_dir: str = "corpus/motifs") -> None:
-    """Build a small vector index once."""
-    global _INDEX, _CARDS
+def _build_cue_index(cards: List[Dict[str, Any]]) -> None:
+    global _CUE_BITS, _BY_CUE, _MASKS, _CUELESS
+    cue_bits: Dict[str, int] = {}
+    by_cue: Dict[str, List[str]] = {}
+    masks: Dict[str, Tuple[int, int, int]] = {}
+    cueless: List[str] = []
+    for order, c in enumerate(cards):
+        cues = set(c.get("recognition", []))
+        mask = 0
+        for cue in sorted(cues):
+            bit = cue_bits.setdefault(cue, 1 << len(cue_bits))
+            mask |= bit
+            by_cue.setdefault(cue, []).append(c["id"])
+        masks[c["id"]] = (mask, len(cues), order)
+        if not cues:
+            cueless.append(c["id"])
+    _CUE_BITS, _BY_CUE, _MASKS, _CUELESS = cue_bits, by_cue, masks, cueless
+
+# ----------------------------- embedding store -----------------------------
+# <index_dir>/meta.json                  model, dim, corpus hash, card id -> (content hash, row)
+# <index_dir>/embeddings-<hash16>.npy    float32 (n_cards, dim), L2-normalised rows
+# The .npy name carries the corpus hash, so a rebuild never rewrites a file another process
+# has mapped; meta.json is swapped in atomically once the new matrix is on disk.
+
+def default_index_dir(corpus_dir: str = "corpus/motifs") -> Path:
+    return Path(os.getenv("SENSEI_RAG_INDEX_DIR") or Path(corpus_dir).parent / ".index")
+
+def _card_hash(card: Dict[str, Any]) -> str:
+    return hashlib.sha256(_card_to_text(card).encode("utf-8")).hexdigest()
+
+def corpus_hash(cards: List[Dict[str, Any]]) -> str:
+    """Content hash of the corpus as embedded: model + every card's id and text, in order."""
+    h = hashlib.sha256(EMBED_MODEL_NAME.encode("utf-8"))
+    for c in cards:
+        h.update(f"\n{c['id']}:{_card_hash(c)}".encode("utf-8"))
+    return h.hexdigest()
+
+def _read_store(index_dir: Path) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """(meta, memory-mapped vectors), or (None, None) if there is no usable store."""
+    import numpy as np
+    try:
+        with (index_dir / "meta.json").open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(index_dir / meta["file"], mmap_mode="r")
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"[rag] ignoring unreadable embedding store in {index_dir}: {e}")
+        return None, None
+    if meta.get("model") != EMBED_MODEL_NAME or vectors.shape[0] != len(meta.get("cards", {})):
+        return None, None
+    return meta, vectors
+
+def _embed_texts(texts: List[str]) -> Any:
+    import numpy as np
+    model = _embed_model()
+    vecs = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-12)
+
+def build_store(corpus_dir: str = "corpus/motifs",
+                index_dir: Optional[Path] = None,
+                cards: Optional[List[Dict[str, Any]]] = None,
+                force: bool = False) -> Dict[str, Any]:
+    """
+    Bring the on-disk embedding store up to date with corpus_dir.
+    Only cards whose text changed (or are new) are re-embedded; the rest are copied from the old matrix.
+    """
+    import numpy as np
+    index_dir = Path(index_dir) if index_dir is not None else default_index_dir(corpus_dir)
+    cards = _load_cards(corpus_dir) if cards is None else cards
+    digest = corpus_hash(cards)
+    meta, old = (None, None) if force else _read_store(index_dir)
+    if meta is not None and meta.get("corpus_hash") == digest:
+        return {"corpus_hash": digest, "cards": len(cards), "reused": len(cards), "embedded": 0}
+
+    old_cards = (meta or {}).get("cards", {})
+    hashes = [_card_hash(c) for c in cards]
+    stale = [i for i, (c, h) in enumerate(zip(cards, hashes))
+             if old is None or old_cards.get(c["id"], {}).get("hash") != h]
+    fresh = _embed_texts([_card_to_text(cards[i]) for i in stale]) if stale else None
+
+    dim = fresh.shape[1] if fresh is not None else old.shape[1]
+    vectors = np.empty((len(cards), dim), dtype=np.float32)
+    if fresh is not None:
+        vectors[stale] = fresh
+    stale_set = set(stale)
+    for i, c in enumerate(cards):
+        if i not in stale_set:
+            vectors[i] = old[old_cards[c["id"]]["row"]]
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    npy_name = f"embeddings-{digest[:16]}.npy"
+    tmp = index_dir / (npy_name + ".tmp")
+    with tmp.open("wb") as f:
+        np.save(f, vectors)
+    os.replace(tmp, index_dir / npy_name)
+
+    new_meta = {
+        "model": EMBED_MODEL_NAME,
+        "dim": int(dim),
+        "corpus_hash": digest,
+        "file": npy_name,
+        "cards": {c["id"]: {"hash": h, "row": i} for i, (c, h) in enumerate(zip(cards, hashes))},
+    }
+    tmp = index_dir / "meta.json.tmp"
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(new_meta, f)
+    os.replace(tmp, index_dir / "meta.json")
+
+    # old matrices stay valid for processes that still map them (unlink keeps the pages alive)
+    for p in index_dir.glob("embeddings-*.npy"):
+        if p.name != npy_name:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+    return {"corpus_hash": digest, "cards": len(cards), "reused": len(cards) - len(stale), "embedded": len(stale)}
+
+def load_query_model() -> bool:
+    """Load the embedding model now, in this thread (pre-fork servers share it with their workers)."""
+    global _EMBED_FAILED
+    try:
+        _embed_model()
+        return True
+    except Exception as e:
+        print(f"[rag] embedding model unavailable, ties keep corpus order: {e}")
+        _EMBED_FAILED = True
+        return False
+
+def ties_settled() -> bool:
+    """False while the query model is still loading: ties keep corpus order now, dense order later."""
+    return _VECTORS is None or _EMBED is not None or _EMBED_FAILED
+
+def init_index(corpus_dir: str = "corpus/motifs", dense: bool | None = None) -> None:
+    """
+    Load cards and build the exact cue index.
+    With dense=True (default $SENSEI_RAG_DENSE or on) the persisted card embeddings are memory-mapped
+    for breaking ties; only cards changed since the last build are re-embedded.
+    """
+    global _CARDS, _READY, _VECTORS, _ROWS
+    t = time.perf_counter()
     cards = _load_cards(corpus_dir)
     _CARDS = {c["id"]: c for c in cards}
-    docs = [
-        Document(
-            text=_card_to_text(c),
-            metadata={"id": c["id"], "name": c["name"], "type": c["type"], "phase": c.get("phase", "")}
-        )
-        for c in cards
-    ]
-    if not docs:
-        _INDEX = None
+    _build_cue_index(cards)
+    _READY = True
+    STARTUP_MS["cue_index"] = round((time.perf_counter() - t) * 1000, 1)
+
+    if dense is None:
+        dense = os.getenv("SENSEI_RAG_DENSE", "1") != "0"
+    if not cards or not dense:
+        _VECTORS, _ROWS = None, {}
+        return
+
+    t = time.perf_counter()
+    index_dir = default_index_dir(corpus_dir)
+    try:
+        built = build_store(corpus_dir, index_dir, cards)
+        meta, vectors = _read_store(index_dir)
+    except Exception as e:
+        print(f"[rag] embedding store unavailable, ties keep corpus order: {e}")
+        _VECTORS, _ROWS = None, {}
         return
-    _INDEX = VectorStoreIndex.from_documents(docs)
+    _VECTORS = vectors
+    _ROWS = {cid: info["row"] for cid, info in meta["cards"].items()}
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE.clear()
+    STARTUP_MS["dense_index"] = round((time.perf_counter() - t) * 1000, 1)
+    print(f"[rag] embedding store {index_dir}: {built['reused']} reused, {built['embedded']} embedded")
+
+    # queries still need the model; load it off the request path
+    if _EMBED is None:
+        threading.Thread(target=load_query_model, name="sensei-rag-warm", daemon=True).start()
 
 def has_index() -> bool:
-    return _INDEX is not None
+    return _READY
+
+def get_card(card_id: str) -> Optional[Dict[str, Any]]:
+    return _CARDS.get(card_id)
+
+def _query_vector(query: str) -> Any:
+    """Normalised query embedding (small LRU), or None while the model is still loading."""
+    with _QUERY_CACHE_LOCK:
+        vec = _QUERY_CACHE.get(query)
+        if vec is not None:
+            _QUERY_CACHE.move_to_end(query)
+            return vec
+    if _EMBED is None:
+        return None
+    import numpy as np
+    # embed outside the lock; two threads racing on the same query just store it twice
+    vec = np.asarray(_EMBED.get_query_embedding(query), dtype=np.float32)
+    vec /= max(float(np.linalg.norm(vec)), 1e-12)
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE[query] = vec
+        while len(_QUERY_CACHE) > _QUERY_CACHE_SIZE:
+            _QUERY_CACHE.popitem(last=False)
+    return vec
+
+def _dense_order(feature_tokens: List[str], card_ids: List[str]) -> List[str]:
+    """Re-rank card_ids by embedding similarity to the feature query (only called on ties)."""
+    if _VECTORS is None or len(card_ids) < 2:
+        return card_ids
+    q = _query_vector(" ".join(feature_tokens))
+    if q is None:
+        return card_ids
+    scores = {cid: float(_VECTORS[_ROWS[cid]] @ q) for cid in card_ids if cid in _ROWS}
+    return sorted(card_ids, key=lambda cid: scores.get(cid, 0.0), reverse=True)
 
 def retrieve_motifs(feature_tokens: List[str], top_k: int = 5) -> List[Dict[str, Any]]:
     """
-    Simple retrieval:
-      - Compose a short query string from feature tokens (e.g., ['opponent_queen_on_h5_or_h4','our_king_castled_short'])
-      - Dense retrieve top_k
-      - Post-filter by recognition subset (all required cues present)
+    Exact retrieval:
+      - cards whose recognition cues are all present in feature_tokens (bitmask subset test
+        over the candidates from the cue -> cards inverted index)
+      - most specific first (more cues matched), then corpus order
+      - dense re-ranking only for a tie that straddles the cut; top_k bounds that re-rank
       - Return up to 2 cards
     """
-    if _INDEX is None:
+    if not _READY:
         return []
 
-    query = " ".join(feature_tokens)
-    retriever = _INDEX.as_retriever(similarity_top_k=top_k)
-    nodes = retriever.retrieve(query)
-    # sort by score descending (higher = better)
-    nodes = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
-
-    feats = set(feature_tokens)
-    results: List[Dict[str, Any]] = []
-    for n in nodes:
-        cid = n.metadata.get("id")
-        card = _CARDS.get(cid)
-        if not card:
-            continue
-        cues = set(card.get("recognition", []))
-        # if card has cues, require they are contained in our features (simple guardrail)
-        if cues and not cues.issubset(feats):
+    feat_mask = 0
+    candidates = set(_CUELESS)
+    for f in feature_tokens:
+        bit = _CUE_BITS.get(f)
+        if bit is None:
             continue
-        results.append(card)
-        if len(results) >= 2:
-            break
-    return results
+        feat_mask |= bit
+        candidates.update(_BY_CUE[f])
+
+    matched = [cid for cid in candidates if not (_MASKS[cid][0] & ~feat_mask)]
+    matched.sort(key=lambda cid: (-_MASKS[cid][1], _MASKS[cid][2]))
+
+    if len(matched) > MAX_CARDS:
+        cut = _MASKS[matched[MAX_CARDS - 1]][1]
+        if _MASKS[matched[MAX_CARDS]][1] == cut:
+            tied = [cid for cid in matched if _MASKS[cid][1] == cut][:max(top_k, MAX_CARDS)]
+            head = [cid for cid in matched if _MASKS[cid][1] > cut]
+            matched = head + _dense_order(feature_tokens, tied)
+
+    return [_CARDS[cid] for cid in matched[:MAX_CARDS]]
 
 def format_comments_from_cards(cards: List[Dict[str, Any]], last_move_san: str | None) -> Dict[str, str]:
     """
@@ -108,3 +340,20 @@ def format_comments_from_cards(cards: List[Dict[str, Any]], last_move_san: str |
     opp += f"{c['name']}: {c['explain']}"
     you = c["reply"]
     return {"opponent_comment": opp, "your_comment": you}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the persisted motif embedding store.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="(re-)embed changed cards and write <index_dir>")
+    b.add_argument("--corpus", default="corpus/motifs")
+    b.add_argument("--index-dir", default=None, help="default: $SENSEI_RAG_INDEX_DIR or <corpus>/../.index")
+    b.add_argument("--force", action="store_true", help="re-embed every card")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    out = build_store(args.corpus, Path(args.index_dir) if args.index_dir else None, force=args.force)
+    out["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    print(json.dumps(out))
@@ -0,0 +1,188 @@
+# serve.py
+# SenseiBoard — pre-fork multi-worker server: N processes accept on one socket, one shared result store.
+#
+#   python serve.py --workers 4                               # starts a local store (tools/resp_store.py)
+#   SENSEI_STORE_URL=redis://127.0.0.1:6379 python serve.py   # or share an existing Redis
+#
+# The master loads the motif index, the embedding model and the opening book once, then forks;
+# workers inherit them copy-on-write and each starts its own engines. The default engine count,
+# threads and hash are split across workers, so the box is sized as for a single app.py.
+# ---------------------------------------------------------------
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+ROOT = Path(__file__).resolve().parent
+
+import engine_support  # noqa: E402  (no app import yet: app reads the environment at import time)
+import store_support  # noqa: E402
+
+
+def size_workers(workers: int) -> None:
+    """Per-worker engine settings that add up to the single-process defaults (explicit env wins)."""
+    cores = os.cpu_count() or 2
+    total = engine_support.default_pool_size()
+    engines = max(1, total // workers)
+    os.environ.setdefault("SENSEI_ENGINES", str(engines))
+    engines = int(os.environ["SENSEI_ENGINES"])
+    os.environ.setdefault("SENSEI_ENGINE_THREADS", str(max(1, cores // (engines * workers))))
+    os.environ.setdefault("SENSEI_ENGINE_HASH_MB",
+                          str(engine_support.default_engine_options(engines * workers)["Hash"]))
+
+
+def start_store(sock_dir: str, max_entries: int, max_mb: int) -> subprocess.Popen:
+    """The local Redis stand-in on a unix socket; returns once it answers PING."""
+    path = os.path.join(sock_dir, "store.sock")
+    proc = subprocess.Popen([sys.executable, str(ROOT / "tools" / "resp_store.py"), "--unix", path,
+                             "--max-entries", str(max_entries), "--max-mb", str(max_mb)],
+                            start_new_session=True)  # stopped by us, not by a terminal Ctrl-C
+    store = store_support.open_store(f"unix://{path}")
+    deadline = time.monotonic() + 10.0
+    while not (os.path.exists(path) and store.ping()):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("local result store did not start")
+        time.sleep(0.05)
+    store.close()
+    os.environ["SENSEI_STORE_URL"] = f"unix://{path}"
+    return proc
+
+
+def run_worker(index: int, listener: socket.socket, host: str, port: int) -> int:
+    """Child process: start engines, serve on the inherited socket until SIGTERM/SIGINT."""
+    os.environ["SENSEI_WORKER_ID"] = str(index)
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    from werkzeug.serving import make_server
+
+    import app
+    import gemini_support
+    app.init_engine()
+    gemini_support.warm()
+    server = make_server(host, port, app.app, threaded=True, fd=listener.fileno())
+    print(f"[serve] worker {index} (pid {os.getpid()}) ready, engine_ready={app.ENGINE_READY}", flush=True)
+    try:
+        server.serve_forever()
+    except SystemExit:
+        pass
+    finally:
+        app.close_engine()
+    return 0
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker SenseiBoard server")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SENSEI_WORKERS", "0")) or None,
+                        help="worker processes (default $SENSEI_WORKERS, else the default engine count)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--store-max-entries", type=int, default=int(os.getenv("SENSEI_STORE_MAX_ENTRIES", "100000")),
+                        help="local store bound (ignored with $SENSEI_STORE_URL)")
+    parser.add_argument("--store-max-mb", type=int, default=int(os.getenv("SENSEI_STORE_MAX_MB", "256")))
+    args = parser.parse_args(argv)
+    workers = max(1, args.workers or engine_support.default_pool_size())
+
+    os.chdir(ROOT)
+    size_workers(workers)
+    sock_dir = tempfile.mkdtemp(prefix="sensei-")
+    store_proc = None
+    if not os.getenv("SENSEI_STORE_URL"):
+        store_proc = start_store(sock_dir, args.store_max_entries, args.store_max_mb)
+
+    # ---- shared, read-only state: loaded once, inherited by every worker ----
+    import app
+    import rag_support
+    dense = os.getenv("SENSEI_RAG_DENSE", "1") != "0"
+    with app.startup_stage("rag_index"):
+        # load the model here (not on a warm-up thread): no thread may hold its lock at fork time
+        rag_support.init_index("corpus/motifs", dense=dense and rag_support.load_query_model())
+    with app.startup_stage("book"):
+        app.BOOK.load()
+    gc.freeze()  # keep inherited objects out of the collector, so their pages stay shared
+    listener = socket.create_server((args.host, args.port), backlog=1024)
+    print(f"[serve] {workers} workers x {os.environ['SENSEI_ENGINES']} engines on http://{args.host}:{args.port}, "
+          f"results in {store_support.open_store(os.environ['SENSEI_STORE_URL']).shown_url}; "
+          f"startup {app.startup_report()}", flush=True)
+
+    children: Dict[int, int] = {}  # pid -> worker index
+    started: Dict[int, float] = {}
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(index, listener, args.host, args.port)
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = index
+        started[index] = time.monotonic()
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    for i in range(workers):
+        spawn(i)
+
+    # ---- supervise: respawn crashed workers (and the local store) until asked to stop ----
+    while not stopping:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid and pid in children:
+            index = children.pop(pid)
+            print(f"[serve] worker {index} (pid {pid}) exited with status {status}; restarting", flush=True)
+            if time.monotonic() - started[index] < 5.0:
+                time.sleep(1.0)  # crashing at startup: don't spin
+            if not stopping:
+                spawn(index)
+        elif store_proc is not None and store_proc.poll() is not None:
+            print("[serve] local result store exited; restarting (cached results are lost)", flush=True)
+            store_proc = start_store(sock_dir, args.store_max_entries, args.store_max_mb)
+        else:
+            time.sleep(0.2)
+
+    print(f"[serve] stopping {len(children)} workers", flush=True)
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + 10.0
+    while children and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in children:
+        os.kill(pid, signal.SIGKILL)
+    if store_proc is not None:
+        store_proc.terminate()
+        store_proc.wait(timeout=5)
+    listener.close()
+    shutil.rmtree(sock_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
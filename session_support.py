@@ -0,0 +1,93 @@
+# session_support.py
+# Per-client analysis sessions: only the newest position of a session may use engine time.
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+
+class Superseded(RuntimeError):
+    """A newer position arrived for the same session; this request's work was dropped."""
+
+
+class Ticket:
+    """
+    One request's claim on its session. Searches attach here so a newer request can stop them.
+    background=True marks speculative work: it only takes idle engines and real requests preempt it.
+    position is what the request asks about (None: unknown), so a repeat of it can share the ticket.
+    """
+
+    def __init__(self, session_id: str, background: bool = False, position: Optional[Hashable] = None):
+        self.session_id = session_id
+        self.background = background
+        self.position = position
+        self._cancelled = threading.Event()
+        self._searches: List[Any] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        if self._cancelled.is_set():
+            raise Superseded(f"session {self.session_id}: superseded by a newer position")
+
+    def attach(self, analysis: Any) -> None:
+        """Track a running engine.analysis(); stopped immediately if we're already superseded."""
+        with self._lock:
+            self._searches.append(analysis)
+        if self._cancelled.is_set():
+            analysis.stop()
+
+    def detach(self, analysis: Any) -> None:
+        with self._lock:
+            if analysis in self._searches:
+                self._searches.remove(analysis)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        with self._lock:
+            searches = list(self._searches)
+        for analysis in searches:
+            try:
+                analysis.stop()
+            except Exception:
+                pass
+
+
+class SessionRegistry:
+    """
+    session_id -> newest Ticket. begin() supersedes (and stops) whatever the session had running,
+    unless it is the same position again (a re-sent request): that one shares the running ticket.
+    """
+
+    def __init__(self):
+        self._current: Dict[str, Ticket] = {}
+        self._lock = threading.Lock()
+        self.superseded = 0
+        self.joined = 0
+
+    def begin(self, session_id: str, position: Optional[Hashable] = None) -> Ticket:
+        with self._lock:
+            old = self._current.get(session_id)
+            if old is not None and position is not None and old.position == position and not old.cancelled:
+                self.joined += 1
+                return old
+            ticket = self._current[session_id] = Ticket(session_id, position=position)
+            if old is not None:
+                self.superseded += 1
+        if old is not None:
+            old.cancel()
+        return ticket
+
+    def finish(self, ticket: Optional[Ticket]) -> None:
+        if ticket is None:
+            return
+        with self._lock:
+            if self._current.get(ticket.session_id) is ticket:
+                del self._current[ticket.session_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._current), "superseded": self.superseded, "joined": self.joined}
@@ -0,0 +1,120 @@
+# speculation_support.py
+# Background pre-analysis of the positions a session is likely to ask about next.
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import session_support
+
+
+class SpecJob:
+    """One speculative position: the board after our candidate, or after it and their predicted reply.
+    reply_san is the SAN of the move that led to the board."""
+
+    __slots__ = ("session_key", "board", "reply_san", "movetime_s", "threat_time_s", "game", "preempted")
+
+    def __init__(self, session_key: str, board: Any, reply_san: Optional[str],
+                 movetime_s: float, threat_time_s: float, game: Optional[str]):
+        self.session_key = session_key
+        self.board = board
+        self.reply_san = reply_san
+        self.movetime_s = movetime_s
+        self.threat_time_s = threat_time_s
+        self.game = game
+        self.preempted = 0
+
+
+class Speculator:
+    """
+    Single low-priority worker thread.
+    - submit() replaces a session's pending jobs (the game moved on) and caps them at per_session
+    - run(job, ticket) gets a background ticket: it only uses idle engines and is preempted
+      (raises session_support.Superseded) as soon as a real request needs the engine;
+      a preempted job goes back to the front of its session's queue once
+    """
+
+    def __init__(self,
+                 run: Callable[[SpecJob, session_support.Ticket], bool],
+                 per_session: int = 3,
+                 max_sessions: int = 64):
+        self._run = run
+        self.per_session = max(0, per_session)
+        self.max_sessions = max(1, max_sessions)
+        self._pending: "OrderedDict[str, Deque[SpecJob]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.stored = 0
+        self.preempted = 0
+        self.skipped = 0
+
+    def submit(self, session_key: str, jobs: List[SpecJob]) -> None:
+        if not self.per_session or not jobs:
+            return
+        with self._cond:
+            old = self._pending.pop(session_key, None)
+            if old:
+                self.dropped += len(old)
+            self._pending[session_key] = deque(jobs[:self.per_session])
+            self.submitted += min(len(jobs), self.per_session)
+            while len(self._pending) > self.max_sessions:
+                _, stale = self._pending.popitem(last=False)
+                self.dropped += len(stale)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sensei-speculate", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _next(self) -> Tuple[SpecJob, session_support.Ticket]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # round-robin across sessions so one busy client can't starve the others
+            session_key, jobs = next(iter(self._pending.items()))
+            job = jobs.popleft()
+            del self._pending[session_key]
+            if jobs:
+                self._pending[session_key] = jobs
+            return job, session_support.Ticket(f"speculate:{session_key}", background=True)
+
+    def _requeue(self, job: SpecJob) -> None:
+        with self._cond:
+            jobs = self._pending.get(job.session_key)
+            if jobs is None:
+                self._pending[job.session_key] = deque([job])
+            else:
+                jobs.appendleft(job)
+            self._cond.notify()
+
+    def _loop(self) -> None:
+        while True:
+            job, ticket = self._next()
+            try:
+                if self._run(job, ticket):
+                    self.stored += 1
+                else:
+                    self.skipped += 1
+                self.completed += 1
+            except session_support.Superseded:
+                self.preempted += 1
+                job.preempted += 1
+                if job.preempted <= 1:
+                    self._requeue(job)
+            except Exception as e:
+                print(f"[speculate] job failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "pending": sum(len(j) for j in self._pending.values()),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "stored": self.stored,
+                "skipped": self.skipped,
+                "preempted": self.preempted,
+            }
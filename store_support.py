@@ -0,0 +1,174 @@
+# store_support.py
+# Key-value store shared by worker processes: a minimal RESP (Redis protocol) client, enough for
+# Redis itself, Redis-compatible servers and the local stand-in tools/resp_store.py.
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Union
+from urllib.parse import unquote, urlparse
+
+Reply = Union[None, int, bytes, List[Any]]
+
+
+class StoreError(OSError):
+    """The store could not be reached or answered with an error."""
+
+
+def _encode(*parts: Union[str, bytes, int, float]) -> bytes:
+    out = [b"*%d\r\n" % len(parts)]
+    for p in parts:
+        b = p if isinstance(p, bytes) else str(p).encode("utf-8")
+        out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(out)
+
+
+class _Connection:
+    """One socket plus a buffered reader; used by a single thread at a time."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.pid = os.getpid()
+
+    def call(self, *parts: Union[str, bytes, int, float], timeout_s: Optional[float] = None) -> Reply:
+        if timeout_s is None:
+            self.sock.sendall(_encode(*parts))
+            return self._read()
+        default = self.sock.gettimeout()
+        self.sock.settimeout(timeout_s)
+        try:
+            self.sock.sendall(_encode(*parts))
+            return self._read()
+        finally:
+            self.sock.settimeout(default)
+
+    def _read(self) -> Reply:
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise StoreError("connection closed by store")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise StoreError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            if len(data) != n + 2:
+                raise StoreError("connection closed by store")
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise StoreError(f"unexpected reply: {line[:32]!r}")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespStore:
+    """
+    redis://[:password@]host[:port][/db] or unix:///path/to.sock (?db=N).
+    One connection per thread (and process: a forked worker never reuses its parent's socket),
+    reconnected after any error; calls raise StoreError.
+    """
+
+    def __init__(self, url: str, timeout_s: float = 0.5):
+        self.url = url
+        self.timeout_s = timeout_s
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "unix"):
+            raise ValueError(f"unsupported store URL (redis:// or unix://): {url}")
+        self._unix = unquote(parsed.path) if parsed.scheme == "unix" else None
+        self._addr = (parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        self._password = unquote(parsed.password) if parsed.password else None
+        self.shown_url = url.replace(f":{parsed.password}@", ":***@") if parsed.password else url
+        db = parsed.path.lstrip("/") if parsed.scheme == "redis" else ""
+        query = dict(kv.split("=", 1) for kv in parsed.query.split("&") if "=" in kv)
+        self._db = int(db or query.get("db", 0))
+        self._local = threading.local()
+        self.connects = 0
+
+    def _connect(self) -> _Connection:
+        try:
+            if self._unix:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout_s)
+                sock.connect(self._unix)
+            else:
+                sock = socket.create_connection(self._addr, timeout=self.timeout_s)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            raise StoreError(f"cannot connect to {self.shown_url}: {e}") from e
+        conn = _Connection(sock)
+        if self._password:
+            conn.call("AUTH", self._password)
+        if self._db:
+            conn.call("SELECT", self._db)
+        return conn
+
+    def call(self, *parts: Union[str, bytes, int, float], block_s: float = 0.0) -> Reply:
+        """One command; block_s extends the read timeout for blocking commands (BLPOP, BLMOVE)."""
+        conn: Optional[_Connection] = getattr(self._local, "conn", None)
+        if conn is not None and conn.pid != os.getpid():
+            conn = None
+        try:
+            if conn is None:
+                conn = self._local.conn = self._connect()
+                self.connects += 1
+            return conn.call(*parts, timeout_s=self.timeout_s + block_s if block_s > 0 else None)
+        except (OSError, ValueError) as e:
+            # the stream may be out of sync now: never reuse this connection
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            if isinstance(e, StoreError):
+                raise
+            raise StoreError(str(e)) from e
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.call("GET", key)
+
+    def set(self, key: str, value: bytes, ttl_s: float = 0.0) -> None:
+        if ttl_s > 0:
+            self.call("SET", key, value, "PX", max(1, int(ttl_s * 1000)))
+        else:
+            self.call("SET", key, value)
+
+    def delete(self, key: str) -> None:
+        self.call("DEL", key)
+
+    def ping(self) -> bool:
+        try:
+            return self.call("PING") == b"PONG"
+        except StoreError:
+            return False
+
+    def dbsize(self) -> Optional[int]:
+        try:
+            return self.call("DBSIZE")
+        except StoreError:
+            return None
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"url": self.shown_url, "reachable": self.ping(), "keys": self.dbsize(), "connects": self.connects}
+
+
+def open_store(url: str) -> RespStore:
+    return RespStore(url)
@@ -0,0 +1,52 @@
+# stream_support.py
+# Server-sent events helpers + a registry of cancellable in-flight searches.
+from __future__ import annotations
+
+import json
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One text/event-stream frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def new_stream_id() -> str:
+    return uuid.uuid4().hex
+
+
+class StreamRegistry:
+    """stream_id -> running engine analysis, so a client can stop its own search."""
+
+    def __init__(self):
+        self._active: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.cancelled = 0
+
+    def register(self, stream_id: str, analysis: Any) -> None:
+        with self._lock:
+            self._active[stream_id] = analysis
+
+    def unregister(self, stream_id: str) -> bool:
+        """False if the stream was already cancelled."""
+        with self._lock:
+            return self._active.pop(stream_id, None) is not None
+
+    def cancel(self, stream_id: str) -> bool:
+        """Stop the search behind stream_id; False if it already finished (or never existed)."""
+        with self._lock:
+            analysis: Optional[Any] = self._active.pop(stream_id, None)
+            if analysis is None:
+                return False
+            self.cancelled += 1
+        try:
+            analysis.stop()
+        except Exception:
+            pass
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"active": len(self._active), "cancelled": self.cancelled}
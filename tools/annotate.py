@@ -0,0 +1,107 @@
+# tools/annotate.py
+# Annotate finished games from the command line: threats, candidates and motifs for every ply, as JSONL.
+# Each worker process owns one Stockfish (plus its own cue index), so throughput scales with cores.
+#
+#   python tools/annotate.py games.pgn -o games.jsonl --workers 8 --movetime-ms 200
+#   python tools/annotate.py --fens positions.txt
+#   cat games.pgn | python tools/annotate.py -
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, TextIO, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import chess  # noqa: E402
+
+import batch_support  # noqa: E402
+import engine_support  # noqa: E402
+
+_APP: Any = None
+_LIMITS: Tuple[float, float] = (0.2, 0.1)
+
+
+def _init_worker(movetime_s: float, threat_time_s: float, hash_mb: int) -> None:
+    """One engine per process; app is imported here so the parent never starts an engine."""
+    global _APP, _LIMITS
+    os.chdir(ROOT)
+    os.environ["SENSEI_ENGINES"] = "1"
+    os.environ.setdefault("SENSEI_ENGINE_THREADS", "1")
+    os.environ.setdefault("SENSEI_ENGINE_HASH_MB", str(hash_mb))
+    os.environ["SENSEI_SPECULATE_PER_MOVE"] = "0"
+    # a crashed worker engine is simply respawned: a standby per process would double the engines
+    os.environ.setdefault("SENSEI_ENGINE_STANDBY", "0")
+    # no embedding model per worker unless asked for: ties keep corpus order
+    os.environ.setdefault("SENSEI_RAG_DENSE", "0")
+    import app
+    app.init_engine()
+    app.rag_support.init_index("corpus/motifs")
+    app.BOOK.load()
+    _APP = app
+    _LIMITS = (movetime_s, threat_time_s)
+
+
+def _engine_ready() -> bool:
+    return bool(_APP is not None and _APP.ENGINE_READY)
+
+
+def _annotate(item: batch_support.BatchItem) -> Dict[str, Any]:
+    try:
+        payload = _APP.annotate_position(chess.Board(item.fen), item.last_move_san, *_LIMITS)
+    except Exception as e:
+        payload = {"error": str(e)}
+    return batch_support.annotation_record(item, payload)
+
+
+def _items(args: argparse.Namespace, handle: TextIO) -> Iterator[batch_support.BatchItem]:
+    if args.fens:
+        return batch_support.positions_from_fens(handle, max_positions=args.max_positions)
+    return batch_support.positions_from_pgn(handle, include_start=args.include_start,
+                                            max_positions=args.max_positions)
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Annotate PGN games (or a FEN list) as JSONL.")
+    parser.add_argument("input", help="PGN file, FEN list with --fens, or - for stdin")
+    parser.add_argument("--fens", action="store_true", help="input is one FEN per line")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output (default stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="engine processes")
+    parser.add_argument("--movetime-ms", type=float, default=200)
+    parser.add_argument("--threat-ms", type=float, default=100)
+    parser.add_argument("--include-start", action="store_true", help="also annotate each game's start position")
+    parser.add_argument("--max-positions", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    hash_mb = engine_support.default_engine_options(workers)["Hash"]
+    limits = (max(0.02, args.movetime_ms / 1000.0), max(0.02, args.threat_ms / 1000.0))
+
+    started = time.monotonic()
+    count = errors = 0
+    with ExitStack() as stack:
+        pool = stack.enter_context(mp.Pool(workers, initializer=_init_worker, initargs=(*limits, hash_mb)))
+        if not pool.apply(_engine_ready):
+            print(f"[annotate] engine not available at {engine_support.find_engine_path()}", file=sys.stderr)
+            return 2
+        handle = sys.stdin if args.input == "-" else stack.enter_context(open(args.input, "r", encoding="utf-8"))
+        out = sys.stdout if args.output == "-" else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+        for record in pool.imap(_annotate, _items(args, handle), chunksize=1):
+            count += 1
+            errors += "error" in record
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+    summary = batch_support.summary(count, errors, time.monotonic() - started)
+    print(f"[annotate] {json.dumps({**summary, 'workers': workers})}", file=sys.stderr)
+    return 1 if errors and errors == count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# tools/bench.py
+# Reproducible latency / throughput benchmarks for SenseiBoard.
+#
+#   python tools/bench.py                                  # fake engine, default suite
+#   python tools/bench.py --concurrency 1,4,8 --requests 200
+#   python tools/bench.py --save-baseline tools/bench_baseline.json
+#   python tools/bench.py --baseline tools/bench_baseline.json   # exit 1 on regression
+#   python tools/bench.py --engine stockfish --url http://127.0.0.1:8000
+#
+# The engine is tools/fake_uci.py unless --engine is given: same scores every run, fixed search
+# latency (--engine-latency-ms), no Stockfish or network needed. Positions: tools/bench_positions.json.
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+TOOLS = Path(__file__).resolve().parent
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(q / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_s: List[float], wall_s: float, errors: int = 0) -> Dict[str, Any]:
+    ms = sorted(x * 1000.0 for x in latencies_s)
+    return {
+        "n": len(ms),
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "rps": round(len(ms) / wall_s, 2) if wall_s > 0 else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], args: List[Any], rounds: int) -> Dict[str, Any]:
+    """Sequential timing of fn over args, `rounds` times."""
+    lat: List[float] = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for a in args:
+            t = time.perf_counter()
+            fn(a)
+            lat.append(time.perf_counter() - t)
+    return summarize(lat, time.perf_counter() - started)
+
+
+def drive(send: Callable[[Dict[str, Any]], bool], bodies: List[Dict[str, Any]],
+          requests: int, concurrency: int) -> Dict[str, Any]:
+    """`requests` calls spread over `concurrency` threads; each thread walks the corpus from its own offset."""
+    per_thread = max(1, requests // concurrency)
+
+    def worker(offset: int):
+        lat, errors = [], 0
+        for i in range(per_thread):
+            body = bodies[(offset * 7 + i) % len(bodies)]
+            t = time.perf_counter()
+            ok = send(body)
+            lat.append(time.perf_counter() - t)
+            errors += not ok
+        return lat, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+    lat = [x for r, _ in results for x in r]
+    return {**summarize(lat, wall, sum(e for _, e in results)), "concurrency": concurrency}
+
+
+# ----------------------------- suites -----------------------------
+def bench_core(app: Any, positions: List[Dict[str, Any]], rounds: int, movetime_s: float,
+               threat_time_s: float) -> Dict[str, Any]:
+    import chess
+    boards = [(chess.Board(p["fen"]), p.get("last_move_san")) for p in positions]
+    feats = [app.feature_support.build_feature_tokens(b, lm) for b, lm in boards]
+    results = {
+        "build_feature_tokens": time_calls(lambda bl: app.feature_support.build_feature_tokens(*bl),
+                                           boards, rounds * 20),
+        "retrieve_motifs": time_calls(lambda f: app.rag_support.retrieve_motifs(f, top_k=5), feats, rounds * 20),
+        "quick_threat_scan": time_calls(lambda bl: app.quick_threat_scan(bl[0], time_s=threat_time_s),
+                                        boards, rounds),
+        "multipv_top": time_calls(lambda bl: app.multipv_top(bl[0], movetime_s=movetime_s), boards, rounds),
+    }
+    return results
+
+
+def bench_http(send: Callable[[Dict[str, Any]], bool], positions: List[Dict[str, Any]], requests: int,
+               concurrency: List[int], movetime_ms: float, threat_ms: float) -> Dict[str, Any]:
+    bodies = [{"fen": p["fen"], "last_move_san": p.get("last_move_san"),
+               "movetime_ms": movetime_ms, "threat_time_ms": threat_ms} for p in positions]
+    return {f"analyze_c{c}": drive(send, bodies, requests, c) for c in concurrency}
+
+
+def test_client_sender(app: Any) -> Callable[[Dict[str, Any]], bool]:
+    client = app.app.test_client()
+
+    def send(body: Dict[str, Any]) -> bool:
+        r = client.post("/api/analyze", json=body)
+        return r.status_code == 200 and bool(r.get_json().get("candidates"))
+    return send
+
+
+def url_sender(url: str) -> Callable[[Dict[str, Any]], bool]:
+    endpoint = url.rstrip("/") + "/api/analyze"
+
+    def send(body: Dict[str, Any]) -> bool:
+        req = urllib.request.Request(endpoint, data=json.dumps(body).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as r:
+                return r.status == 200
+        except Exception:
+            return False
+    return send
+
+
+# ----------------------------- baseline -----------------------------
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions: latency percentiles up or rps down by more than tolerance (fraction)."""
+    problems = []
+    for suite, cases in baseline.get("results", {}).items():
+        for name, base in cases.items():
+            cur = current["results"].get(suite, {}).get(name)
+            if cur is None:
+                continue
+            for metric, min_n in (("p50_ms", 1), ("p95_ms", 20), ("p99_ms", 100)):
+                if min(cur.get("n", 0), base.get("n", 0)) < min_n:
+                    continue  # too few samples for a stable tail
+                b, c = base.get(metric), cur.get(metric)
+                # sub-0.05 ms timings are noise on any box
+                if b and c and c > max(b * (1 + tolerance), b + 0.05):
+                    problems.append(f"{suite}.{name}.{metric}: {c} ms vs baseline {b} ms")
+            b, c = base.get("rps"), cur.get("rps")
+            if b and c is not None and c < b * (1 - tolerance):
+                problems.append(f"{suite}.{name}.rps: {c} vs baseline {b}")
+            if cur.get("errors", 0) > base.get("errors", 0):
+                problems.append(f"{suite}.{name}.errors: {cur['errors']} vs baseline {base.get('errors', 0)}")
+    return problems
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'case':34} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9} {'err':>4}")
+    for suite, cases in results.items():
+        for name, r in cases.items():
+            print(f"{suite + '.' + name:34} {r['n']:>6} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+                  f"{r['p99_ms']:>9.2f} {r['rps']:>9.1f} {r['errors']:>4}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="SenseiBoard benchmarks")
+    parser.add_argument("--positions", default=str(TOOLS / "bench_positions.json"))
+    parser.add_argument("--suite", default="core,http", help="comma list: core, http")
+    parser.add_argument("--engine", default=None, help="engine binary (default: tools/fake_uci.py)")
+    parser.add_argument("--engine-latency-ms", type=float, default=50.0,
+                        help="fake engine: fixed time per search")
+    parser.add_argument("--engines", type=int, default=2, help="engine pool size ($SENSEI_ENGINES)")
+    parser.add_argument("--movetime-ms", type=float, default=100)
+    parser.add_argument("--threat-ms", type=float, default=50)
+    parser.add_argument("--rounds", type=int, default=2, help="core suite: passes over the corpus")
+    parser.add_argument("--requests", type=int, default=120, help="http suite: requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4", help="http suite: comma list of client threads")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache on (default: off)")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of in-process")
+    parser.add_argument("--json", default=None, help="write results here")
+    parser.add_argument("--baseline", default=None, help="compare against this results file")
+    parser.add_argument("--save-baseline", default=None, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression (fraction)")
+    args = parser.parse_args(argv)
+
+    # environment first: app reads it at import time
+    engine = args.engine or str(TOOLS / "fake_uci.py")
+    os.environ["STOCKFISH_PATH"] = engine
+    os.environ["FAKE_UCI_LATENCY_MS"] = str(args.engine_latency_ms)
+    os.environ["SENSEI_ENGINES"] = str(args.engines)
+    os.environ["SENSEI_SPECULATE_PER_MOVE"] = "0"   # background work would skew foreground latency
+    os.environ.setdefault("SENSEI_RAG_DENSE", "0")  # no embedding model: cue index only
+    os.environ.setdefault("SENSEI_BOOK", "0")       # opening positions would skip the engine
+    os.environ.pop("GOOGLE_API_KEY", None)
+    if not args.cache:
+        os.environ["SENSEI_CACHE_SIZE"] = "0"
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+
+    with open(args.positions, "r", encoding="utf-8") as f:
+        positions = json.load(f)
+    suites = {s.strip() for s in args.suite.split(",") if s.strip()}
+    concurrency = [max(1, int(c)) for c in args.concurrency.split(",") if c.strip()]
+
+    # a pure-HTTP run against --url needs no local engines (they would compete with the server for CPU)
+    app = None
+    if "core" in suites or not args.url:
+        import app
+        app.init_engine()
+        app.rag_support.init_index("corpus/motifs")
+        if not app.ENGINE_READY:
+            print(f"[bench] engine not available at {engine}", file=sys.stderr)
+            return 2
+
+    send = url_sender(args.url) if args.url else test_client_sender(app)
+    send({"fen": positions[0]["fen"], "movetime_ms": args.movetime_ms})  # warm-up
+
+    results: Dict[str, Dict[str, Any]] = {}
+    if "core" in suites:
+        results["core"] = bench_core(app, positions, args.rounds, args.movetime_ms / 1000.0, args.threat_ms / 1000.0)
+    if "http" in suites:
+        results["http"] = bench_http(send, positions, args.requests, concurrency, args.movetime_ms, args.threat_ms)
+
+    report = {
+        "meta": {
+            "engine": "fake_uci" if args.engine is None else args.engine,
+            "engine_latency_ms": args.engine_latency_ms if args.engine is None else None,
+            "engines": args.engines,
+            "movetime_ms": args.movetime_ms,
+            "threat_ms": args.threat_ms,
+            "cache": args.cache,
+            "adaptive": os.getenv("SENSEI_ADAPTIVE", "1") != "0",
+            "target": args.url or "in-process",
+            "positions": len(positions),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    print_table(results)
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"[bench] wrote {path}")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        if problems:
+            print(f"[bench] {len(problems)} regression(s) vs {args.baseline}:")
+            for p in problems:
+                print(f"  - {p}")
+            status = 1
+        else:
+            print(f"[bench] no regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+    sys.stdout.flush()
+    # python-chess engine threads can keep the interpreter alive at exit
+    if app is not None:
+        app.close_engine()
+    os._exit(status)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# tools/build_book.py
+# Build the precomputed position store that lets /api/analyze answer known positions without Stockfish.
+#
+#   python tools/build_book.py                              # opening tree: 3 best moves per side, 6 plies
+#   python tools/build_book.py --plies 8 --branch 2 --movetime-ms 1000
+#   python tools/build_book.py --pgn master_games.pgn --plies 12 --merge
+#
+# Entries answer requests up to the --movetime-ms / --threat-ms they were searched with, so build
+# with at least the times clients ask for (the API caps them at 1000 / 600 ms).
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import chess  # noqa: E402
+
+import batch_support  # noqa: E402
+import book_support  # noqa: E402
+
+
+def pgn_boards(path: str, plies: int) -> List[chess.Board]:
+    """The first `plies` positions of every game in a PGN file."""
+    boards: List[chess.Board] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for item in batch_support.positions_from_pgn(f, include_start=True):
+            if item.ply <= plies:
+                boards.append(chess.Board(item.fen))
+    return boards
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute analyses for the opening fast path.")
+    parser.add_argument("-o", "--output", default=None, help="store path (default $SENSEI_BOOK_PATH or "
+                                                             f"{book_support.DEFAULT_PATH})")
+    parser.add_argument("--plies", type=int, default=6, help="deepest ply to store")
+    parser.add_argument("--branch", type=int, default=3, help="tree: engine candidates expanded per position")
+    parser.add_argument("--pgn", default=None, help="also store the first --plies positions of these games")
+    parser.add_argument("--no-tree", action="store_true", help="only the --pgn positions")
+    parser.add_argument("--movetime-ms", type=float, default=1000)
+    parser.add_argument("--threat-ms", type=float, default=600)
+    parser.add_argument("--merge", action="store_true", help="keep existing entries that were not rebuilt")
+    args = parser.parse_args(argv)
+
+    # the build itself must search, not answer from the book it is replacing
+    os.environ["SENSEI_BOOK"] = "0"
+    os.environ["SENSEI_SPECULATE_PER_MOVE"] = "0"
+    os.environ.setdefault("SENSEI_RAG_DENSE", "0")
+    os.chdir(ROOT)
+
+    import app
+    app.init_engine()
+    if not app.ENGINE_READY:
+        print("[book] engine not available", file=sys.stderr)
+        return 2
+
+    out = Path(args.output or os.getenv("SENSEI_BOOK_PATH", book_support.DEFAULT_PATH))
+    movetime_s, threat_time_s = args.movetime_ms / 1000.0, args.threat_ms / 1000.0
+    entries: Dict[str, Dict] = {}
+    if args.merge and out.exists():
+        entries = {e["key"]: e for e in book_support.read_entries(out)}
+    built: set = set()
+    started = time.monotonic()
+
+    def analyse(item: batch_support.BatchItem) -> Dict:
+        board = chess.Board(item.fen)
+        plan = app.plan_analysis(board, movetime_s=movetime_s, threat_time_s=threat_time_s, sequential=True)
+        if not plan["top"] or plan["threats"]["engine_down"]:
+            return {"error": "no engine answer"}
+        return book_support.entry_from_plan(board, plan, movetime_s, threat_time_s)
+
+    def run(boards: List[chess.Board]) -> List[Dict]:
+        """Analyse the not-yet-built positions of one level on every pooled engine; entries of the level."""
+        keys: Dict[str, None] = {}  # insertion-ordered set
+        todo = []
+        for b in boards:
+            key = book_support.book_key(b)
+            if key not in keys:
+                keys[key] = None
+                if key not in built:
+                    todo.append(b)
+        items = (batch_support.BatchItem(i, 0, b.ply(), b.fen(), None) for i, b in enumerate(todo))
+        for _, entry in batch_support.run_ordered(items, analyse, workers=app.POOL.size):
+            if "error" not in entry:
+                entries[entry["key"]] = entry
+                built.add(entry["key"])
+        return [entries[k] for k in keys if k in built]
+
+    if args.pgn:
+        run(pgn_boards(args.pgn, args.plies))
+    if not args.no_tree:
+        level = [chess.Board()]
+        for ply in range(args.plies + 1):
+            level_entries = run(level)
+            print(f"[book] ply {ply}: {len(level_entries)} positions")
+            if ply == args.plies:
+                break
+            level = []
+            for entry in level_entries:
+                board = chess.Board(entry["fen"])
+                for san, _ in entry["top"][:args.branch]:
+                    child = board.copy(stack=False)
+                    child.push_san(san)
+                    level.append(child)
+
+    n = book_support.write_entries(out, entries.values())
+    print(f"[book] wrote {n} positions ({len(built)} analysed) to {out} "
+          f"in {time.monotonic() - started:.1f}s")
+    sys.stdout.flush()
+    # python-chess engine threads can keep the interpreter alive at exit
+    app.close_engine()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
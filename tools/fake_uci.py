@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# tools/fake_uci.py
+# Deterministic stand-in for Stockfish, for benchmarks and tests on boxes without an engine.
+#
+#   STOCKFISH_PATH=tools/fake_uci.py python app.py
+#
+# Same position + same options => same infos, scores and bestmove, every run. Knobs (env):
+#   FAKE_UCI_LATENCY_MS  every search takes exactly this long (default: honour movetime / depth)
+#   FAKE_UCI_DEPTH_MS    time per reported depth (default 10)
+#   FAKE_UCI_MAX_DEPTH   deepest depth ever reported (default 30)
+#   FAKE_UCI_STARTUP_MS  delay before answering "uci" (spawn cost of a real engine)
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+import chess
+
+LATENCY_MS = float(os.getenv("FAKE_UCI_LATENCY_MS", "0")) or None
+DEPTH_MS = max(1.0, float(os.getenv("FAKE_UCI_DEPTH_MS", "10")))
+MAX_DEPTH = int(os.getenv("FAKE_UCI_MAX_DEPTH", "30"))
+STARTUP_MS = float(os.getenv("FAKE_UCI_STARTUP_MS", "0"))
+
+_out_lock = threading.Lock()
+
+
+def say(line: str) -> None:
+    with _out_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def move_score(board: chess.Board, move: chess.Move) -> Tuple[Optional[int], int]:
+    """(mate_in, cp) for the side to move after `move`; stable across runs (crc32, not hash())."""
+    board.push(move)
+    try:
+        if board.is_checkmate():
+            return 1, 0
+        if board.is_stalemate() or board.is_insufficient_material():
+            return None, 0
+        seed = zlib.crc32(f"{board.board_fen()} {move.uci()}".encode("ascii"))
+        cp = (seed % 241) - 120                      # -120..120
+        if board.is_check():
+            cp += 30
+        return None, cp
+    finally:
+        board.pop()
+
+
+def ranked_lines(board: chess.Board, multipv: int) -> List[Tuple[chess.Move, Optional[int], int, List[chess.Move]]]:
+    """Top `multipv` moves by fake score, each with a two-ply PV (move + best-looking reply)."""
+    scored = []
+    for move in board.legal_moves:
+        mate, cp = move_score(board, move)
+        scored.append((0 if mate else 1, -cp, move.uci(), move, mate, cp))
+    scored.sort(key=lambda t: t[:3])
+    lines = []
+    for *_, move, mate, cp in scored[:max(1, multipv)]:
+        pv = [move]
+        board.push(move)
+        replies = sorted(board.legal_moves, key=lambda m: m.uci())
+        if replies:
+            pv.append(replies[zlib.crc32(board.board_fen().encode("ascii")) % len(replies)])
+        board.pop()
+        lines.append((move, mate, cp, pv))
+    return lines
+
+
+class Searcher:
+    def __init__(self):
+        self.stop = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self, board: chess.Board, budget_ms: Optional[float], depth_limit: Optional[int], multipv: int) -> None:
+        self.join()
+        self.stop.clear()
+        self.thread = threading.Thread(target=self._run, args=(board, budget_ms, depth_limit, multipv), daemon=True)
+        self.thread.start()
+
+    def join(self) -> None:
+        if self.thread is not None:
+            self.stop.set()
+            self.thread.join()
+            self.thread = None
+
+    def _run(self, board: chess.Board, budget_ms: Optional[float], depth_limit: Optional[int], multipv: int) -> None:
+        started = time.monotonic()
+        lines = ranked_lines(board, multipv)
+        if not lines:
+            score = "mate 0" if board.is_check() else "cp 0"
+            say(f"info depth 0 score {score}")
+            say("bestmove (none)")
+            return
+        max_depth = min(MAX_DEPTH, depth_limit or MAX_DEPTH)
+        depth = 0
+        while depth < max_depth:
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if budget_ms is not None and elapsed_ms + DEPTH_MS > budget_ms:
+                break
+            if self.stop.wait(DEPTH_MS / 1000.0):
+                break
+            depth += 1
+            elapsed_ms = int((time.monotonic() - started) * 1000)
+            for i, (move, mate, cp, pv) in enumerate(lines, start=1):
+                score = f"mate {mate}" if mate else f"cp {cp}"
+                say(f"info depth {depth} seldepth {depth + 2} multipv {i} score {score} "
+                    f"nodes {depth * 1000 * i} nps 100000 time {elapsed_ms} pv {' '.join(m.uci() for m in pv)}")
+        if budget_ms is not None and not self.stop.is_set():
+            # exact latency: sit out whatever is left of the budget
+            self.stop.wait(max(0.0, budget_ms / 1000.0 - (time.monotonic() - started)))
+        if depth == 0:  # budget shorter than one depth: still report something to play
+            for i, (move, mate, cp, pv) in enumerate(lines, start=1):
+                score = f"mate {mate}" if mate else f"cp {cp}"
+                say(f"info depth 1 multipv {i} score {score} pv {' '.join(m.uci() for m in pv)}")
+        say(f"bestmove {lines[0][0].uci()}")
+
+
+def main() -> None:
+    board = chess.Board()
+    multipv = 1
+    searcher = Searcher()
+    for raw in sys.stdin:
+        parts = raw.split()
+        if not parts:
+            continue
+        cmd = parts[0]
+        if cmd == "uci":
+            if STARTUP_MS:
+                time.sleep(STARTUP_MS / 1000.0)
+            say("id name FakeUCI")
+            say("id author SenseiBoard")
+            say("option name Threads type spin default 1 min 1 max 512")
+            say("option name Hash type spin default 16 min 1 max 33554432")
+            say("option name MultiPV type spin default 1 min 1 max 500")
+            say("option name Ponder type check default false")
+            say("uciok")
+        elif cmd == "isready":
+            say("readyok")
+        elif cmd == "setoption" and "name" in parts and "value" in parts:
+            name = " ".join(parts[parts.index("name") + 1:parts.index("value")])
+            if name.lower() == "multipv":
+                multipv = max(1, int(parts[-1]))
+        elif cmd == "ucinewgame":
+            board = chess.Board()
+        elif cmd == "position":
+            if len(parts) > 1 and parts[1] == "startpos":
+                board, rest = chess.Board(), parts[2:]
+            else:
+                end = parts.index("moves") if "moves" in parts else len(parts)
+                board, rest = chess.Board(" ".join(parts[2:end])), parts[end:]
+            if rest and rest[0] == "moves":
+                for uci in rest[1:]:
+                    board.push_uci(uci)
+        elif cmd == "go":
+            budget: Optional[float] = None
+            depth_limit: Optional[int] = None
+            if "movetime" in parts:
+                budget = float(parts[parts.index("movetime") + 1])
+            if "depth" in parts:
+                depth_limit = int(parts[parts.index("depth") + 1])
+            if "infinite" in parts:
+                budget = None
+            elif LATENCY_MS is not None:
+                budget = LATENCY_MS
+            elif budget is None and depth_limit is None:
+                budget = 100.0
+            searcher.start(board.copy(), budget, depth_limit, multipv)
+        elif cmd == "stop":
+            searcher.join()
+        elif cmd == "quit":
+            searcher.join()
+            break
+
+
+if __name__ == "__main__":
+    main()
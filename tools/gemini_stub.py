@@ -0,0 +1,100 @@
+# tools/gemini_stub.py
+# Local stand-in for the Gemini REST API (generateContent), for tests and offline development.
+#
+#   python tools/gemini_stub.py --port 8089 [--delay 0.5] [--fail-rate 0]
+#   GOOGLE_API_KEY=stub GEMINI_BASE_URL=http://127.0.0.1:8089 python app.py
+#
+# Answers are built from the grounded context in the prompt, so they are deterministic.
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+STATS = {"requests": 0, "failed": 0}
+_LOCK = threading.Lock()
+
+
+def _context_from_request(body: Dict[str, Any]) -> Dict[str, Any]:
+    texts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+    for t in texts:
+        if "Context JSON:" in t:
+            try:
+                return json.loads(t.split("Context JSON:", 1)[1].strip())
+            except ValueError:
+                pass
+    return {}
+
+
+def _answer(ctx: Dict[str, Any]) -> Dict[str, str]:
+    motif = (ctx.get("motif") or {}).get("name")
+    last = ctx.get("last_move_san")
+    best = ctx.get("engine_best_san") or "the engine move"
+    opp = f"{last} " if last else "The last move "
+    opp += f"sets up {motif}." if motif else "keeps the tension."
+    return {"opponent_comment": opp, "your_comment": f"Play {best}; it keeps the balance."}
+
+
+def make_handler(delay_s: float, fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):  # keep test output quiet
+            pass
+
+        def _send(self, code: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.startswith("/stats"):
+                with _LOCK:
+                    return self._send(200, dict(STATS))
+            self._send(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with _LOCK:
+                STATS["requests"] += 1
+            if not self.path.split("?")[0].endswith(":generateContent"):
+                return self._send(404, {"error": {"code": 404, "message": "not found"}})
+            if delay_s:
+                time.sleep(delay_s)
+            if fail_rate and random.random() < fail_rate:
+                with _LOCK:
+                    STATS["failed"] += 1
+                return self._send(500, {"error": {"code": 500, "message": "stub failure", "status": "INTERNAL"}})
+            text = json.dumps(_answer(_context_from_request(body)))
+            self._send(200, {
+                "candidates": [{
+                    "content": {"parts": [{"text": text}], "role": "model"},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }],
+                "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+            })
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gemini generateContent stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before each answer")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay, args.fail_rate))
+    print(f"[gemini-stub] listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# tools/mine_features.py
+# Cue statistics over game databases, for tuning motif cards and mining new ones: how often each
+# feature token fires, which tokens fire together, and the most common token sets.
+# Positions stream from the PGN in batches; cues are computed with feature_batch_support (NumPy).
+#
+#   python tools/mine_features.py games.pgn -o cues.json
+#   python tools/mine_features.py lichess_2024-01.pgn.bz2 --max-positions 5000000
+#   python tools/mine_features.py games.pgn --verify        # also run the scalar helpers, exit 1 on any difference
+#   cat games.pgn | python tools/mine_features.py - --positions tokens.jsonl
+from __future__ import annotations
+
+import argparse
+import bz2
+import gzip
+import io
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+import feature_batch_support as fb  # noqa: E402
+
+
+def open_pgn(path: str) -> TextIO:
+    """A text stream over a PGN file ('-' is stdin); .gz and .bz2 are decompressed on the fly."""
+    if path == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Feature-token statistics over PGN game databases.")
+    parser.add_argument("pgn", nargs="+", help="PGN files (.pgn, .pgn.gz, .pgn.bz2) or - for stdin")
+    parser.add_argument("-o", "--output", default=None, help="write the JSON report here (default stdout)")
+    parser.add_argument("--batch", type=int, default=8192, help="positions per vectorized batch")
+    parser.add_argument("--max-positions", type=int, default=None)
+    parser.add_argument("--include-start", action="store_true", help="also count each game's initial position")
+    parser.add_argument("--top", type=int, default=25, help="most common token sets to report")
+    parser.add_argument("--positions", default=None, help="also write game/ply/fen/tokens per position as JSONL")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare every position with feature_support.build_feature_tokens (slow)")
+    args = parser.parse_args(argv)
+
+    keep_boards = args.verify or args.positions is not None
+    counts = np.zeros(len(fb.CUES), dtype=np.int64)
+    pairs = np.zeros((len(fb.CUES), len(fb.CUES)), dtype=np.int64)
+    sets: Counter = Counter()
+    weights = np.left_shift(np.int64(1), np.arange(len(fb.CUES), dtype=np.int64))
+    positions = games = 0
+    mismatches = 0
+    examples: List[Dict[str, Any]] = []
+    errors: List[Tuple[int, str]] = []
+    feature_s = scalar_s = 0.0
+    out_positions = open(args.positions, "w", encoding="utf-8") if args.positions else None
+    started = time.perf_counter()
+
+    try:
+        for path in args.pgn:
+            left = None if args.max_positions is None else args.max_positions - positions
+            if left is not None and left <= 0:
+                break
+            file_errors: List[Tuple[int, str]] = []
+            last_game = -1
+            with open_pgn(path) as handle:
+                for batch in fb.iter_pgn_batches(handle, args.batch, args.include_start, keep_boards,
+                                                 max_positions=left, errors=file_errors):
+                    t = time.perf_counter()
+                    matrix = fb.extract(batch)
+                    feature_s += time.perf_counter() - t
+                    m = matrix.astype(np.int64)
+                    counts += m.sum(axis=0)
+                    pairs += m.T @ m
+                    codes, n = np.unique(m @ weights, return_counts=True)
+                    sets.update(dict(zip(codes.tolist(), n.tolist())))
+                    if args.verify:
+                        t = time.perf_counter()
+                        for row, fast, slow in fb.verify(batch, matrix):
+                            mismatches += 1
+                            if len(examples) < 20:
+                                examples.append({"fen": batch.boards[row].fen(), "last_move_san": batch.sans[row],
+                                                 "vectorized": fast, "scalar": slow})
+                        scalar_s += time.perf_counter() - t
+                    if out_positions is not None:
+                        for i, board in enumerate(batch.boards):
+                            out_positions.write(json.dumps({
+                                "game": games + int(batch.game[i]), "ply": int(batch.ply[i]), "fen": board.fen(),
+                                "tokens": fb.tokens(matrix[i])}) + "\n")
+                    positions += len(batch)
+                    print(f"[mine] {positions} positions, {positions / (time.perf_counter() - started):.0f}/s",
+                          file=sys.stderr)
+                    last_game = int(batch.game[-1])
+            errors.extend((games + g, msg) for g, msg in file_errors)
+            games += last_game + 1
+    finally:
+        if out_positions is not None:
+            out_positions.close()
+
+    elapsed = time.perf_counter() - started
+    names = list(fb.CUES)
+    report: Dict[str, Any] = {
+        "positions": positions,
+        "games": games,
+        "parse_errors": len(errors),
+        "elapsed_s": round(elapsed, 2),
+        "positions_per_s": round(positions / elapsed) if elapsed else None,
+        "feature_us_per_position": round(feature_s / positions * 1e6, 2) if positions else None,
+        "cues": {name: {"count": int(c), "rate": round(int(c) / positions, 5) if positions else 0.0}
+                 for name, c in zip(names, counts)},
+        "pairs": {f"{names[i]}+{names[j]}": int(pairs[i, j])
+                  for i in range(len(names)) for j in range(i + 1, len(names)) if pairs[i, j]},
+        "top_sets": [{"tokens": [names[j] for j in range(len(names)) if code >> j & 1], "count": n}
+                     for code, n in sets.most_common(args.top)],
+    }
+    if args.verify:
+        report["verify"] = {
+            "mismatches": mismatches,
+            "examples": examples,
+            "scalar_us_per_position": round(scalar_s / positions * 1e6, 2) if positions else None,
+        }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.verify:
+        print(f"[mine] verify: {mismatches} mismatches in {positions} positions", file=sys.stderr)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+# tools/resp_store.py
+# Local stand-in for Redis: the RESP commands the shared result cache and the job broker
+# (queue_support.RedisBroker) use. Plain keys are bounded with LRU eviction; lists (job queues) are not,
+# but like keys they can expire (EXPIRE/PEXPIRE).
+#
+#   python tools/resp_store.py --port 6380 --max-entries 100000 --max-mb 256
+#   python tools/resp_store.py --unix /tmp/sensei-store.sock
+#   python tools/resp_store.py --port 6381 --no-evict                   # job broker: nothing may be dropped
+#   SENSEI_STORE_URL=redis://127.0.0.1:6380 python serve.py --workers 4
+#
+# serve.py starts one of these on a unix socket by itself when no SENSEI_STORE_URL is set.
+# Commands: PING, GET, SET [EX|PX], EXPIRE, PEXPIRE, INCR, DEL, EXISTS, DBSIZE, FLUSHDB, INFO, CLIENT/COMMAND (accepted), SELECT 0
+# (one keyspace: run a separate instance instead of a second db),
+# and lists: RPUSH, LPUSH, LPOP, LLEN, LINDEX, LRANGE, LREM, LMOVE, BLMOVE, BLPOP.
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import signal
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class Store:
+    """key -> (value, expires_at or 0); least recently used keys go first past either bound (unless evict=False)."""
+
+    def __init__(self, max_entries: int, max_bytes: int, evict: bool = True):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.evict = evict
+        self._data: "OrderedDict[bytes, Tuple[bytes, float]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lists: Dict[bytes, Deque[bytes]] = {}
+        self._list_expiry: Dict[bytes, float] = {}  # list key -> expires_at (monotonic)
+        self._waiters: Dict[bytes, List[asyncio.Future]] = {}
+
+    def _drop(self, key: bytes) -> None:
+        value, _ = self._data.pop(key)
+        self.bytes -= len(key) + len(value)
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at and expires_at <= time.monotonic():
+            self._drop(key)
+            self.expirations += 1
+            return None
+        return value
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        value = self._live(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: bytes, value: bytes, ttl_s: float) -> None:
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (value, time.monotonic() + ttl_s if ttl_s > 0 else 0.0)
+        self.bytes += len(key) + len(value)
+        while self.evict and (len(self._data) > self.max_entries
+                              or self.bytes > self.max_bytes and len(self._data) > 1):
+            self._drop(next(iter(self._data)))
+            self.evictions += 1
+
+    def delete(self, keys: List[bytes]) -> int:
+        n = 0
+        for key in keys:
+            if self._live(key) is not None:
+                self._drop(key)
+                n += 1
+            elif self._live_list(key) is not None:
+                self._drop_list(key)
+                n += 1
+        return n
+
+    def exists(self, key: bytes) -> bool:
+        return self._live_list(key) is not None or self._live(key) is not None
+
+    def expire(self, key: bytes, ttl_s: float) -> bool:
+        """EXPIRE/PEXPIRE: False if there is no such key; a ttl <= 0 deletes it."""
+        if self._live_list(key) is not None:
+            if ttl_s <= 0:
+                self._drop_list(key)
+            else:
+                self._list_expiry[key] = time.monotonic() + ttl_s
+            return True
+        value = self._live(key)
+        if value is None:
+            return False
+        if ttl_s <= 0:
+            self._drop(key)
+        else:
+            self._data[key] = (value, time.monotonic() + ttl_s)
+        return True
+
+    def incr(self, key: bytes, by: int) -> int:
+        n = int(self._live(key) or b"0") + by
+        self.set(key, str(n).encode(), 0.0)
+        return n
+
+    # ----------------------------- lists -----------------------------
+    def _drop_list(self, key: bytes) -> None:
+        self.lists.pop(key, None)
+        self._list_expiry.pop(key, None)
+
+    def _live_list(self, key: bytes) -> Optional[Deque[bytes]]:
+        items = self.lists.get(key)
+        if items is None:
+            return None
+        expires_at = self._list_expiry.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._drop_list(key)
+            self.expirations += 1
+            return None
+        return items
+
+    def push(self, key: bytes, values: List[bytes], left: bool) -> int:
+        items = self._live_list(key)
+        if items is None:
+            items = self.lists[key] = deque()
+        for v in values:
+            items.appendleft(v) if left else items.append(v)
+        for waiter in self._waiters.pop(key, []):
+            if not waiter.done():
+                waiter.set_result(None)
+        return len(items)
+
+    def pop(self, key: bytes, left: bool) -> Optional[bytes]:
+        items = self._live_list(key)
+        if not items:
+            return None
+        value = items.popleft() if left else items.pop()
+        if not items:
+            self._drop_list(key)
+        return value
+
+    def items(self, key: bytes) -> Deque[bytes]:
+        """A list's items (empty if there is none); read-only use."""
+        items = self._live_list(key)
+        return deque() if items is None else items
+
+    def remove(self, key: bytes, count: int, value: bytes) -> int:
+        items = self._live_list(key)
+        if not items:
+            return 0
+        limit = abs(count) or len(items)
+        order = list(reversed(items)) if count < 0 else list(items)
+        kept: List[bytes] = []
+        removed = 0
+        for v in order:
+            if v == value and removed < limit:
+                removed += 1
+            else:
+                kept.append(v)
+        if count < 0:
+            kept.reverse()
+        if kept:
+            self.lists[key] = deque(kept)
+        else:
+            self._drop_list(key)
+        return removed
+
+    async def wait_push(self, keys: List[bytes], timeout_s: float) -> bool:
+        """Until one of `keys` gets a push (True) or the timeout passes (False); 0 waits forever."""
+        waiter = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._waiters.setdefault(key, []).append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout_s if timeout_s > 0 else None)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            for key in keys:
+                waiters = self._waiters.get(key)
+                if waiters and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+
+    def sweep(self, budget: int = 1000) -> None:
+        """Drop expired keys from the cold end (lazy expiry handles the rest)."""
+        now = time.monotonic()
+        for key in list(self._data)[:budget]:
+            expires_at = self._data[key][1]
+            if expires_at and expires_at <= now:
+                self._drop(key)
+                self.expirations += 1
+        for key in [k for k, expires_at in self._list_expiry.items() if expires_at <= now][:budget]:
+            self._drop_list(key)
+            self.expirations += 1
+
+    def flush(self) -> None:
+        self._data.clear()
+        self.lists.clear()
+        self._list_expiry.clear()
+        self.bytes = 0
+
+    def info(self) -> str:
+        return "\r\n".join([
+            "# Keyspace", f"keys:{len(self._data)}", f"lists:{len(self.lists)}", f"used_bytes:{self.bytes}",
+            f"max_entries:{self.max_entries}", f"max_bytes:{self.max_bytes}", f"evict:{int(self.evict)}",
+            f"keyspace_hits:{self.hits}", f"keyspace_misses:{self.misses}",
+            f"evicted_keys:{self.evictions}", f"expired_keys:{self.expirations}",
+        ]) + "\r\n"
+
+
+# ----------------------------- protocol -----------------------------
+def simple(s: str) -> bytes:
+    return b"+" + s.encode() + b"\r\n"
+
+
+def error(s: str) -> bytes:
+    return b"-ERR " + s.encode() + b"\r\n"
+
+
+def integer(n: int) -> bytes:
+    return b":%d\r\n" % n
+
+
+def bulk(b: Optional[bytes]) -> bytes:
+    return b"$-1\r\n" if b is None else b"$%d\r\n%s\r\n" % (len(b), b)
+
+
+def array(items: Optional[List[bytes]]) -> bytes:
+    return b"*-1\r\n" if items is None else b"*%d\r\n" % len(items) + b"".join(bulk(b) for b in items)
+
+
+def _side(arg: bytes) -> bool:
+    """LEFT -> True, RIGHT -> False."""
+    side = arg.upper()
+    if side not in (b"LEFT", b"RIGHT"):
+        raise ValueError("expected LEFT or RIGHT")
+    return side == b"LEFT"
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    """One RESP array of bulk strings (or an inline command); None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.strip().split()
+    parts = []
+    for _ in range(int(line[1:-2])):
+        header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise ValueError("expected bulk string")
+        n = int(header[1:-2])
+        parts.append((await reader.readexactly(n + 2))[:-2])
+    return parts
+
+
+def execute(store: Store, cmd: List[bytes]) -> bytes:
+    name = cmd[0].upper()
+    args = cmd[1:]
+    if name == b"PING":
+        return bulk(args[0]) if args else simple("PONG")
+    if name == b"GET" and len(args) == 1:
+        return bulk(store.get(args[0]))
+    if name == b"SET" and len(args) >= 2:
+        ttl_s = 0.0
+        opts = [a.upper() for a in args[2:]]
+        for i, opt in enumerate(opts):
+            if opt in (b"EX", b"PX") and i + 1 < len(opts):
+                ttl_s = float(args[3 + i]) / (1000.0 if opt == b"PX" else 1.0)
+        store.set(args[0], args[1], ttl_s)
+        return simple("OK")
+    if name in (b"EXPIRE", b"PEXPIRE") and len(args) == 2:
+        return integer(store.expire(args[0], float(args[1]) / (1000.0 if name == b"PEXPIRE" else 1.0)))
+    if name in (b"INCR", b"INCRBY") and args:
+        return integer(store.incr(args[0], int(args[1]) if name == b"INCRBY" else 1))
+    if name == b"DEL" and args:
+        return integer(store.delete(args))
+    if name == b"EXISTS" and args:
+        return integer(sum(store.exists(k) for k in args))
+    if name == b"DBSIZE":
+        return integer(len(store._data) + len(store.lists))
+    if name in (b"RPUSH", b"LPUSH") and len(args) >= 2:
+        return integer(store.push(args[0], args[1:], left=name == b"LPUSH"))
+    if name in (b"LPOP", b"RPOP") and len(args) == 1:
+        return bulk(store.pop(args[0], left=name == b"LPOP"))
+    if name == b"LLEN" and len(args) == 1:
+        return integer(len(store.items(args[0])))
+    if name == b"LINDEX" and len(args) == 2:
+        items = store.items(args[0])
+        i = int(args[1])
+        return bulk(items[i] if -len(items) <= i < len(items) else None)
+    if name == b"LRANGE" and len(args) == 3:
+        items = list(store.items(args[0]))
+        start, stop = int(args[1]), int(args[2])
+        stop = len(items) if stop == -1 else stop + 1
+        return array(items[start:stop])
+    if name == b"LREM" and len(args) == 3:
+        return integer(store.remove(args[0], int(args[1]), args[2]))
+    if name == b"LMOVE" and len(args) == 4:
+        value = store.pop(args[0], _side(args[2]))
+        if value is not None:
+            store.push(args[1], [value], _side(args[3]))
+        return bulk(value)
+    if name in (b"FLUSHDB", b"FLUSHALL"):
+        store.flush()
+        return simple("OK")
+    if name == b"INFO":
+        return bulk(store.info().encode())
+    if name == b"SELECT" and len(args) == 1:
+        # a single keyspace: a second db would share (and evict) the first one's keys
+        return simple("OK") if args[0] == b"0" else error("only db 0 is supported; run another instance")
+    if name in (b"CLIENT", b"AUTH"):
+        return simple("OK")
+    if name == b"COMMAND":
+        return b"*0\r\n"
+    return error(f"unknown command '{name.decode(errors='replace')}'")
+
+
+async def execute_blocking(store: Store, cmd: List[bytes]) -> bytes:
+    """BLPOP key [key ...] timeout / BLMOVE src dst LEFT|RIGHT LEFT|RIGHT timeout."""
+    name = cmd[0].upper()
+    timeout_s = float(cmd[-1])
+    if name == b"BLMOVE":
+        if len(cmd) != 6:
+            raise ValueError("wrong number of arguments")
+        keys, immediate = [cmd[1]], [b"LMOVE"] + cmd[1:5]
+    else:
+        keys = cmd[1:-1]
+    deadline = time.monotonic() + timeout_s
+    while True:
+        if name == b"BLMOVE":
+            reply = execute(store, immediate)
+            if reply != bulk(None):
+                return reply
+        else:
+            for key in keys:
+                value = store.pop(key, left=True)
+                if value is not None:
+                    return array([key, value])
+        left = deadline - time.monotonic()
+        if timeout_s > 0 and left <= 0:
+            return bulk(None) if name == b"BLMOVE" else array(None)
+        await store.wait_push(keys, left if timeout_s > 0 else 0)
+
+
+async def serve_client(store: Store, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            cmd = await read_command(reader)
+            if cmd is None or (cmd and cmd[0].upper() == b"QUIT"):
+                break
+            if cmd:
+                try:
+                    if cmd[0].upper() in (b"BLPOP", b"BLMOVE"):
+                        reply = await execute_blocking(store, cmd)
+                    else:
+                        reply = execute(store, cmd)
+                except (ValueError, IndexError):
+                    reply = error("syntax error")
+                writer.write(reply)
+                await writer.drain()
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.CancelledError):
+        pass  # cancelled: the server is shutting down with this client still connected
+    finally:
+        writer.close()
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    store = Store(args.max_entries, args.max_mb * 1024 * 1024, evict=not args.no_evict)
+
+    def handler(r: asyncio.StreamReader, w: asyncio.StreamWriter):
+        return serve_client(store, r, w)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = await asyncio.start_unix_server(handler, path=args.unix)
+        where = f"unix://{args.unix}"
+    else:
+        server = await asyncio.start_server(handler, host=args.host, port=args.port)
+        where = f"redis://{args.host}:{args.port}"
+    bounds = "no eviction" if args.no_evict else f"max {store.max_entries} keys, {args.max_mb} MB"
+    print(f"[store] listening on {where} ({bounds})", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                store.sweep()
+    if args.unix and os.path.exists(args.unix):
+        os.unlink(args.unix)
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Redis-compatible stand-in for the shared result cache and job broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--unix", default=None, help="listen on this unix socket instead of TCP")
+    parser.add_argument("--max-entries", type=int, default=100000)
+    parser.add_argument("--max-mb", type=int, default=256)
+    parser.add_argument("--no-evict", action="store_true",
+                        help="never drop keys (for the job broker); --max-entries/--max-mb are ignored")
+    asyncio.run(main_async(parser.parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())